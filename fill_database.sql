@@ -1,4 +1,5 @@
 -- Скрипт заполнения базы данных до 10к элементов
+-- Для больших объемов (схема lab2) используйте lab2/load_data.py: COPY вместо построчных INSERT
 DO $$
 DECLARE
     i INTEGER;
@@ -7,7 +7,7 @@ SELECT
     AVG(b.total_amount) as avg_booking_value
 FROM Events e
 LEFT JOIN Bookings b ON e.event_id = b.event_id
-WHERE b.status = 'confirmed'
+WHERE b.status_id = 2
 GROUP BY e.event_id, e.title
 ORDER BY total_revenue DESC;
 
@@ -30,7 +30,7 @@ SELECT
     NTILE(4) OVER (ORDER BY SUM(b.total_amount) DESC) as spending_quartile
 FROM Users u
 JOIN Bookings b ON u.user_id = b.user_id
-WHERE b.status = 'confirmed'
+WHERE b.status_id = 2
 GROUP BY u.user_id, u.email
 ORDER BY total_spent DESC;
 
@@ -44,7 +44,7 @@ SELECT
         ROWS BETWEEN 2 PRECEDING AND CURRENT ROW
     ) as moving_avg_3months
 FROM Bookings b
-WHERE b.status = 'confirmed'
+WHERE b.status_id = 2
 GROUP BY DATE_TRUNC('month', b.booking_date)
 ORDER BY month;
 
@@ -53,7 +53,7 @@ SELECT
     u.first_name || ' ' || u.last_name as user_name,
     b.booking_date,
     b.total_amount,
-    b.status
+    b.status_id
 FROM Users u
 JOIN Bookings b ON u.user_id = b.user_id
 ORDER BY b.booking_date DESC;
@@ -67,7 +67,7 @@ SELECT
 FROM Users u
 JOIN Bookings b ON u.user_id = b.user_id
 JOIN Events e ON b.event_id = e.event_id
-WHERE b.status = 'confirmed'
+WHERE b.status_id = 2
 ORDER BY b.booking_date DESC;
 
 -- 7. Join 3 tables: Events + Bookings + Transactions
@@ -79,7 +79,7 @@ SELECT
 FROM Events e
 JOIN Bookings b ON e.event_id = b.event_id
 JOIN Transactions t ON b.booking_id = t.booking_id
-WHERE b.status = 'confirmed' AND t.status = 'completed'
+WHERE b.status_id = 2 AND t.status = 'completed'
 GROUP BY e.event_id, e.title;
 
 -- 8. Join 4 tables: Users + Bookings + Events + Transactions
@@ -109,5 +109,41 @@ JOIN Bookings b ON u.user_id = b.user_id
 JOIN Events e ON b.event_id = e.event_id
 JOIN Venues v ON e.venue_id = v.venue_id
 JOIN Organizers o ON e.organizer_id = o.organizer_id
-WHERE b.status = 'confirmed'
+WHERE b.status_id = 2
 ORDER BY b.booking_date DESC;
+
+
+-- 10. Reporting from the maintained summary tables (06_reporting_summaries.sql)
+-- Total revenue per event with occupancy
+SELECT
+    title,
+    confirmed_bookings as total_bookings,
+    revenue as total_revenue,
+    ROUND(revenue / NULLIF(confirmed_bookings, 0), 2) as avg_booking_value,
+    occupancy_pct
+FROM EventSalesReport
+ORDER BY total_revenue DESC;
+
+-- User ranking by spending from summaries
+SELECT
+    u.email,
+    s.confirmed_spent as total_spent,
+    RANK() OVER (ORDER BY s.confirmed_spent DESC) as spending_rank,
+    NTILE(4) OVER (ORDER BY s.confirmed_spent DESC) as spending_quartile
+FROM UserSpendSummary s
+JOIN Users u ON u.user_id = s.user_id
+WHERE s.confirmed_bookings > 0
+ORDER BY total_spent DESC;
+
+-- Monthly revenue trend from daily sales
+SELECT
+    DATE_TRUNC('month', sales_date) as month,
+    SUM(bookings_count) as bookings_count,
+    SUM(revenue) as monthly_revenue,
+    AVG(SUM(revenue)) OVER (
+        ORDER BY DATE_TRUNC('month', sales_date)
+        ROWS BETWEEN 2 PRECEDING AND CURRENT ROW
+    ) as moving_avg_3months
+FROM DailySalesCurrent
+GROUP BY DATE_TRUNC('month', sales_date)
+ORDER BY month;
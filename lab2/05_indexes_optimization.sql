@@ -16,6 +16,8 @@ CREATE INDEX IF NOT EXISTS idx_reviews_user_id ON Reviews(user_id);
 CREATE INDEX IF NOT EXISTS idx_bookings_user_event ON Bookings(user_id, event_id);
 CREATE INDEX IF NOT EXISTS idx_bookings_event_status ON Bookings(event_id, status);
 CREATE INDEX IF NOT EXISTS idx_bookings_date_status ON Bookings(booking_date, status);
+-- Keyset pagination of a user's booking history: (booking_date, booking_id) < cursor
+CREATE INDEX IF NOT EXISTS idx_bookings_user_date_id ON Bookings(user_id, booking_date DESC, booking_id DESC);
 
 
 ANALYZE Users;
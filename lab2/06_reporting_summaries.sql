@@ -0,0 +1,265 @@
+-- Reporting summary tables kept current by statement-level triggers on Bookings.
+-- Each INSERT/UPDATE/DELETE statement aggregates its transition table once and
+-- upserts the deltas, so a COPY chunk of 100k rows costs one upsert per touched
+-- event/user/day instead of a full re-join of Users, Bookings, Events and
+-- Transactions on every dashboard refresh.
+-- TRUNCATE does not fire these triggers: call rebuild_reporting_summaries()
+-- after bulk reloads (load_data.py does this).
+-- Per-event and per-day sales are hot rows: every confirmation of a popular
+-- event (and every booking of the day) would update the same summary row
+-- inside the booking transaction and serialize concurrent confirmations.
+-- Their deltas are appended to SalesSummaryDeltas instead and folded in by
+-- fold_sales_deltas() (partition_maintenance.py, or cron); EventSalesCurrent
+-- and DailySalesCurrent add the pending deltas, so reads stay exact.
+
+-- 1. Per-event sales (confirmed bookings)
+CREATE TABLE IF NOT EXISTS EventSalesSummary (
+    event_id INTEGER PRIMARY KEY REFERENCES Events(event_id) ON DELETE CASCADE,
+    confirmed_bookings BIGINT NOT NULL DEFAULT 0,
+    tickets_sold BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 2. Per-user spend (all bookings, like UserBookingHistory, plus confirmed only)
+CREATE TABLE IF NOT EXISTS UserSpendSummary (
+    user_id INTEGER PRIMARY KEY REFERENCES Users(user_id) ON DELETE CASCADE,
+    total_bookings BIGINT NOT NULL DEFAULT 0,
+    total_spent DECIMAL(14,2) NOT NULL DEFAULT 0,
+    confirmed_bookings BIGINT NOT NULL DEFAULT 0,
+    confirmed_spent DECIMAL(14,2) NOT NULL DEFAULT 0,
+    last_booking_date TIMESTAMP,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 3. Daily sales (confirmed bookings by booking day)
+CREATE TABLE IF NOT EXISTS DailySalesSummary (
+    sales_date DATE PRIMARY KEY,
+    bookings_count BIGINT NOT NULL DEFAULT 0,
+    tickets_sold BIGINT NOT NULL DEFAULT 0,
+    revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 4. Pending per-event/per-day deltas (append-only, no index to contend on)
+CREATE TABLE IF NOT EXISTS SalesSummaryDeltas (
+    event_id INTEGER,
+    sales_date DATE,
+    bookings_count BIGINT NOT NULL,
+    tickets_sold BIGINT NOT NULL,
+    revenue DECIMAL(14,2) NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_sales_revenue ON EventSalesSummary(revenue DESC);
+CREATE INDEX IF NOT EXISTS idx_user_spend_confirmed ON UserSpendSummary(confirmed_spent DESC);
+
+-- Transition tables are only visible inside the trigger function itself, so
+-- one function builds the signed change set (+1 new rows, -1 old rows) for
+-- TG_OP and applies it with dynamic SQL. Upserts go in key order so that
+-- concurrent statements lock summary rows in the same order; sales deltas
+-- are plain inserts and lock nothing.
+CREATE OR REPLACE FUNCTION bookings_summary_trigger()
+RETURNS TRIGGER AS $$
+DECLARE
+    changes TEXT;
+BEGIN
+    changes := CASE TG_OP
+        WHEN 'INSERT' THEN 'SELECT 1 AS sign, * FROM new_rows'
+        WHEN 'DELETE' THEN 'SELECT -1 AS sign, * FROM old_rows'
+        ELSE 'SELECT -1 AS sign, * FROM old_rows UNION ALL SELECT 1, * FROM new_rows'
+    END;
+
+    EXECUTE format($sql$
+        WITH rows AS (%s)
+        INSERT INTO SalesSummaryDeltas (event_id, sales_date, bookings_count, tickets_sold, revenue)
+        SELECT event_id, booking_date::date,
+               SUM(sign), SUM(sign * COALESCE(quantity, 1)), SUM(sign * COALESCE(total_amount, 0))
+        FROM rows
+        WHERE status_id = 2
+        GROUP BY event_id, booking_date::date
+        HAVING SUM(sign) <> 0 OR SUM(sign * COALESCE(quantity, 1)) <> 0
+            OR SUM(sign * COALESCE(total_amount, 0)) <> 0
+    $sql$, changes);
+
+    EXECUTE format($sql$
+        WITH rows AS (%s)
+        INSERT INTO UserSpendSummary AS s
+            (user_id, total_bookings, total_spent, confirmed_bookings, confirmed_spent, last_booking_date)
+        SELECT user_id,
+               SUM(sign),
+               SUM(sign * COALESCE(total_amount, 0)),
+               COALESCE(SUM(sign) FILTER (WHERE status_id = 2), 0),
+               COALESCE(SUM(sign * COALESCE(total_amount, 0)) FILTER (WHERE status_id = 2), 0),
+               MAX(booking_date) FILTER (WHERE sign = 1)
+        FROM rows
+        WHERE user_id IS NOT NULL
+        GROUP BY user_id
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            total_bookings = s.total_bookings + EXCLUDED.total_bookings,
+            total_spent = s.total_spent + EXCLUDED.total_spent,
+            confirmed_bookings = s.confirmed_bookings + EXCLUDED.confirmed_bookings,
+            confirmed_spent = s.confirmed_spent + EXCLUDED.confirmed_spent,
+            last_booking_date = GREATEST(s.last_booking_date, EXCLUDED.last_booking_date),
+            updated_at = CURRENT_TIMESTAMP
+    $sql$, changes);
+
+
+    -- A MAX cannot be decremented: re-read the last booking date of affected
+    -- users (idx_bookings_user_date_id)
+    IF TG_OP <> 'INSERT' THEN
+        EXECUTE $sql$
+            UPDATE UserSpendSummary s
+            SET last_booking_date = (SELECT MAX(b.booking_date) FROM Bookings b WHERE b.user_id = s.user_id)
+            WHERE s.user_id IN (SELECT user_id FROM old_rows)
+        $sql$;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Transition tables allow only one event per trigger
+DROP TRIGGER IF EXISTS trg_bookings_summary_insert ON Bookings;
+CREATE TRIGGER trg_bookings_summary_insert
+    AFTER INSERT ON Bookings
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bookings_summary_trigger();
+
+DROP TRIGGER IF EXISTS trg_bookings_summary_update ON Bookings;
+CREATE TRIGGER trg_bookings_summary_update
+    AFTER UPDATE ON Bookings
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bookings_summary_trigger();
+
+DROP TRIGGER IF EXISTS trg_bookings_summary_delete ON Bookings;
+CREATE TRIGGER trg_bookings_summary_delete
+    AFTER DELETE ON Bookings
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION bookings_summary_trigger();
+
+-- Move the pending deltas into EventSalesSummary/DailySalesSummary; returns
+-- the number of delta rows folded. Deltas committed while it runs stay for
+-- the next call.
+CREATE OR REPLACE FUNCTION fold_sales_deltas()
+RETURNS BIGINT AS $$
+DECLARE
+    folded BIGINT;
+BEGIN
+    WITH moved AS (
+        DELETE FROM SalesSummaryDeltas RETURNING *
+    ), events AS (
+        INSERT INTO EventSalesSummary AS s (event_id, confirmed_bookings, tickets_sold, revenue)
+        SELECT event_id, SUM(bookings_count), SUM(tickets_sold), SUM(revenue)
+        FROM moved
+        WHERE event_id IS NOT NULL
+        GROUP BY event_id
+        ORDER BY event_id
+        ON CONFLICT (event_id) DO UPDATE SET
+            confirmed_bookings = s.confirmed_bookings + EXCLUDED.confirmed_bookings,
+            tickets_sold = s.tickets_sold + EXCLUDED.tickets_sold,
+            revenue = s.revenue + EXCLUDED.revenue,
+            updated_at = CURRENT_TIMESTAMP
+    ), days AS (
+        INSERT INTO DailySalesSummary AS s (sales_date, bookings_count, tickets_sold, revenue)
+        SELECT sales_date, SUM(bookings_count), SUM(tickets_sold), SUM(revenue)
+        FROM moved
+        WHERE sales_date IS NOT NULL
+        GROUP BY sales_date
+        ORDER BY sales_date
+        ON CONFLICT (sales_date) DO UPDATE SET
+            bookings_count = s.bookings_count + EXCLUDED.bookings_count,
+            tickets_sold = s.tickets_sold + EXCLUDED.tickets_sold,
+            revenue = s.revenue + EXCLUDED.revenue,
+            updated_at = CURRENT_TIMESTAMP
+    )
+    SELECT count(*) INTO folded FROM moved;
+
+    DELETE FROM DailySalesSummary WHERE bookings_count = 0;
+    RETURN folded;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Full recomputation from Bookings (initial fill, after TRUNCATE/bulk reloads)
+CREATE OR REPLACE FUNCTION rebuild_reporting_summaries()
+RETURNS VOID AS $$
+BEGIN
+    TRUNCATE EventSalesSummary, UserSpendSummary, DailySalesSummary, SalesSummaryDeltas;
+
+    INSERT INTO EventSalesSummary (event_id, confirmed_bookings, tickets_sold, revenue)
+    SELECT event_id, COUNT(*), SUM(COALESCE(quantity, 1)), SUM(COALESCE(total_amount, 0))
+    FROM Bookings
+    WHERE status_id = 2 AND event_id IS NOT NULL
+    GROUP BY event_id;
+
+    INSERT INTO UserSpendSummary
+        (user_id, total_bookings, total_spent, confirmed_bookings, confirmed_spent, last_booking_date)
+    SELECT user_id,
+           COUNT(*),
+           SUM(COALESCE(total_amount, 0)),
+           COUNT(*) FILTER (WHERE status_id = 2),
+           COALESCE(SUM(total_amount) FILTER (WHERE status_id = 2), 0),
+           MAX(booking_date)
+    FROM Bookings
+    WHERE user_id IS NOT NULL
+    GROUP BY user_id;
+
+    INSERT INTO DailySalesSummary (sales_date, bookings_count, tickets_sold, revenue)
+    SELECT booking_date::date, COUNT(*), SUM(COALESCE(quantity, 1)), SUM(COALESCE(total_amount, 0))
+    FROM Bookings
+    WHERE status_id = 2 AND booking_date IS NOT NULL
+    GROUP BY booking_date::date;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT rebuild_reporting_summaries();
+
+-- Folded totals plus the deltas not folded yet
+CREATE OR REPLACE VIEW EventSalesCurrent AS
+SELECT event_id, SUM(confirmed_bookings)::BIGINT AS confirmed_bookings,
+       SUM(tickets_sold)::BIGINT AS tickets_sold, SUM(revenue) AS revenue
+FROM (
+    SELECT event_id, confirmed_bookings, tickets_sold, revenue FROM EventSalesSummary
+    UNION ALL
+    SELECT event_id, bookings_count, tickets_sold, revenue FROM SalesSummaryDeltas WHERE event_id IS NOT NULL
+) t
+GROUP BY event_id;
+
+CREATE OR REPLACE VIEW DailySalesCurrent AS
+SELECT sales_date, SUM(bookings_count)::BIGINT AS bookings_count,
+       SUM(tickets_sold)::BIGINT AS tickets_sold, SUM(revenue) AS revenue
+FROM (
+    SELECT sales_date, bookings_count, tickets_sold, revenue FROM DailySalesSummary
+    UNION ALL
+    SELECT sales_date, bookings_count, tickets_sold, revenue FROM SalesSummaryDeltas WHERE sales_date IS NOT NULL
+) t
+GROUP BY sales_date
+HAVING SUM(bookings_count) <> 0;
+
+-- Per-event revenue and occupancy; venue capacity comes from the small Venues table
+CREATE OR REPLACE VIEW EventSalesReport AS
+SELECT
+    e.event_id,
+    e.title,
+    e.event_date,
+    v.capacity,
+    COALESCE(s.confirmed_bookings, 0) AS confirmed_bookings,
+    COALESCE(s.tickets_sold, 0) AS tickets_sold,
+    COALESCE(s.revenue, 0) AS revenue,
+    ROUND(100.0 * COALESCE(s.tickets_sold, 0) / NULLIF(v.capacity, 0), 1) AS occupancy_pct
+FROM Events e
+LEFT JOIN Venues v ON e.venue_id = v.venue_id
+LEFT JOIN EventSalesCurrent s ON e.event_id = s.event_id;
+
+-- UserBookingHistory keeps its columns but reads the maintained totals
+CREATE OR REPLACE VIEW UserBookingHistory AS
+SELECT
+    u.user_id,
+    u.email,
+    u.first_name,
+    u.last_name,
+    COALESCE(s.total_bookings, 0) as total_bookings,
+    s.total_spent::numeric as total_spent,
+    s.last_booking_date
+FROM Users u
+LEFT JOIN UserSpendSummary s ON u.user_id = s.user_id;
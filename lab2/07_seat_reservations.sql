@@ -0,0 +1,68 @@
+-- Per-event seat inventory for the reservation service (mongo/reservations.py).
+-- A seat moves available -> held (with a TTL) -> booked; an expired hold is
+-- treated as available again, so abandoned checkouts never block a seat.
+-- The primary key makes double-booking a seat impossible.
+CREATE TABLE IF NOT EXISTS EventSeats (
+    event_id INTEGER NOT NULL REFERENCES Events(event_id) ON DELETE CASCADE,
+    seat_id INTEGER NOT NULL REFERENCES Seats(seat_id),
+    status VARCHAR(10) NOT NULL DEFAULT 'available'
+        CHECK (status IN ('available', 'held', 'booked')),
+    hold_id UUID,
+    user_id INTEGER REFERENCES Users(user_id),
+    held_until TIMESTAMP,
+    booking_id INTEGER,
+    PRIMARY KEY (event_id, seat_id)
+);
+
+-- Once Bookings is partitioned (09_partitioning.sql) it can only be referenced
+-- together with its partition key, which EventSeats then carries as booking_date
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint
+                   WHERE conrelid = 'eventseats'::regclass AND confrelid = 'bookings'::regclass) THEN
+        IF (SELECT relkind FROM pg_class WHERE oid = 'bookings'::regclass) = 'p' THEN
+            PERFORM carry_partition_key('eventseats', 'eventseats_booking_id_fkey',
+                                        'FOREIGN KEY (booking_id) REFERENCES bookings(booking_id)');
+        ELSE
+            ALTER TABLE EventSeats ADD CONSTRAINT eventseats_booking_id_fkey
+                FOREIGN KEY (booking_id) REFERENCES Bookings(booking_id);
+        END IF;
+    END IF;
+END;
+$$;
+
+-- Seats that can still be sold; booked seats drop out of the index
+CREATE INDEX IF NOT EXISTS idx_event_seats_free ON EventSeats(event_id, seat_id) WHERE status <> 'booked';
+CREATE INDEX IF NOT EXISTS idx_event_seats_hold ON EventSeats(hold_id) WHERE hold_id IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_event_seats_expiry ON EventSeats(held_until) WHERE status = 'held';
+
+-- Open sales for an event: one inventory row per seat of its venue
+CREATE OR REPLACE FUNCTION open_event_sales(p_event_id INTEGER)
+RETURNS INTEGER AS $$
+DECLARE
+    added INTEGER;
+BEGIN
+    INSERT INTO EventSeats (event_id, seat_id)
+    SELECT e.event_id, s.seat_id
+    FROM Events e
+    JOIN Seats s ON s.venue_id = e.venue_id
+    WHERE e.event_id = p_event_id
+    ON CONFLICT DO NOTHING;
+    GET DIAGNOSTICS added = ROW_COUNT;
+    RETURN added;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Return expired holds to sale (optional sweeper; holds also expire lazily)
+CREATE OR REPLACE FUNCTION release_expired_holds()
+RETURNS INTEGER AS $$
+DECLARE
+    released INTEGER;
+BEGIN
+    UPDATE EventSeats
+    SET status = 'available', hold_id = NULL, user_id = NULL, held_until = NULL
+    WHERE status = 'held' AND held_until < CURRENT_TIMESTAMP;
+    GET DIAGNOSTICS released = ROW_COUNT;
+    RETURN released;
+END;
+$$ LANGUAGE plpgsql;
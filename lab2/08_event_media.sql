@@ -0,0 +1,88 @@
+-- Out-of-line storage for large event payloads (long descriptions, posters,
+-- attachments). Catalog rows in Events stay narrow: a large description is
+-- replaced by a short preview plus a reference to EventMedia, so scans of the
+-- catalog read and cache only the columns they list. Payloads are stored out
+-- of line without compression (STORAGE EXTERNAL): substring() on such a value
+-- reads only the TOAST chunks it needs, which is how mongo/event_media.py
+-- streams payloads in pieces. A compressed value would be decompressed from
+-- the start on every substring() call, making the stream quadratic. The
+-- short descriptions that stay inline in Events are compressed with lz4
+-- (PostgreSQL 14+ built with lz4; otherwise the default pglz stays).
+
+CREATE TABLE IF NOT EXISTS EventMedia (
+    media_id SERIAL PRIMARY KEY,
+    event_id INTEGER NOT NULL REFERENCES Events(event_id) ON DELETE CASCADE,
+    kind VARCHAR(20) NOT NULL CHECK (kind IN ('description', 'poster', 'attachment', 'metadata')),
+    content_type VARCHAR(100) NOT NULL DEFAULT 'application/octet-stream',
+    filename VARCHAR(255),
+    size_bytes INTEGER NOT NULL,
+    sha256 CHAR(64) NOT NULL,
+    data BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_event_media_event ON EventMedia(event_id, kind);
+
+-- Reference from the catalog row to its full description
+ALTER TABLE Events ADD COLUMN IF NOT EXISTS description_media_id INTEGER
+    REFERENCES EventMedia(media_id) ON DELETE SET NULL;
+
+-- Payloads: out of line, uncompressed. Applies to new values; rows written
+-- before this change keep their compressed form until they are rewritten.
+ALTER TABLE EventMedia ALTER COLUMN data SET STORAGE EXTERNAL;
+
+-- lz4 for the short descriptions that stay inline
+DO $$
+BEGIN
+    ALTER TABLE Events ALTER COLUMN description SET COMPRESSION lz4;
+EXCEPTION WHEN feature_not_supported THEN
+    RAISE NOTICE 'lz4 is not available in this build, keeping pglz';
+END;
+$$;
+
+-- Move descriptions longer than p_threshold bytes to EventMedia and keep a preview
+CREATE OR REPLACE FUNCTION move_large_descriptions(p_threshold INTEGER DEFAULT 2000,
+                                                   p_preview INTEGER DEFAULT 200)
+RETURNS INTEGER AS $$
+DECLARE
+    moved INTEGER;
+BEGIN
+    WITH large AS (
+        SELECT event_id, convert_to(description, 'UTF8') AS data
+        FROM Events
+        WHERE description_media_id IS NULL
+          AND octet_length(description) > p_threshold
+        ORDER BY event_id
+        FOR UPDATE
+    ), media AS (
+        INSERT INTO EventMedia (event_id, kind, content_type, size_bytes, sha256, data)
+        SELECT event_id, 'description', 'text/plain; charset=utf-8', octet_length(data),
+               encode(sha256(data), 'hex'), data
+        FROM large
+        RETURNING media_id, event_id
+    )
+    UPDATE Events e
+    SET description = left(e.description, p_preview),
+        description_media_id = media.media_id
+    FROM media
+    WHERE e.event_id = media.event_id;
+    GET DIAGNOSTICS moved = ROW_COUNT;
+    RETURN moved;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Catalog view: references only, no payload bytes
+CREATE OR REPLACE VIEW EventCatalog AS
+SELECT
+    e.event_id,
+    e.title,
+    e.event_date,
+    e.venue_id,
+    e.base_price,
+    e.description AS description_preview,
+    e.description_media_id,
+    (SELECT json_agg(json_build_object('media_id', m.media_id, 'kind', m.kind,
+                                       'content_type', m.content_type, 'size_bytes', m.size_bytes)
+                     ORDER BY m.media_id)
+     FROM EventMedia m WHERE m.event_id = e.event_id AND m.kind <> 'description') AS media
+FROM Events e;
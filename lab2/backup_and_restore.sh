@@ -2,48 +2,38 @@
 
 echo "=== Simple Backup & Restore for WSL ==="
 
+# Parallel directory-format dump/restore with compression and sampled
+# verification; see backup_tool.py for the options (Mongo: --engines postgres,mongo)
 DB_NAME="event_booking"
-BACKUP_FILE="event_booking_backup.sql"
+# The tool runs as postgres, so the directory must be an absolute path that
+# postgres can write to (not the caller's working directory)
+BACKUP_DIR="${BACKUP_DIR:-/tmp/event_booking_backup}"
+JOBS=$(nproc)
+TOOL="$(cd "$(dirname "$0")" && pwd)/backup_tool.py"
 
-echo "1. Creating backup using pg_dump with sudo..."
-sudo -u postgres pg_dump $DB_NAME > $BACKUP_FILE
+echo "1. Creating backup (pg_dump -Fd -j $JOBS)..."
+sudo -u postgres rm -rf "$BACKUP_DIR"
+sudo -u postgres python3 "$TOOL" --backup "$BACKUP_DIR" --dsn "dbname=$DB_NAME" --engines postgres -j $JOBS
 
 if [ $? -eq 0 ]; then
-    echo "✅ Backup created: $BACKUP_FILE"
-    echo "📦 Backup size: $(du -h $BACKUP_FILE | cut -f1)"
+    echo "✅ Backup created: $BACKUP_DIR"
+    echo "📦 Backup size: $(sudo -u postgres du -sh "$BACKUP_DIR" | cut -f1)"
 else
     echo "❌ Backup failed"
     exit 1
 fi
 
 echo ""
-echo "2. Dropping database..."
-sudo -u postgres psql -c "DROP DATABASE IF EXISTS $DB_NAME;" 2>/dev/null
-
-echo ""
-echo "3. Creating new database..."
-sudo -u postgres createdb $DB_NAME
-
-echo ""
-echo "4. Restoring from backup..."
-sudo -u postgres psql -d $DB_NAME -f $BACKUP_FILE
+echo "2. Recreating database, restoring (pg_restore -j $JOBS) and verifying..."
+sudo -u postgres python3 "$TOOL" --restore "$BACKUP_DIR" --target-dsn "dbname=$DB_NAME" --recreate \
+    --engines postgres -j $JOBS
 
 if [ $? -eq 0 ]; then
-    echo "✅ Restore completed successfully"
+    echo "✅ Restore completed and verified"
 else
-    echo "❌ Restore failed"
+    echo "❌ Restore or verification failed"
     exit 1
 fi
 
 echo ""
-echo "5. Verification..."
-sudo -u postgres psql -d $DB_NAME -c "
-SELECT 
-    table_name,
-    (xpath('/row/cnt/text()', query_to_xml(format('SELECT COUNT(*) as cnt FROM %I', table_name), false, true, '')))[1]::text::int as row_count
-FROM information_schema.tables 
-WHERE table_schema = 'public'
-ORDER BY row_count DESC;"
-
-echo ""
-echo "=== COMPLETED ==="
\ No newline at end of file
+echo "=== COMPLETED ==="
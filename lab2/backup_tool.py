@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+# backup_tool.py - Parallel, compressed backup and restore with fast verification
+#
+# PostgreSQL: directory-format pg_dump/pg_restore with -j jobs. Each table is
+# compressed into its own file while it is being dumped (-Z, gzip by default;
+# PostgreSQL 16+ also accepts lz4:N / zstd:N). The dump runs in a snapshot
+# exported by this tool, and the sampled checksums are taken in that same
+# snapshot, so they describe exactly what was dumped.
+# MongoDB: mongodump/mongorestore with --gzip, several collections at once
+# (--numParallelCollections) and several insertion workers per collection.
+#
+# Verification does not count every row. At backup time manifest.json records
+#   - catalog estimates: pg_class.reltuples (summed over partitions) and
+#     estimated_document_count() for every collection;
+#   - checksums of --sample-ranges key ranges per table: md5 over about
+#     --range-rows rows of a range on the first primary key column (an index
+#     range scan), and md5 over the raw BSON of --range-rows documents from a
+#     sampled _id for each collection.
+# After restore the tables are analyzed in parallel (vacuumdb --analyze-only -j)
+# so the estimates are fresh, then both lists are compared. Each phase reports
+# its duration and throughput in MB/s of database data.
+#
+# Example:
+#   python3 backup_tool.py --backup /var/backups/eb --dsn "dbname=event_booking" -j 8
+#   python3 backup_tool.py --restore /var/backups/eb --target-dsn "dbname=event_booking" --recreate -j 8
+#   python3 backup_tool.py --verify /var/backups/eb --target-dsn "dbname=event_booking_copy" --engines postgres
+import argparse
+import hashlib
+import json
+import os
+import random
+import shlex
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+from psycopg2 import sql
+from psycopg2.extensions import make_dsn, parse_dsn
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mongo'))
+from benchstats import load_report, save_report  # noqa: E402
+
+MONGO_URI = 'mongodb://localhost:27017/'
+MONGO_DB = 'event_booking_system'
+MANIFEST = 'manifest.json'
+
+# Estimates below this are compared by absolute difference, not by ratio
+SMALL_TABLE = 1000
+INTEGER_TYPES = ("smallint", "integer", "bigint")
+
+
+def run(command):
+    print("  $ " + shlex.join(command))
+    subprocess.run(command, check=True)
+
+
+def tool(args, name):
+    return os.path.join(args.pg_bin, name) if args.pg_bin else name
+
+
+def dir_size(path):
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, files in os.walk(path) for name in files)
+
+
+def timed(phases, name, data_bytes, action, output=None):
+    """Run one phase and record seconds, data MB, output MB and MB/s"""
+    started = time.perf_counter()
+    result = action()
+    seconds = time.perf_counter() - started
+    mb = data_bytes / 1048576
+    phase = {"seconds": round(seconds, 2), "data_mb": round(mb, 1),
+             "mb_per_s": round(mb / seconds, 1) if seconds else None}
+    if output:
+        phase["output_mb"] = round(dir_size(output) / 1048576, 1)
+    phases[name] = phase
+    print(f"  {name:<16} {seconds:>8.1f}s {mb:>10.1f} MB {phase['mb_per_s'] or 0:>8.1f} MB/s"
+          + (f"  (on disk {phase['output_mb']} MB)" if output else ""))
+    return result
+
+
+# ---------- PostgreSQL ----------
+
+def pg_tables(cur):
+    """Top-level tables: estimated rows (None if never analyzed) and primary key columns"""
+    cur.execute("""
+        SELECT c.oid::regclass::text,
+               CASE WHEN c.relkind = 'p' THEN
+                   (SELECT sum(l.reltuples) FILTER (WHERE l.reltuples >= 0)
+                    FROM pg_partition_tree(c.oid) t JOIN pg_class l ON l.oid = t.relid
+                    WHERE t.isleaf)
+               WHEN c.reltuples >= 0 THEN c.reltuples END,
+               (SELECT array_agg(a.attname::text ORDER BY k.ord)
+                FROM pg_index i
+                CROSS JOIN unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = k.attnum
+                WHERE i.indrelid = c.oid AND i.indisprimary),
+               (SELECT format_type(a.atttypid, a.atttypmod)
+                FROM pg_index i JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                WHERE i.indrelid = c.oid AND i.indisprimary)
+        FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+        ORDER BY 1
+    """)
+    return [{"table": table, "estimate": None if estimate is None else int(estimate),
+             "key": key, "key_type": key_type}
+            for table, estimate, key, key_type in cur.fetchall()]
+
+
+def pg_range_checksum(cur, table, key, start, end):
+    cur.execute(sql.SQL("""
+        SELECT count(*), md5(coalesce(string_agg(t::text, E'\\n' ORDER BY {order}), ''))
+        FROM {table} t WHERE {first} >= %s AND {first} < %s
+    """).format(table=sql.SQL(table), first=sql.Identifier(key[0]),
+                order=sql.SQL(", ").join(sql.Identifier(column) for column in key)), (start, end))
+    rows, digest = cur.fetchone()
+    return {"start": start, "end": end, "rows": rows, "md5": digest}
+
+
+def pg_sample_ranges(cur, info, ranges, range_rows, rng):
+    """Key ranges to checksum; the min/max lookups and range scans go through the primary key"""
+    if not info["key"] or info["key_type"] not in INTEGER_TYPES:
+        return []
+    first = sql.Identifier(info["key"][0])
+    cur.execute(sql.SQL("SELECT min({first}), max({first}) FROM {table}").format(
+        first=first, table=sql.SQL(info["table"])))
+    low, high = cur.fetchone()
+    if low is None:
+        return [(0, 1)]
+    # About range_rows rows per range, also when the first key column repeats
+    # (e.g. eventseats by event_id)
+    span = high - low + 1
+    width = max(1, span * range_rows // info["estimate"]) if info["estimate"] else range_rows
+    if span <= ranges * width:
+        return [(low, high + 1)]
+    starts = sorted(rng.sample(range(low, high + 2 - width), ranges))
+    return [(start, start + width) for start in starts]
+
+
+def pg_database_size(cur):
+    cur.execute("SELECT pg_database_size(current_database())")
+    return cur.fetchone()[0]
+
+
+def pg_backup(args, out_dir, phases, rng):
+    # The connection keeps the exported snapshot alive until pg_dump is done
+    conn = psycopg2.connect(args.dsn)
+    conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
+    cur = conn.cursor()
+    cur.execute("SELECT pg_export_snapshot()")
+    snapshot = cur.fetchone()[0]
+    size = pg_database_size(cur)
+    tables = pg_tables(cur)
+
+    def checksums():
+        for info in tables:
+            info["ranges"] = [pg_range_checksum(cur, info["table"], info["key"], start, end)
+                              for start, end in pg_sample_ranges(cur, info, args.sample_ranges,
+                                                                 args.range_rows, rng)]
+
+    sampled = sum(1 for info in tables if info["key_type"] in INTEGER_TYPES)
+    timed(phases, "pg_checksums", 0, checksums)
+    path = os.path.join(out_dir, "postgres")
+    timed(phases, "pg_dump", size, lambda: run([
+        tool(args, "pg_dump"), "--format=directory", f"--jobs={args.jobs}", f"--compress={args.compress}",
+        f"--snapshot={snapshot}", f"--file={path}", f"--dbname={args.dsn}"]), output=path)
+    conn.rollback()
+    conn.close()
+    print(f"  {len(tables)} tables, {sampled} with sampled checksums")
+    return {"size_bytes": size, "tables": tables}
+
+
+def pg_recreate(target_dsn):
+    params = parse_dsn(target_dsn)
+    name = params.get("dbname")
+    if not name:
+        raise SystemExit("--recreate needs dbname in --target-dsn")
+    conn = psycopg2.connect(make_dsn(target_dsn, dbname="postgres"))
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+        cur.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+    conn.close()
+    print(f"  database {name} recreated")
+
+
+def pg_restore(args, backup_dir, manifest, phases):
+    if args.recreate:
+        pg_recreate(args.target_dsn)
+    size = manifest["postgres"]["size_bytes"]
+    timed(phases, "pg_restore", size, lambda: run([
+        tool(args, "pg_restore"), f"--jobs={args.jobs}", "--no-owner", "--exit-on-error",
+        f"--dbname={args.target_dsn}", os.path.join(backup_dir, "postgres")]))
+    # pg_restore does not bring planner statistics; estimates come from ANALYZE
+    timed(phases, "pg_analyze", size, lambda: run([
+        tool(args, "vacuumdb"), "--analyze-only", f"--jobs={args.jobs}", f"--dbname={args.target_dsn}"]))
+
+
+def estimate_matches(before, after, tolerance):
+    if before is None or after is None:
+        return True
+    larger = max(before, after)
+    if larger < SMALL_TABLE:
+        return abs(before - after) < SMALL_TABLE
+    return abs(before - after) <= tolerance * larger
+
+
+def pg_verify(args, manifest):
+    conn = psycopg2.connect(args.target_dsn)
+    problems = 0
+    with conn, conn.cursor() as cur:
+        current = {info["table"]: info for info in pg_tables(cur)}
+        print(f"\n{'table':<32} {'estimate':>12} {'restored':>12} {'ranges':>8}  status")
+        for info in manifest["postgres"]["tables"]:
+            restored = current.get(info["table"])
+            if restored is None:
+                print(f"{info['table']:<32} {'-':>12} {'-':>12} {'-':>8}  MISSING")
+                problems += 1
+                continue
+            bad = [r for r in info["ranges"]
+                   if pg_range_checksum(cur, info["table"], info["key"], r["start"], r["end"]) != r]
+            ok = estimate_matches(info["estimate"], restored["estimate"], args.tolerance) and not bad
+            problems += not ok
+            print(f"{info['table']:<32} {info['estimate'] if info['estimate'] is not None else '-':>12} "
+                  f"{restored['estimate'] if restored['estimate'] is not None else '-':>12} "
+                  f"{len(info['ranges']) - len(bad):>3}/{len(info['ranges']):<4}  {'ok' if ok else 'MISMATCH'}")
+    conn.close()
+    return problems
+
+
+# ---------- MongoDB ----------
+
+def mongo_collections(db):
+    """Regular collections; views and time-series buckets are restored but not sampled"""
+    return sorted(spec["name"] for spec in db.list_collections()
+                  if spec.get("type", "collection") == "collection" and not spec["name"].startswith("system."))
+
+
+def mongo_range_checksum(collection, start_id, range_rows):
+    from bson.raw_bson import RawBSONDocument
+    from bson.codec_options import CodecOptions
+    raw = collection.with_options(codec_options=CodecOptions(document_class=RawBSONDocument))
+    digest, rows = hashlib.md5(), 0
+    for doc in raw.find({"_id": {"$gte": start_id}}).sort("_id", 1).limit(range_rows):
+        digest.update(doc.raw)
+        rows += 1
+    return {"rows": rows, "md5": digest.hexdigest()}
+
+
+def mongo_backup(args, out_dir, phases):
+    from bson import json_util
+    from pymongo import MongoClient
+    db = MongoClient(args.mongo_uri)[args.mongo_db]
+    size = db.command("dbStats")["dataSize"]
+    collections = []
+
+    # mongodump without --oplog is not a point-in-time copy: writes during the
+    # dump show up as estimate or checksum mismatches at verification
+    def checksums():
+        for name in mongo_collections(db):
+            collection = db[name]
+            ranges = []
+            for doc in collection.aggregate([{"$sample": {"size": args.sample_ranges}}, {"$project": {"_id": 1}}]):
+                entry = mongo_range_checksum(collection, doc["_id"], args.range_rows)
+                ranges.append(dict(entry, start=json_util.dumps(doc["_id"])))
+            collections.append({"collection": name, "estimate": collection.estimated_document_count(),
+                                "ranges": ranges})
+
+    timed(phases, "mongo_checksums", 0, checksums)
+    path = os.path.join(out_dir, "mongo")
+    timed(phases, "mongodump", size, lambda: run([
+        "mongodump", f"--uri={args.mongo_uri}", f"--db={args.mongo_db}", "--gzip",
+        f"--numParallelCollections={args.jobs}", f"--out={path}"]), output=path)
+    return {"db": args.mongo_db, "size_bytes": size, "collections": collections}
+
+
+def mongo_restore(args, backup_dir, manifest, phases):
+    source = manifest["mongo"]["db"]
+    timed(phases, "mongorestore", manifest["mongo"]["size_bytes"], lambda: run([
+        "mongorestore", f"--uri={args.target_mongo_uri}", "--gzip", "--drop",
+        f"--numParallelCollections={args.jobs}", f"--numInsertionWorkersPerCollection={args.insert_workers}",
+        f"--nsFrom={source}.*", f"--nsTo={args.mongo_db}.*", os.path.join(backup_dir, "mongo")]))
+
+
+def mongo_verify(args, manifest):
+    from bson import json_util
+    from pymongo import MongoClient
+    db = MongoClient(args.target_mongo_uri)[args.mongo_db]
+    problems = 0
+    print(f"\n{'collection':<32} {'estimate':>12} {'restored':>12} {'ranges':>8}  status")
+    for info in manifest["mongo"]["collections"]:
+        collection = db[info["collection"]]
+        restored = collection.estimated_document_count()
+        bad = [r for r in info["ranges"]
+               if mongo_range_checksum(collection, json_util.loads(r["start"]), args.range_rows)
+               != {"rows": r["rows"], "md5": r["md5"]}]
+        ok = estimate_matches(info["estimate"], restored, args.tolerance) and not bad
+        problems += not ok
+        print(f"{info['collection']:<32} {info['estimate']:>12} {restored:>12} "
+              f"{len(info['ranges']) - len(bad):>3}/{len(info['ranges']):<4}  {'ok' if ok else 'MISMATCH'}")
+    return problems
+
+
+# ---------- CLI ----------
+
+def verify(args, manifest, engines, phases):
+    problems = 0
+    if "postgres" in engines and "postgres" in manifest:
+        problems += timed(phases, "pg_verify", 0, lambda: pg_verify(args, manifest))
+    if "mongo" in engines and "mongo" in manifest:
+        problems += timed(phases, "mongo_verify", 0, lambda: mongo_verify(args, manifest))
+    print(f"\nVerification: {'OK' if not problems else f'{problems} mismatches'}")
+    return problems
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Parallel compressed backup/restore for PostgreSQL and MongoDB")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--backup", metavar="DIR", help="dump into DIR (must not exist)")
+    action.add_argument("--restore", metavar="DIR", help="restore DIR, then verify")
+    action.add_argument("--verify", metavar="DIR", help="only compare the target with DIR/manifest.json")
+    parser.add_argument("--engines", default="postgres,mongo")
+    parser.add_argument("--dsn", default="dbname=event_booking", help="source database for --backup")
+    parser.add_argument("--target-dsn", help="database for --restore/--verify (default: --dsn)")
+    parser.add_argument("--recreate", action="store_true", help="drop and create the target database first")
+    parser.add_argument("--pg-bin", help="directory with pg_dump/pg_restore/vacuumdb")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--target-mongo-uri", help="default: --mongo-uri")
+    parser.add_argument("--mongo-db", default=MONGO_DB)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 4,
+                        help="parallel tables (pg) and collections (mongo)")
+    parser.add_argument("--insert-workers", type=int, default=2, help="mongorestore workers per collection")
+    parser.add_argument("--compress", default="6", help="pg_dump -Z: level, or method:level on PostgreSQL 16+")
+    parser.add_argument("--sample-ranges", type=int, default=8, help="checksummed ranges per table")
+    parser.add_argument("--range-rows", type=int, default=1000, help="keys per checksummed range")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative estimate difference")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--report", help="write phase timings as JSON")
+    args = parser.parse_args()
+    args.target_dsn = args.target_dsn or args.dsn
+    args.target_mongo_uri = args.target_mongo_uri or args.mongo_uri
+    return args
+
+
+def main():
+    args = parse_args()
+    engines = args.engines.split(",")
+    phases = {}
+    problems = 0
+    print(f"=== BACKUP TOOL {datetime.now():%Y-%m-%d %H:%M} ===")
+
+    if args.backup:
+        os.makedirs(args.backup)
+        rng = random.Random(args.seed)
+        manifest = {"created_at": datetime.now().isoformat(timespec="seconds"), "compress": args.compress,
+                    "sample_ranges": args.sample_ranges, "range_rows": args.range_rows}
+        if "postgres" in engines:
+            manifest["postgres"] = pg_backup(args, args.backup, phases, rng)
+        if "mongo" in engines:
+            manifest["mongo"] = mongo_backup(args, args.backup, phases)
+        manifest["phases"] = phases
+        with open(os.path.join(args.backup, MANIFEST), "w") as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Backup: {args.backup} ({dir_size(args.backup) / 1048576:.1f} MB)")
+    else:
+        backup_dir = args.restore or args.verify
+        manifest = load_report(os.path.join(backup_dir, MANIFEST))
+        args.range_rows = manifest["range_rows"]
+        if args.restore:
+            if "postgres" in engines and "postgres" in manifest:
+                pg_restore(args, backup_dir, manifest, phases)
+            if "mongo" in engines and "mongo" in manifest:
+                mongo_restore(args, backup_dir, manifest, phases)
+        problems = verify(args, manifest, engines, phases)
+
+    if args.report:
+        save_report(args.report, {"phases": phases, "problems": problems})
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# bench_queries.py - Latency benchmark for the named business queries
+#
+# Every SELECT in the given SQL files becomes a named query (the comment line
+# right above it is the name). Each query runs --iterations times over a
+# connection pool at --concurrency, after --warmup untimed runs. The JSON
+# report holds p50/p95/p99 latency, rows/sec and the EXPLAIN (ANALYZE, BUFFERS)
+# plan per query, so two runs can be diffed with --compare.
+#
+# Example:
+#   python3 load_data.py --dsn "dbname=event_booking" --scale bookings=1000
+#   python3 bench_queries.py --dsn "dbname=event_booking" --label scale-1000 \
+#       --iterations 50 --concurrency 8 --output before.json
+#   python3 bench_queries.py --dsn "dbname=event_booking" --compare before.json
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mongo'))
+from benchstats import compare, load_report, print_comparison, save_report, summarize  # noqa: E402
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_FILES = [
+    os.path.join(LAB_DIR, '03_business_queries.sql'),
+    os.path.join(LAB_DIR, 'benchmark_queries.sql'),
+]
+
+FETCH_SIZE = 10000
+
+
+def parse_queries(path):
+    """Named SELECT statements from an SQL file: {"file:comment": sql}"""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    stem = os.path.splitext(os.path.basename(path))[0]
+    queries = {}
+    for statement in text.split(";"):
+        lines = statement.strip().splitlines()
+        comments = [line[2:].strip() for line in lines if line.startswith("--")]
+        sql = "\n".join(line for line in lines if not line.startswith("--")).strip()
+        if not re.match(r"(SELECT|WITH)\b", sql, re.IGNORECASE):
+            continue
+        title = comments[-1] if comments else f"query {len(queries) + 1}"
+        queries[f"{stem}: {title}"] = sql
+    return queries
+
+
+class QueryRunner:
+    """Runs statements on pooled connections; one connection per thread at a time"""
+
+    def __init__(self, dsn, concurrency, statement_timeout_ms):
+        self.pool = ThreadedConnectionPool(1, concurrency, dsn)
+        self.statement_timeout_ms = statement_timeout_ms
+        self.prepared = set()
+        self.lock = threading.Lock()
+
+    def _setup(self, conn):
+        with self.lock:
+            if id(conn) in self.prepared:
+                return
+            self.prepared.add(id(conn))
+        with conn.cursor() as cur:
+            cur.execute("SET statement_timeout = %s", (self.statement_timeout_ms,))
+            # Server-side cursors are planned for full retrieval, like a plain query
+            cur.execute("SET cursor_tuple_fraction = 1.0")
+        conn.commit()
+
+    def run(self, sql):
+        """Execute and fetch everything; returns (latency_ms, rows)"""
+        conn = self.pool.getconn()
+        try:
+            self._setup(conn)
+            started = time.perf_counter()
+            rows = 0
+            # Named cursor streams the result, so big reports do not sit in memory
+            with conn.cursor(name="bench") as cur:
+                cur.itersize = FETCH_SIZE
+                cur.execute(sql)
+                for _ in cur:
+                    rows += 1
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            conn.commit()
+            return elapsed_ms, rows
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def explain(self, sql):
+        conn = self.pool.getconn()
+        try:
+            self._setup(conn)
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+                plan = cur.fetchone()[0][0]
+            conn.commit()
+            return plan
+        except psycopg2.Error:
+            conn.rollback()
+            raise
+        finally:
+            self.pool.putconn(conn)
+
+    def server_version(self):
+        conn = self.pool.getconn()
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SHOW server_version")
+                return cur.fetchone()[0]
+        finally:
+            conn.rollback()
+            self.pool.putconn(conn)
+
+    def close(self):
+        self.pool.closeall()
+
+
+def plan_summary(plan):
+    root = plan["Plan"]
+    return {
+        "planning_ms": plan.get("Planning Time"),
+        "execution_ms": plan.get("Execution Time"),
+        "root_node": root.get("Node Type"),
+        "shared_hit_blocks": root.get("Shared Hit Blocks"),
+        "shared_read_blocks": root.get("Shared Read Blocks"),
+        "temp_written_blocks": root.get("Temp Written Blocks"),
+    }
+
+
+def bench_query(runner, executor, sql, iterations, warmup):
+    for _ in range(warmup):
+        runner.run(sql)
+
+    started = time.perf_counter()
+    results = list(executor.map(lambda _: runner.run(sql), range(iterations)))
+    wall = time.perf_counter() - started
+
+    latencies = [latency for latency, _ in results]
+    rows = sum(count for _, count in results)
+    stats = summarize(latencies)
+    stats.update({
+        "rows_per_call": results[0][1] if results else 0,
+        "rows_per_sec": round(rows / wall, 1) if wall > 0 else None,
+        "calls_per_sec": round(iterations / wall, 2) if wall > 0 else None,
+    })
+    return stats
+
+
+def run_benchmark(dsn, files, iterations, concurrency, warmup, statement_timeout_ms,
+                  label=None, only=None, explain=True):
+    queries = {}
+    for path in files:
+        queries.update(parse_queries(path))
+    if only:
+        queries = {name: sql for name, sql in queries.items() if re.search(only, name)}
+
+    runner = QueryRunner(dsn, concurrency, statement_timeout_ms)
+    report = {
+        "meta": {
+            "label": label,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "server_version": runner.server_version(),
+            "iterations": iterations,
+            "concurrency": concurrency,
+            "warmup": warmup,
+            "files": [os.path.basename(path) for path in files],
+        },
+        "queries": {},
+    }
+
+    print(f"=== QUERY BENCHMARK: {len(queries)} queries, {iterations} runs x {concurrency} threads ===")
+    with ThreadPoolExecutor(concurrency) as executor:
+        for name, sql in queries.items():
+            entry = {"sql": sql}
+            try:
+                entry["latency"] = bench_query(runner, executor, sql, iterations, warmup)
+                if explain:
+                    plan = runner.explain(sql)
+                    entry["explain"] = plan_summary(plan)
+                    entry["plan"] = plan
+                latency = entry["latency"]
+                print(f"✓ {name}\n    p50 {latency['p50_ms']} ms, p95 {latency['p95_ms']} ms, "
+                      f"p99 {latency['p99_ms']} ms, {latency['rows_per_sec']} rows/s")
+            except psycopg2.Error as e:
+                entry["error"] = str(e).strip()
+                print(f"✗ {name}\n    {entry['error']}")
+            report["queries"][name] = entry
+
+    runner.close()
+    return report
+
+
+def latency_table(report):
+    return {name: entry["latency"] for name, entry in report["queries"].items() if "latency" in entry}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark named business queries")
+    parser.add_argument("--dsn", default="dbname=event_booking")
+    parser.add_argument("--file", action="append", dest="files",
+                        help="SQL file with named queries (repeatable); defaults to the lab2 query files")
+    parser.add_argument("--only", help="regex to select query names")
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--statement-timeout", type=int, default=60000, help="ms")
+    parser.add_argument("--no-explain", action="store_true")
+    parser.add_argument("--label", help="free-form run label, e.g. data scale or index set")
+    parser.add_argument("--output", default="bench_queries_report.json")
+    parser.add_argument("--compare", help="baseline report to diff against")
+    parser.add_argument("--threshold", type=float, default=1.2,
+                        help="p95 ratio above which a query counts as regressed")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmark(
+        args.dsn, args.files or DEFAULT_FILES, args.iterations, args.concurrency,
+        args.warmup, args.statement_timeout, label=args.label, only=args.only,
+        explain=not args.no_explain
+    )
+    save_report(args.output, report)
+    print(f"Report: {args.output}")
+
+    if args.compare:
+        rows = compare(latency_table(load_report(args.compare)), latency_table(report),
+                       threshold=args.threshold)
+        print_comparison(rows)
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
@@ -0,0 +1,19 @@
+-- Lab2-schema versions of the ad-hoc queries in request.sql and request2.sql,
+-- with date ranges relative to the current date so they hit generated data.
+
+-- request.sql: Users + Bookings + Events + Transactions for an event date range
+SELECT *
+FROM Users u
+INNER JOIN Bookings b ON u.user_id = b.user_id
+INNER JOIN Events e ON b.event_id = e.event_id
+INNER JOIN Transactions t ON b.booking_id = t.booking_id
+WHERE e.event_date BETWEEN CURRENT_DATE AND CURRENT_DATE + INTERVAL '30 days'
+ORDER BY u.last_name, e.event_date;
+
+-- request2.sql: Users + Bookings page via LIMIT/OFFSET
+SELECT *
+FROM Users u
+INNER JOIN Bookings b ON u.user_id = b.user_id
+WHERE b.booking_date BETWEEN CURRENT_DATE - INTERVAL '30 days' AND CURRENT_DATE
+ORDER BY u.last_name, b.booking_date
+LIMIT 10 OFFSET 5;
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# load_data.py - Bulk loader for the lab2 schema using COPY ... FROM STDIN
+#
+# Rows come from the shared data spec (mongo/datagen.py), so the same --seed,
+# --scale and --anchor produce the same data set as the MongoDB generator (the
+# anchor defaults to today and is printed, pass it to match an earlier load). Tables are
+# streamed in CSV chunks over several connections: parent tables first, then
+# child table chunks in parallel once the parent IDs exist. With
+# --rebuild-indexes the indexes from 05_indexes_optimization.sql are dropped
+# before the load and rebuilt in parallel afterwards. With --drop-foreign-keys
+# the per-row FK triggers are skipped and every FK is validated once at the end.
+# Summary triggers on Bookings are paused during the load and the reporting
+# summaries are rebuilt afterwards. If the tables are partitioned by month,
+# the month partitions for the generated dates are created before the COPY so
+# no row goes through the DEFAULT partition, and Transactions.booking_date (the
+# copy of the Bookings partition key) is written by the COPY rather than looked
+# up by the fill trigger row by row.
+#
+# Example (50M bookings, 8 connections):
+#   python3 load_data.py --dsn "dbname=event_booking" \
+#       --scale users=5000,events=1000,bookings=170000,reviews=2000 \
+#       --jobs 8 --rebuild-indexes --drop-foreign-keys
+import argparse
+import csv
+import io
+import os
+import re
+import sys
+import time
+from multiprocessing import Pool
+
+import psycopg2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mongo'))
+from datagen import PG_CARRIED_COLUMNS, PG_COLUMNS, add_spec_arguments, spec_from_args  # noqa: E402
+
+INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '05_indexes_optimization.sql')
+
+# Tables in the same phase only reference tables from earlier phases
+LOAD_PHASES = [
+    ["organizers", "venues"],
+    ["seats", "users", "events"],
+    ["bookings", "reviews"],
+    ["transactions"],
+]
+
+SERIAL_COLUMNS = {
+    "organizers": "organizer_id",
+    "venues": "venue_id",
+    "seats": "seat_id",
+    "users": "user_id",
+    "events": "event_id",
+    "bookings": "booking_id",
+    "transactions": "transaction_id",
+    "reviews": "review_id",
+}
+
+spec = None
+conn = None
+carried = set()
+
+
+def init_worker(dsn, data_spec, carried_tables):
+    """Each worker process keeps its own connection"""
+    global spec, conn, carried
+    spec = data_spec
+    conn = psycopg2.connect(dsn)
+    carried = carried_tables
+
+
+def copy_chunk(task):
+    """Generate one chunk of rows into a CSV buffer and COPY it in its own transaction"""
+    table, start, size = task
+    text = io.StringIO()
+    csv.writer(text).writerows(spec.pg_rows(table, start, size, carried=table in carried))
+    buffer = io.BytesIO(text.getvalue().encode("utf-8"))
+
+    columns = ", ".join(PG_COLUMNS[table] + ((PG_CARRIED_COLUMNS[table][0],) if table in carried else ()))
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')", buffer)
+    conn.commit()
+    return table, size
+
+
+def load_indexes():
+    """Index names and statements from 05_indexes_optimization.sql"""
+    with open(INDEX_FILE) as f:
+        sql = f.read()
+    pattern = re.compile(r"CREATE INDEX IF NOT EXISTS (\w+) ON [^;]+;", re.IGNORECASE)
+    return [(m.group(1), m.group(0)) for m in pattern.finditer(sql)]
+
+
+def drop_indexes(dsn, indexes):
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        for name, _ in indexes:
+            cur.execute(f"DROP INDEX IF EXISTS {name}")
+    print(f"Dropped {len(indexes)} indexes")
+
+
+def create_index(task):
+    dsn, name, statement = task
+    started = time.perf_counter()
+    c = psycopg2.connect(dsn)
+    c.autocommit = True
+    try:
+        with c.cursor() as cur:
+            cur.execute(statement)
+        return name, time.perf_counter() - started, None
+    except psycopg2.Error as e:
+        return name, time.perf_counter() - started, str(e).strip()
+    finally:
+        c.close()
+
+
+def rebuild_indexes(dsn, indexes, jobs):
+    print("Rebuilding indexes...")
+    tasks = [(dsn, name, statement) for name, statement in indexes]
+    with Pool(jobs) as pool:
+        for name, elapsed, error in pool.imap_unordered(create_index, tasks):
+            if error:
+                print(f"  ✗ {name}: {error}")
+            else:
+                print(f"  ✓ {name} ({elapsed:.1f}s)")
+
+
+def drop_foreign_keys(dsn):
+    """Drop FKs of the loaded tables and return statements that restore them"""
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute("""
+            SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid)
+            FROM pg_constraint
+            WHERE contype = 'f' AND conparentid = 0 AND conrelid::regclass::text = ANY(%s)
+        """, (list(SERIAL_COLUMNS),))
+        constraints = cur.fetchall()
+        for table, name, _ in constraints:
+            cur.execute(f"ALTER TABLE {table} DROP CONSTRAINT {name}")
+    print(f"Dropped {len(constraints)} foreign keys")
+    return [f"ALTER TABLE {table} ADD CONSTRAINT {name} {definition}"
+            for table, name, definition in constraints]
+
+
+def restore_foreign_keys(dsn, statements, validate=True):
+    """NOT VALID keeps the constraints for new rows when the loaded data may be incomplete"""
+    print("Restoring foreign keys...")
+    started = time.perf_counter()
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        for statement in statements:
+            cur.execute(statement if validate else statement + " NOT VALID")
+    if validate:
+        print(f"  ✓ {len(statements)} foreign keys validated ({time.perf_counter() - started:.1f}s)")
+    else:
+        print(f"  ✓ {len(statements)} foreign keys restored as NOT VALID, "
+              f"run ALTER TABLE ... VALIDATE CONSTRAINT after fixing the data")
+
+
+def truncate(dsn):
+    tables = ", ".join(list(SERIAL_COLUMNS) + ["refunds"])
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute(f"TRUNCATE {tables} RESTART IDENTITY CASCADE")
+
+
+def reset_sequences(dsn):
+    """COPY writes explicit IDs, so SERIAL sequences have to be moved past them"""
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        for table, column in SERIAL_COLUMNS.items():
+            cur.execute(
+                f"SELECT setval(pg_get_serial_sequence(%s, %s), COALESCE(MAX({column}), 0) + 1, false) "
+                f"FROM {table}",
+                (table, column)
+            )
+
+
+def set_user_triggers(dsn, enabled):
+    """Summary triggers (06_reporting_summaries.sql) would make parallel COPY chunks
+    contend on the same summary rows; they are paused and the summaries rebuilt once"""
+    action = "ENABLE" if enabled else "DISABLE"
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute(f"ALTER TABLE bookings {action} TRIGGER USER")
+
+
+def rebuild_summaries(dsn):
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute("SELECT to_regproc('rebuild_reporting_summaries') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return
+        started = time.perf_counter()
+        cur.execute("SELECT rebuild_reporting_summaries()")
+    print(f"Reporting summaries rebuilt ({time.perf_counter() - started:.1f}s)")
+
+
+def create_partitions(dsn, data_spec):
+    """Month partitions covering the generated dates (09_partitioning.sql):
+    otherwise the COPY fills DEFAULT and every row is copied a second time"""
+    first, last = data_spec.pg_date_range()
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute("SELECT to_regproc('create_month_partition') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return
+        cur.execute("SELECT relname FROM pg_class WHERE relkind = 'p' AND relname IN ('bookings', 'transactions')")
+        for (table,) in cur.fetchall():
+            cur.execute("SELECT count(create_month_partition(%s, month)) "
+                        "FROM generate_series(date_trunc('month', %s::timestamp), %s, INTERVAL '1 month') AS month",
+                        (table, first, last))
+            created = cur.fetchone()[0]
+            if created:
+                print(f"{table}: {created} month partitions created for {first:%Y-%m}..{last:%Y-%m}")
+
+
+def carried_tables(dsn):
+    """Tables that already hold a copy of the referenced partition key (09_partitioning.sql)"""
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute("""
+            SELECT table_name FROM information_schema.columns
+            WHERE table_schema = current_schema()
+              AND (table_name, column_name) IN (SELECT * FROM unnest(%s::text[], %s::text[]))
+        """, (list(PG_CARRIED_COLUMNS), [column for column, _ in PG_CARRIED_COLUMNS.values()]))
+        return {table for (table,) in cur.fetchall()}
+
+
+def split_default_partitions(dsn):
+    """Rows loaded into partitioned tables (09_partitioning.sql) outside the
+    pre-created months land in the DEFAULT partition; move them into months"""
+    with psycopg2.connect(dsn) as c, c.cursor() as cur:
+        cur.execute("SELECT to_regproc('ensure_partitions') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return
+        cur.execute("SELECT relname FROM pg_class WHERE relkind = 'p' AND relname = ANY(%s)",
+                    (list(SERIAL_COLUMNS) + ["eventlogs"],))
+        for (table,) in cur.fetchall():
+            started = time.perf_counter()
+            cur.execute("SELECT ensure_partitions(%s)", (table,))
+            created = cur.fetchone()[0]
+            if created:
+                print(f"{table}: {created} month partitions created ({time.perf_counter() - started:.1f}s)")
+
+
+def analyze(dsn):
+    c = psycopg2.connect(dsn)
+    c.autocommit = True
+    with c.cursor() as cur:
+        for table in SERIAL_COLUMNS:
+            cur.execute(f"ANALYZE {table}")
+    c.close()
+
+
+def iter_tasks(tables, data_spec, chunk_size):
+    for table in tables:
+        total = data_spec.pg_row_count(table)
+        for start in range(0, total, chunk_size):
+            yield table, start, min(chunk_size, total - start)
+
+
+def load(dsn, data_spec, jobs=4, chunk_size=100000, rebuild=False, drop_fks=False):
+    print("=== COPY LOADER ===")
+    print(f"Seed: {data_spec.seed}, sizes: {data_spec.sizes}, anchor: {data_spec.anchor:%Y-%m-%d}")
+    started_all = time.perf_counter()
+
+    truncate(dsn)
+    indexes = load_indexes() if rebuild else []
+    foreign_keys = []
+    restored = False
+
+    try:
+        if rebuild:
+            drop_indexes(dsn, indexes)
+        if drop_fks:
+            foreign_keys = drop_foreign_keys(dsn)
+        create_partitions(dsn, data_spec)
+        set_user_triggers(dsn, False)
+
+        with Pool(jobs, initializer=init_worker, initargs=(dsn, data_spec, carried_tables(dsn))) as pool:
+            for tables in LOAD_PHASES:
+                started = time.perf_counter()
+                loaded = dict.fromkeys(tables, 0)
+                tasks = iter_tasks(tables, data_spec, chunk_size)
+                for table, size in pool.imap_unordered(copy_chunk, tasks):
+                    loaded[table] += size
+                elapsed = time.perf_counter() - started
+                for table, rows in loaded.items():
+                    print(f"  {table}: {rows} rows")
+                rows = sum(loaded.values())
+                print(f"Phase {', '.join(tables)}: {rows} rows in {elapsed:.1f}s "
+                      f"({rows / elapsed if elapsed > 0 else 0:.0f} rows/s)")
+
+        reset_sequences(dsn)
+        split_default_partitions(dsn)
+        if rebuild:
+            rebuild_indexes(dsn, indexes, jobs)
+        # FK validation joins against the parent tables, so it runs after the indexes exist
+        if foreign_keys:
+            restore_foreign_keys(dsn, foreign_keys)
+        restored = True
+    finally:
+        # A failed load must not leave the summaries unmaintained
+        set_user_triggers(dsn, True)
+        # ...nor the schema without the dropped indexes and FKs, whose DDL only lives here
+        if not restored:
+            if rebuild:
+                rebuild_indexes(dsn, indexes, jobs)
+            if foreign_keys:
+                restore_foreign_keys(dsn, foreign_keys, validate=False)
+    rebuild_summaries(dsn)
+    analyze(dsn)
+
+    print(f"=== COMPLETED in {time.perf_counter() - started_all:.1f}s ===")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="COPY-based loader for the lab2 schema")
+    parser.add_argument("--dsn", default="dbname=event_booking")
+    add_spec_arguments(parser)
+    parser.add_argument("--jobs", type=int, default=4, help="parallel connections")
+    parser.add_argument("--chunk-size", type=int, default=100000, help="rows per COPY")
+    parser.add_argument("--rebuild-indexes", action="store_true",
+                        help="drop indexes from 05_indexes_optimization.sql and rebuild after the load")
+    parser.add_argument("--drop-foreign-keys", action="store_true",
+                        help="load without FK triggers and validate the constraints once afterwards")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    load(args.dsn, spec_from_args(args), jobs=args.jobs, chunk_size=args.chunk_size,
+         rebuild=args.rebuild_indexes, drop_fks=args.drop_foreign_keys)
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+# partition_benchmark.py - Partition pruning on the date-range business queries
+#
+# Runs date-range queries in the spirit of request.sql and
+# 03_business_queries.sql against the partitioned Bookings / Transactions /
+# EventLogs (09_partitioning.sql). For every query the report shows latency,
+# shared buffers touched, and how many partitions the plan actually scans
+# versus how many exist (pruned at plan time or at execution time,
+# "Subplans Removed"). With --compare-flat the same queries also run against
+# unpartitioned copies (<table>_flat, same indexes), which are dropped
+# afterwards unless --keep-flat is given.
+#
+# The range defaults to the last full month with bookings; --from/--to override it.
+#
+# Example:
+#   python3 partition_benchmark.py --dsn "dbname=event_booking" --compare-flat --output partitions.json
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+import psycopg2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'mongo'))
+from benchstats import save_report, summarize  # noqa: E402
+
+TABLES = {"bookings": "booking_date", "transactions": "transaction_time", "eventlogs": "log_timestamp"}
+
+# Indexes for the unpartitioned copies, matching the ones inherited by partitions
+FLAT_INDEXES = [
+    "CREATE INDEX ON bookings_flat (booking_date)",
+    "CREATE INDEX ON bookings_flat (user_id)",
+    "CREATE INDEX ON bookings_flat (event_id)",
+    "CREATE INDEX ON bookings_flat (booking_id)",
+    "CREATE INDEX ON transactions_flat (transaction_time)",
+    "CREATE INDEX ON transactions_flat (booking_id)",
+    "CREATE INDEX ON eventlogs_flat (log_timestamp)",
+]
+
+QUERIES = {
+    # request.sql, filtered on the booking date instead of the event date
+    "bookings_with_payments_in_range": """
+        SELECT u.user_id, u.first_name, u.last_name, e.title, b.booking_date, t.amount, t.status
+        FROM {bookings} b
+        JOIN Users u ON u.user_id = b.user_id
+        JOIN Events e ON e.event_id = b.event_id
+        JOIN {transactions} t ON t.booking_id = b.booking_id
+        WHERE b.booking_date >= %(from)s AND b.booking_date < %(to)s
+          AND t.transaction_time >= %(from)s AND t.transaction_time < %(to)s
+        ORDER BY u.last_name, b.booking_date
+    """,
+    # 03_business_queries.sql section 4 for one month
+    "daily_revenue_in_range": """
+        SELECT DATE_TRUNC('day', b.booking_date) AS day, COUNT(*) AS bookings, SUM(b.total_amount) AS revenue
+        FROM {bookings} b
+        WHERE b.booking_date >= %(from)s AND b.booking_date < %(to)s
+        GROUP BY 1 ORDER BY 1
+    """,
+    "payments_by_status_in_range": """
+        SELECT t.status, COUNT(*), SUM(t.amount)
+        FROM {transactions} t
+        WHERE t.transaction_time >= %(from)s AND t.transaction_time < %(to)s
+        GROUP BY t.status
+    """,
+    "last_week_activity": """
+        SELECT l.action, COUNT(*)
+        FROM {eventlogs} l
+        WHERE l.log_timestamp >= %(to)s::timestamp - INTERVAL '7 days' AND l.log_timestamp < %(to)s
+        GROUP BY l.action
+    """,
+    # Run-time pruning: the bound is only known at execution time
+    "bookings_since_subquery": """
+        SELECT COUNT(*), SUM(b.total_amount)
+        FROM {bookings} b
+        WHERE b.booking_date >= (SELECT %(from)s::timestamp)
+          AND b.booking_date < (SELECT %(to)s::timestamp)
+    """,
+}
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+def plan_stats(cur, sql, params, partitions):
+    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql, params)
+    plan = cur.fetchone()[0][0]["Plan"]
+    scanned = set()
+    removed = 0
+    for node in walk(plan):
+        relation = node.get("Relation Name")
+        # Nodes that were never executed (loops = 0) did not scan anything
+        if relation in partitions and node.get("Actual Loops", 1) > 0:
+            scanned.add(relation)
+        removed += node.get("Subplans Removed", 0)
+    return {
+        "partitions_scanned": len(scanned),
+        "subplans_removed": removed,
+        "shared_buffers": plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0),
+        "plan_rows": plan.get("Actual Rows"),
+    }
+
+
+def partitions_of(cur):
+    cur.execute("""
+        SELECT c.relname FROM pg_inherits h JOIN pg_class c ON c.oid = h.inhrelid
+        WHERE h.inhparent = ANY(ARRAY['bookings', 'transactions', 'eventlogs']::regclass[])
+    """)
+    return {row[0] for row in cur.fetchall()}
+
+
+def default_range(cur):
+    cur.execute("""
+        SELECT date_trunc('month', MAX(booking_date)) - INTERVAL '1 month', date_trunc('month', MAX(booking_date))
+        FROM Bookings
+    """)
+    return cur.fetchone()
+
+
+def create_flat_copies(cur):
+    print("Creating unpartitioned copies...")
+    for table in TABLES:
+        cur.execute(f"DROP TABLE IF EXISTS {table}_flat")
+        cur.execute(f"CREATE TABLE {table}_flat AS SELECT * FROM {table}")
+    for statement in FLAT_INDEXES:
+        cur.execute(statement)
+    for table in TABLES:
+        cur.execute(f"ANALYZE {table}_flat")
+
+
+def run_query(cur, sql, params, iterations, partitions):
+    cur.execute(sql, params)
+    cur.fetchall()
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        cur.execute(sql, params)
+        cur.fetchall()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {"latency": summarize(latencies), **plan_stats(cur, sql, params, partitions)}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Partition pruning benchmark for the date-range queries")
+    parser.add_argument("--dsn", default="dbname=event_booking")
+    parser.add_argument("--from", dest="date_from", help="range start (default: last full month)")
+    parser.add_argument("--to", dest="date_to", help="range end, exclusive")
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--compare-flat", action="store_true", help="also run on unpartitioned copies")
+    parser.add_argument("--keep-flat", action="store_true", help="keep the unpartitioned copies")
+    parser.add_argument("--output", default="partition_benchmark.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conn = psycopg2.connect(args.dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    partitions = partitions_of(cur)
+    if not partitions:
+        sys.exit("Tables are not partitioned; run partition_maintenance.py --convert first")
+    date_from, date_to = default_range(cur)
+    params = {"from": args.date_from or date_from, "to": args.date_to or date_to}
+    print(f"Range: {params['from']} .. {params['to']}, {len(partitions)} partitions in total")
+
+    layouts = {"partitioned": {table: table for table in TABLES}}
+    if args.compare_flat:
+        create_flat_copies(cur)
+        layouts["flat"] = {table: f"{table}_flat" for table in TABLES}
+
+    results = {}
+    for name, template in QUERIES.items():
+        results[name] = {}
+        for layout, tables in layouts.items():
+            results[name][layout] = run_query(cur, template.format(**tables), params, args.iterations, partitions)
+
+    print(f"\n{'query':<34} {'layout':<12} {'p50 ms':>9} {'p95 ms':>9} {'buffers':>9} {'partitions':>11}")
+    for name, by_layout in results.items():
+        for layout, stats in by_layout.items():
+            scanned = f"{stats['partitions_scanned']}" if layout == "partitioned" else "-"
+            print(f"{name:<34} {layout:<12} {stats['latency']['p50_ms']:>9} {stats['latency']['p95_ms']:>9} "
+                  f"{stats['shared_buffers']:>9} {scanned:>11}")
+
+    if args.compare_flat and not args.keep_flat:
+        for table in TABLES:
+            cur.execute(f"DROP TABLE IF EXISTS {table}_flat")
+    conn.close()
+
+    save_report(args.output, {
+        "meta": {"range": params, "partitions": len(partitions), "iterations": args.iterations,
+                 "started_at": datetime.now().isoformat(timespec="seconds")},
+        "queries": results,
+    })
+    print(f"\nReport: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
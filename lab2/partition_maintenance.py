@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# partition_maintenance.py - Monthly partition upkeep for Bookings, Transactions and EventLogs
+#
+# Meant to run daily from cron. For every partitioned table it:
+#   1. pre-creates month partitions --months-ahead months into the future and
+#      moves any rows that ended up in the DEFAULT partition into their month;
+#   2. with --retention-months, detaches the months that ended before the
+#      retention window, archives each one to <archive-dir>/<partition>.csv.gz
+#      and drops it (or keeps it as a standalone table with --keep-detached).
+#      Rows that reference the month through a foreign key (Transactions and
+#      EventSeats -> Bookings, Refunds -> Transactions) would block the detach,
+#      so they are archived to <partition>.<table>.csv.gz and deleted first,
+#      deepest tables first. A table that cannot be retired is reported and the
+#      run goes on with the next one.
+# Indexes are defined on the parent tables, so new partitions get them on
+# creation. --convert applies 09_partitioning.sql first (a one-off migration
+# of existing unpartitioned tables). The reporting summaries
+# (06_reporting_summaries.sql) keep counting archived months; their pending
+# sales deltas are folded on every run (fold_sales_deltas()).
+#
+# Example:
+#   python3 partition_maintenance.py --dsn "dbname=event_booking" --convert --status
+#   python3 partition_maintenance.py --dsn "dbname=event_booking" --retention-months 24 \
+#       --archive-dir /var/backups/event_booking/partitions
+import argparse
+import gzip
+import os
+import time
+from datetime import datetime
+
+import psycopg2
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+SCHEMA_FILE = os.path.join(LAB_DIR, '09_partitioning.sql')
+
+PARTITIONED_TABLES = {
+    "bookings": "booking_date",
+    "transactions": "transaction_time",
+    "eventlogs": "log_timestamp",
+}
+
+
+def convert(conn):
+    started = time.perf_counter()
+    with open(SCHEMA_FILE) as f, conn, conn.cursor() as cur:
+        cur.execute(f.read())
+    for notice in conn.notices:
+        print("  " + notice.strip())
+    conn.notices.clear()
+    print(f"Converted to monthly partitions ({time.perf_counter() - started:.1f}s)")
+
+
+def is_partitioned(cur, table):
+    cur.execute("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cur.fetchone()
+    return bool(row and row[0])
+
+
+def ensure(conn, table, months_ahead):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT ensure_partitions(%s, %s)", (table, months_ahead))
+        created = cur.fetchone()[0]
+    if created:
+        print(f"  {table}: {created} partitions created")
+    return created
+
+
+def archive_rows(cur, query, path):
+    """COPY the result of query into a gzipped CSV"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with gzip.open(path + ".tmp", "wb") as f:
+        cur.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)", f)
+    os.replace(path + ".tmp", path)
+
+
+def archive_partition(conn, partition, archive_dir):
+    """COPY a detached partition into a gzipped CSV; returns (path, rows)"""
+    path = os.path.join(archive_dir, f"{partition}.csv.gz")
+    with conn, conn.cursor() as cur:
+        cur.execute(f"SELECT count(*) FROM {partition}")
+        rows = cur.fetchone()[0]
+        archive_rows(cur, f"SELECT * FROM {partition}", path)
+    return path, rows
+
+
+def references(cur, table):
+    """Foreign keys that point at table: (referencing table, its columns, referenced columns)"""
+    cur.execute("""
+        SELECT c.conrelid::regclass::text,
+               array(SELECT attname FROM unnest(c.conkey) WITH ORDINALITY k(attnum, ord)
+                     JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum ORDER BY ord),
+               array(SELECT attname FROM unnest(c.confkey) WITH ORDINALITY k(attnum, ord)
+                     JOIN pg_attribute a ON a.attrelid = c.confrelid AND a.attnum = k.attnum ORDER BY ord)
+        FROM pg_constraint c
+        WHERE c.contype = 'f' AND c.conparentid = 0 AND c.confrelid = %s::regclass AND c.conrelid <> c.confrelid
+    """, (table,))
+    return cur.fetchall()
+
+
+def release_references(cur, table, alias, condition, archive_dir, partition):
+    """Archive and delete the rows that reference rows of table matching condition
+    (an SQL predicate over alias), deepest references first; returns [(table, rows)]"""
+    released = []
+    for child, columns, ref_columns in references(cur, table):
+        child_alias = alias + "c"
+        link = " AND ".join(f"{child_alias}.{column} = {alias}.{ref}" for column, ref in zip(columns, ref_columns))
+        child_condition = f"EXISTS (SELECT 1 FROM {table} {alias} WHERE {link} AND {condition})"
+        released += release_references(cur, child, child_alias, child_condition, archive_dir, partition)
+        query = f"SELECT * FROM {child} {child_alias} WHERE {child_condition}"
+        cur.execute(f"SELECT count(*) FROM ({query}) rows")
+        rows = cur.fetchone()[0]
+        if not rows:
+            continue
+        if not archive_dir:
+            raise RuntimeError(f"{rows} rows of {child} reference {partition}; "
+                               f"--archive-dir is needed to archive them before the detach")
+        archive_rows(cur, query, os.path.join(archive_dir, f"{partition}.{child}.csv.gz"))
+        cur.execute(f"DELETE FROM {child} {child_alias} WHERE {child_condition}")
+        released.append((child, rows))
+    return released
+
+
+def retire(conn, table, retention_months, archive_dir, keep_detached, dry_run):
+    """Detach, archive and drop the months that ended before the retention window"""
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT date_trunc('month', LOCALTIMESTAMP) - make_interval(months => %s)",
+                    (retention_months,))
+        cutoff = cur.fetchone()[0]
+        cur.execute("SELECT partition_name::text, range_from, range_to FROM month_partitions(%s) "
+                    "WHERE range_to <= %s", (table, cutoff))
+        months = cur.fetchall()
+    if dry_run:
+        for partition, _, _ in months:
+            print(f"  {table}: would detach {partition}")
+        return
+
+    key = PARTITIONED_TABLES[table]
+    for partition, range_from, range_to in months:
+        # Referencing rows go first, in the same transaction as the detach
+        with conn, conn.cursor() as cur:
+            condition = cur.mogrify(f"p.{key} >= %s AND p.{key} < %s", (range_from, range_to)).decode()
+            for child, rows in release_references(cur, table, "p", condition, archive_dir, partition):
+                print(f"  {table}: {rows} referencing rows of {child} archived and deleted")
+            cur.execute("SELECT detach_partitions_before(%s, %s)", (table, range_to))
+            cur.fetchall()
+
+        if not archive_dir:
+            print(f"  {table}: {partition} detached and kept (no --archive-dir)")
+            continue
+        path, rows = archive_partition(conn, partition, archive_dir)
+        print(f"  {table}: {partition} detached, {rows} rows archived to {path}")
+        if not keep_detached:
+            with conn, conn.cursor() as cur:
+                cur.execute(f"DROP TABLE {partition}")
+
+
+def fold_summaries(conn):
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT to_regproc('fold_sales_deltas') IS NOT NULL")
+        if not cur.fetchone()[0]:
+            return
+        cur.execute("SELECT fold_sales_deltas()")
+        print(f"Sales summary deltas folded: {cur.fetchone()[0]}")
+
+
+def status(conn):
+    with conn, conn.cursor() as cur:
+        for table in PARTITIONED_TABLES:
+            if not is_partitioned(cur, table):
+                print(f"{table}: not partitioned")
+                continue
+            cur.execute("""
+                SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint,
+                       pg_total_relation_size(c.oid),
+                       (SELECT count(*) FROM pg_index i WHERE i.indrelid = c.oid)
+                FROM pg_inherits h JOIN pg_class c ON c.oid = h.inhrelid
+                WHERE h.inhparent = %s::regclass
+                ORDER BY c.relname
+            """, (table,))
+            rows = cur.fetchall()
+            print(f"{table}: {len(rows)} partitions")
+            for name, bound, tuples, size, indexes in rows:
+                bound = "DEFAULT" if bound == "DEFAULT" else bound.replace("FOR VALUES ", "")
+                print(f"  {name:<28} {bound:<60} ~{max(tuples, 0):>10} rows "
+                      f"{size / 1048576:>9.1f} MB  {indexes} indexes")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Monthly partition maintenance for the lab2 schema")
+    parser.add_argument("--dsn", default="dbname=event_booking")
+    parser.add_argument("--convert", action="store_true", help="apply 09_partitioning.sql first")
+    parser.add_argument("--months-ahead", type=int, default=3, help="future partitions to keep ready")
+    parser.add_argument("--retention-months", type=int, help="detach months older than this")
+    parser.add_argument("--archive-dir", help="where detached partitions are archived (csv.gz)")
+    parser.add_argument("--keep-detached", action="store_true", help="do not drop detached partitions")
+    parser.add_argument("--dry-run", action="store_true", help="only show what would be detached")
+    parser.add_argument("--status", action="store_true", help="list partitions with sizes")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    conn = psycopg2.connect(args.dsn)
+    print(f"=== PARTITION MAINTENANCE {datetime.now():%Y-%m-%d %H:%M} ===")
+    if args.convert:
+        convert(conn)
+
+    with conn, conn.cursor() as cur:
+        tables = [table for table in PARTITIONED_TABLES if is_partitioned(cur, table)]
+    if not tables:
+        print("No partitioned tables; run with --convert first")
+    for table in tables:
+        ensure(conn, table, args.months_ahead)
+        if args.retention_months is not None:
+            try:
+                retire(conn, table, args.retention_months, args.archive_dir, args.keep_detached, args.dry_run)
+            except (psycopg2.Error, RuntimeError) as e:
+                print(f"  {table}: retention failed: {str(e).strip()}")
+    fold_summaries(conn)
+
+    if args.status:
+        status(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,12 @@ execute_sql "01_database_setup.sql" "Database schema creation"
 # Step 2: Create CRUD operations
 execute_sql "02_crud_operations.sql" "CRUD operations"
 
+# Summary tables and their triggers exist before data is loaded
+execute_sql "06_reporting_summaries.sql" "Reporting summary tables"
+execute_sql "07_seat_reservations.sql" "Seat reservation inventory"
+execute_sql "08_event_media.sql" "Out-of-line event media storage"
+execute_sql "09_partitioning.sql" "Monthly partitions for Bookings, Transactions, EventLogs"
+
 # Step 3: Check if tables were created
 echo "3. Checking created tables..."
 sudo -u postgres psql -d $DB_NAME -c "\dt"
@@ -49,7 +55,8 @@ echo -e "${YELLOW}4. Data Generation Options:${NC}"
 echo "   1) Minimal test data (fast)"
 echo "   2) Full dataset with 3M+ records (slow)"
 echo "   3) Skip data generation"
-read -p "Choose option (1/2/3): " data_option
+echo "   4) Generated dataset via COPY loader (load_data.py, fast)"
+read -p "Choose option (1/2/3/4): " data_option
 
 case $data_option in
     1)
@@ -67,6 +74,12 @@ case $data_option in
             echo "Skipping full data generation"
         fi
         ;;
+    4)
+        read -p "Scale (e.g. 10 or bookings=10000): " data_scale
+        echo -e "${YELLOW}Loading generated dataset with COPY...${NC}"
+        sudo -u postgres python3 load_data.py --dsn "dbname=$DB_NAME" --scale "${data_scale:-1}" \
+            --jobs "$(nproc)" --drop-foreign-keys
+        ;;
     *)
         echo "Skipping data generation"
         ;;
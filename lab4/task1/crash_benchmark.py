@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+# crash_benchmark.py - Automated crash-recovery benchmark (replaces the manual 01-04 steps)
+#
+# For every durability configuration the harness starts a scratch PostgreSQL
+# cluster with the configuration's settings, drives a sustained multi-client
+# commit workload, SIGKILLs the postmaster and all its backends at a random
+# moment, restarts the cluster and then:
+#   - measures recovery time from the server log (crash detected -> ready to
+#     accept connections) and the amount of WAL replayed (redo start/done LSN);
+#   - checks that every commit acknowledged to a client survived. With
+#     synchronous_commit = off some loss is expected and only reported; any
+#     loss under a durable configuration fails the run.
+# Commit throughput and latency per configuration show what each durability
+# setting costs; several --kill-after values show how recovery time grows
+# with the WAL volume written since the last checkpoint.
+#
+# WARNING: the cluster in --pgdata is killed repeatedly. Use a scratch cluster.
+#
+# Example:
+#   initdb -D /tmp/crash_data && createdb -h /tmp crash_test
+#   python3 crash_benchmark.py --pgdata /tmp/crash_data --pg-bin /usr/lib/postgresql/16/bin \
+#       --dsn "host=/tmp dbname=crash_test" --clients 8 --kill-after 5,20 --runs 2
+import argparse
+import os
+import random
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import psycopg2
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'mongo'))
+from benchstats import save_report, summarize  # noqa: E402
+
+# Durability configurations; any setting can be given with --config name:key=value,...
+CONFIGS = {
+    "durable": {"synchronous_commit": "on"},
+    "group_commit": {"synchronous_commit": "on", "commit_delay": "1000", "commit_siblings": "4"},
+    "wal_compression": {"synchronous_commit": "on", "wal_compression": "on"},
+    "async_commit": {"synchronous_commit": "off"},
+}
+
+# Applied to every run: no checkpoints during the workload, so the WAL to
+# replay equals the WAL written; English messages with timestamps for parsing
+BASE_SETTINGS = {
+    "checkpoint_timeout": "1h",
+    "max_wal_size": "8GB",
+    "log_line_prefix": "%m [%p] ",
+    "lc_messages": "C",
+    "logging_collector": "off",
+}
+
+LOG_TIME = re.compile(r"^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})")
+REDO_START = re.compile(r"redo starts at ([0-9A-F]+/[0-9A-F]+)")
+REDO_DONE = re.compile(r"redo done at ([0-9A-F]+/[0-9A-F]+).*?elapsed: ([\d.]+) s")
+CRASH_DETECTED = ("database system was interrupted", "database system was not properly shut down")
+READY = "database system is ready to accept connections"
+
+
+def lsn_to_int(lsn):
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class Cluster:
+    """Scratch cluster controlled through pg_ctl (optionally as another OS user)"""
+
+    def __init__(self, args):
+        self.pgdata = args.pgdata
+        self.pg_ctl = os.path.join(args.pg_bin, "pg_ctl") if args.pg_bin else "pg_ctl"
+        self.os_user = args.os_user
+        self.extra = args.pg_options
+        self.log_path = os.path.join(args.log_dir, "postgres.log")
+        os.makedirs(args.log_dir, exist_ok=True)
+
+    def run(self, *command):
+        if self.os_user:
+            command = ["su", self.os_user, "-c", shlex.join(command)]
+        return subprocess.run(command, capture_output=True, text=True)
+
+    def start(self, settings):
+        """Start with the given settings; returns the log offset where this start begins"""
+        offset = os.path.getsize(self.log_path) if os.path.exists(self.log_path) else 0
+        options = " ".join(f"-c {key}='{value}'" for key, value in {**BASE_SETTINGS, **settings}.items())
+        if self.extra:
+            options += " " + self.extra
+        result = self.run(self.pg_ctl, "-D", self.pgdata, "-l", self.log_path, "-o", options,
+                          "-w", "-t", "600", "start")
+        if result.returncode != 0:
+            raise RuntimeError(f"pg_ctl start failed: {result.stdout}{result.stderr}")
+        return offset
+
+    def stop(self):
+        self.run(self.pg_ctl, "-D", self.pgdata, "-m", "fast", "-w", "stop")
+
+    def is_running(self):
+        return self.run(self.pg_ctl, "-D", self.pgdata, "status").returncode == 0
+
+    def kill(self):
+        """SIGKILL the postmaster and every backend at once, like a power loss"""
+        with open(os.path.join(self.pgdata, "postmaster.pid")) as f:
+            postmaster = int(f.readline())
+        victims = [postmaster]
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        parent = int(f.read().rsplit(")", 1)[1].split()[1])
+                except (OSError, IndexError, ValueError):
+                    continue
+                if parent == postmaster:
+                    victims.append(int(entry))
+        for pid in victims:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+        while any(os.path.exists(f"/proc/{pid}") for pid in victims):
+            time.sleep(0.01)
+
+    def read_log(self, offset):
+        with open(self.log_path, encoding="utf-8", errors="replace") as f:
+            f.seek(offset)
+            return f.read()
+
+
+def parse_recovery(log_text):
+    """Recovery timings and replayed WAL from the log of one restart"""
+    crash_at = ready_at = None
+    result = {"redo_start_lsn": None, "redo_done_lsn": None, "redo_elapsed_s": None}
+    for line in log_text.splitlines():
+        stamp = LOG_TIME.match(line)
+        when = datetime.strptime(stamp.group(1), "%Y-%m-%d %H:%M:%S.%f") if stamp else None
+        if crash_at is None and any(marker in line for marker in CRASH_DETECTED):
+            crash_at = when
+        if match := REDO_START.search(line):
+            result["redo_start_lsn"] = match.group(1)
+        if match := REDO_DONE.search(line):
+            result["redo_done_lsn"] = match.group(1)
+            result["redo_elapsed_s"] = float(match.group(2))
+        if READY in line:
+            ready_at = when
+    result["recovery_s"] = (ready_at - crash_at).total_seconds() if crash_at and ready_at else None
+    if result["redo_start_lsn"] and result["redo_done_lsn"]:
+        result["wal_replayed_bytes"] = (lsn_to_int(result["redo_done_lsn"])
+                                        - lsn_to_int(result["redo_start_lsn"]))
+    else:
+        result["wal_replayed_bytes"] = 0
+    return result
+
+
+def prepare(dsn):
+    with psycopg2.connect(dsn) as conn, conn.cursor() as cur:
+        cur.execute("""
+            DROP TABLE IF EXISTS crash_commits;
+            CREATE TABLE crash_commits (
+                client INTEGER NOT NULL,
+                seq INTEGER NOT NULL,
+                commit_lsn PG_LSN,
+                payload TEXT,
+                created_at TIMESTAMP DEFAULT NOW(),
+                PRIMARY KEY (client, seq)
+            );
+            CHECKPOINT;
+        """)
+    conn.close()
+
+
+def client_loop(dsn, client, payload, acks, latencies, stop):
+    """Commit one row per transaction until the server dies; record what was acknowledged"""
+    try:
+        conn = psycopg2.connect(dsn)
+        cur = conn.cursor()
+        seq = 0
+        while not stop.is_set():
+            seq += 1
+            started = time.perf_counter()
+            cur.execute("INSERT INTO crash_commits (client, seq, commit_lsn, payload) "
+                        "VALUES (%s, %s, pg_current_wal_insert_lsn(), %s) RETURNING commit_lsn",
+                        (client, seq, payload))
+            lsn = cur.fetchone()[0]
+            conn.commit()
+            # The commit returned: from here on the row must survive the crash
+            latencies.append((time.perf_counter() - started) * 1000)
+            acks.append((client, seq, lsn))
+    except psycopg2.Error:
+        pass
+
+
+def run_once(cluster, args, name, settings, kill_after):
+    cluster.start(settings)
+    prepare(args.dsn)
+    with psycopg2.connect(args.dsn) as conn, conn.cursor() as cur:
+        cur.execute("SELECT pg_current_wal_lsn()")
+        start_lsn = cur.fetchone()[0]
+    conn.close()
+
+    acks = [[] for _ in range(args.clients)]
+    latencies = [[] for _ in range(args.clients)]
+    stop = threading.Event()
+    payload = "x" * args.payload_bytes
+    threads = [threading.Thread(target=client_loop,
+                                args=(args.dsn, n, payload, acks[n], latencies[n], stop))
+               for n in range(args.clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    # Random moment within the last half of the window
+    time.sleep(random.uniform(kill_after / 2, kill_after))
+    cluster.kill()
+    workload_s = time.perf_counter() - started
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    restart_started = time.perf_counter()
+    offset = cluster.start(settings)
+    restart_s = time.perf_counter() - restart_started
+    recovery = parse_recovery(cluster.read_log(offset))
+
+    acknowledged = [ack for client_acks in acks for ack in client_acks]
+    with psycopg2.connect(args.dsn) as conn, conn.cursor() as cur:
+        cur.execute("SELECT client, seq FROM crash_commits")
+        survived = set(cur.fetchall())
+    conn.close()
+    lost = [(client, seq, lsn) for client, seq, lsn in acknowledged if (client, seq) not in survived]
+    last_ack_lsn = max((lsn for _, _, lsn in acknowledged), key=lsn_to_int, default=start_lsn)
+    cluster.stop()
+
+    return {
+        "config": name,
+        "settings": settings,
+        "kill_after_s": kill_after,
+        "workload_s": round(workload_s, 2),
+        "acknowledged": len(acknowledged),
+        "commits_per_sec": round(len(acknowledged) / workload_s, 1),
+        "commit_latency": summarize([value for client in latencies for value in client]),
+        "wal_written_bytes": lsn_to_int(last_ack_lsn) - lsn_to_int(start_lsn),
+        "restart_s": round(restart_s, 3),
+        **recovery,
+        "unacknowledged_survived": len(survived) - (len(acknowledged) - len(lost)),
+        "lost_acknowledged": len(lost),
+        "first_lost": [[client, seq, lsn] for client, seq, lsn in sorted(lost, key=lambda x: lsn_to_int(x[2]))[:5]],
+        "durable": settings.get("synchronous_commit", "on") != "off",
+    }
+
+
+def print_result(result):
+    recovery = "-" if result["recovery_s"] is None else f"{result['recovery_s']:.3f}s"
+    status = "OK" if not result["lost_acknowledged"] else (
+        "LOST (expected)" if not result["durable"] else "LOST ACKNOWLEDGED COMMITS")
+    print(f"  {result['config']:<16} kill@{result['workload_s']:>6.1f}s "
+          f"{result['commits_per_sec']:>9.1f} commit/s  p99 {result['commit_latency'].get('p99_ms', '-')} ms  "
+          f"WAL {result['wal_written_bytes'] / 1048576:>7.1f} MB  replayed "
+          f"{result['wal_replayed_bytes'] / 1048576:>7.1f} MB  recovery {recovery}  "
+          f"lost {result['lost_acknowledged']}  {status}")
+
+
+def summarize_configs(results):
+    summary = {}
+    for name in dict.fromkeys(r["config"] for r in results):
+        runs = [r for r in results if r["config"] == name]
+        summary[name] = {
+            "commits_per_sec": round(sum(r["commits_per_sec"] for r in runs) / len(runs), 1),
+            "lost_acknowledged": sum(r["lost_acknowledged"] for r in runs),
+            "recovery_s": [r["recovery_s"] for r in runs],
+            "wal_replayed_mb": [round(r["wal_replayed_bytes"] / 1048576, 1) for r in runs],
+        }
+    base = summary.get("durable", {}).get("commits_per_sec")
+    if base:
+        for stats in summary.values():
+            stats["throughput_vs_durable"] = round(stats["commits_per_sec"] / base, 2)
+    return summary
+
+
+def parse_config(text):
+    name, _, pairs = text.partition(":")
+    settings = dict(pair.split("=", 1) for pair in pairs.split(",") if pair)
+    return name, settings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Crash-recovery benchmark for durability settings")
+    parser.add_argument("--pgdata", required=True, help="data directory of a scratch cluster")
+    parser.add_argument("--pg-bin", help="directory with pg_ctl")
+    parser.add_argument("--os-user", help="run pg_ctl as this OS user (e.g. postgres)")
+    parser.add_argument("--pg-options", default="", help="extra postgres options, e.g. \"-k /tmp -p 5433\"")
+    parser.add_argument("--dsn", default="dbname=crash_test")
+    parser.add_argument("--configs", default=",".join(CONFIGS), help="configurations to run")
+    parser.add_argument("--config", action="append", type=parse_config, default=[],
+                        help="extra configuration, e.g. \"delay500:synchronous_commit=on,commit_delay=500\"")
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--kill-after", default="10", help="workload seconds before the kill (list)")
+    parser.add_argument("--runs", type=int, default=1, help="runs per configuration and kill-after")
+    parser.add_argument("--payload-bytes", type=int, default=200)
+    parser.add_argument("--log-dir", default="/tmp/crash_benchmark")
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--output", default="crash_benchmark.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    random.seed(args.seed)
+    configs = {name: CONFIGS[name] for name in args.configs.split(",") if name}
+    configs.update(args.config)
+    kill_after = [float(value) for value in args.kill_after.split(",")]
+    cluster = Cluster(args)
+    if cluster.is_running():
+        cluster.stop()
+
+    results = []
+    for name, settings in configs.items():
+        print(f"=== {name}: {settings} ===")
+        for seconds in kill_after:
+            for _ in range(args.runs):
+                result = run_once(cluster, args, name, settings, seconds)
+                print_result(result)
+                results.append(result)
+
+    summary = summarize_configs(results)
+    print("\n=== SUMMARY ===")
+    for name, stats in summary.items():
+        print(f"  {name:<16} {stats['commits_per_sec']:>9.1f} commit/s "
+              f"(x{stats.get('throughput_vs_durable', '-')} of durable)  lost {stats['lost_acknowledged']}  "
+              f"recovery {stats['recovery_s']} s for {stats['wal_replayed_mb']} MB of WAL")
+    save_report(args.output, {
+        "meta": {"clients": args.clients, "payload_bytes": args.payload_bytes,
+                 "started_at": datetime.now().isoformat(timespec="seconds")},
+        "results": results,
+        "summary": summary,
+    })
+    print(f"Report: {args.output}")
+    if any(r["lost_acknowledged"] and r["durable"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -317,6 +317,11 @@ add_prometheus_metric "SELECT REPLACE(max_wal_size, 'MB', '')::integer * 1024 *
 
 add_prometheus_metric "SELECT pg_database_size(current_database());" "database_size_bytes"
 
+# 11. INDEX ADVISOR: дубли, покрытые префиксом и неиспользуемые индексы,
+# предложения по нагрузке (только отчет, без временных индексов)
+echo -e "\n=== INDEX ADVISOR ===" >> $LOG_FILE
+python3 "$(dirname "$0")/index_advisor.py" --dsn "dbname=$DB_NAME" --engines postgres >> $LOG_FILE 2>&1
+
 echo "postgres_last_update_timestamp{database=\"$DB_NAME\"} $(date +%s)" >> $PROMETHEUS_FILE
 
 echo -e "\n=== MONITORING COMPLETE ===" >> $LOG_FILE
@@ -0,0 +1,639 @@
+#!/usr/bin/env python3
+# index_advisor.py - Советник по индексам по реальной нагрузке (PostgreSQL и MongoDB)
+#
+# automated_monitoring.sh только считает неиспользуемые индексы (idx_scan = 0).
+# Советник смотрит на нагрузку и на сами индексы:
+#   1. самые дорогие запросы: pg_stat_statements по total_exec_time (без
+#      расширения - запросы из lab2/03_business_queries.sql и
+#      benchmark_queries.sql) и system.profile по суммарному millis;
+#   2. лишние индексы: дубли, индексы, покрытые префиксом другого
+#      (idx_bookings_user_id и idx_bookings_user_event), и неиспользуемые
+#      с момента сброса статистики; индексы ограничений не трогаются;
+#   3. новые индексы для горячих предикатов: сначала равенства, потом
+#      сортировка, потом диапазон (ESR); если запросу нужна пара колонок
+#      сверх ключа - INCLUDE, чтобы получить Index Only Scan;
+#   4. проверка каждого предложения стоимостью плана до и после:
+#      PostgreSQL - гипотетический индекс hypopg (hypopg_create_index /
+#      hypopg_hide_index), без hypopg и с --allow-temp - CREATE/DROP INDEX в
+#      транзакции, которая откатывается; MongoDB (только с --allow-temp) -
+#      временный индекс или скрытый (hidden) индекс и explain executionStats;
+#   5. цена индекса на запись: сколько записей индекса в сутки стоит его
+#      поддержка (вставки и не-HOT обновления из pg_stat_user_tables, операции
+#      записи из $collStats latencyStats) и сколько места он занимает. Для
+#      удаляемых индексов это экономия, для новых - дополнительная нагрузка.
+# С --allow-temp временные индексы строятся на живых таблицах и берут
+# блокировки (lock_timeout ограничивает ожидание) - запускать вне пика.
+#
+# Примеры:
+#   python3 index_advisor.py --dsn "dbname=bd" --engines postgres
+#   python3 index_advisor.py --engines postgres,mongo --allow-temp --output advisor.json
+import argparse
+import os
+import re
+import sys
+from datetime import datetime
+
+import psycopg2
+
+LAB_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(LAB_DIR, '..', 'mongo'))
+sys.path.append(os.path.join(LAB_DIR, '..', 'lab2'))
+from benchstats import save_report  # noqa: E402
+from bench_queries import DEFAULT_FILES, parse_queries  # noqa: E402
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+TEMP_INDEX = 'advisor_tmp'
+SCAN_NODES = ("Seq Scan", "Index Scan", "Index Only Scan", "Bitmap Heap Scan")
+CONDITION_KEYS = ("Filter", "Index Cond", "Recheck Cond")
+# "(user_id = $1)", "((status)::text = 'confirmed'::text)", "(b.booking_date >= ...)"
+COMPARISON = re.compile(r"\(*(?:\w+\.)?(\w+)\)?(?:::[\w ]+?)?\)?\s+(=|<=|>=|<|>|~~)\s")
+SORT_COLUMN = re.compile(r"^(?:\w+\.)?\w+(?: DESC)?$")
+MONGO_RANGE = {"$gt", "$gte", "$lt", "$lte"}
+
+
+def key_names(keys):
+    return [key.removesuffix(" DESC") for key in keys]
+
+
+def covers(longer, shorter):
+    """longer начинается с shorter: те же колонки, направления совпадают или все обратные"""
+    head = longer[:len(shorter)]
+    if len(head) < len(shorter) or key_names(head) != key_names(shorter):
+        return False
+    a = [key.endswith(" DESC") for key in head]
+    b = [key.endswith(" DESC") for key in shorter]
+    return a == b or a == [not d for d in b]
+
+
+def redundant(indexes):
+    """Дубли и индексы, покрытые префиксом другого: {имя: (покрывающий индекс, причина)}"""
+    found = {}
+    for a in indexes:
+        if not a["droppable"]:
+            continue
+        for b in indexes:
+            if b is a or b["name"] in found or b["table"] != a["table"] or b["method"] != a["method"] \
+                    or b["predicate"] != a["predicate"] or not covers(b["keys"], a["keys"]) \
+                    or not set(a["include"]) <= set(key_names(b["keys"]) + b["include"]):
+                continue
+            if len(b["keys"]) > len(a["keys"]):
+                found[a["name"]] = (b["name"], "префикс")
+            elif (a["scans"], b["name"]) < (b["scans"], a["name"]) or not b["droppable"]:
+                found[a["name"]] = (b["name"], "дубль")
+            if a["name"] in found:
+                break
+    return found
+
+
+def per_day(value, stats_days):
+    return round(value / stats_days) if stats_days else None
+
+
+def print_drops(drops, engine):
+    print(f"\n--- {engine}: лишние индексы ---")
+    if not drops:
+        print("  не найдено")
+    for drop in drops:
+        writes = drop["index_writes_per_day"]
+        print(f"  {drop['index']:<40} {drop['reason']:<30} {drop['size_bytes'] / 1048576:>8.1f} MB "
+              f"{writes if writes is not None else '-':>10} записей/сутки  проверка: {drop['validation']}")
+        for query, before, after in drop["costs"]:
+            if after is not None and after > before:
+                print(f"      {query[:60]:<60} {before:>10.1f} -> {after:.1f}")
+
+
+def print_proposals(proposals, engine):
+    print(f"\n--- {engine}: новые индексы ---")
+    if not proposals:
+        print("  нет предложений")
+    for proposal in proposals:
+        writes = proposal["index_writes_per_day"]
+        print(f"  {proposal['ddl']}")
+        print(f"      {proposal['cost_metric']}: {proposal['cost_before']} -> {proposal['cost_after']}  "
+              f"({proposal['validation']}), +{writes if writes is not None else '-'} записей индекса/сутки")
+        print(f"      для: {proposal['query'][:100]}")
+
+
+# ---------- PostgreSQL ----------
+
+INDEXES_SQL = """
+SELECT ic.relname, i.indrelid::regclass::text, am.amname,
+       i.indisunique OR EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = i.indexrelid),
+       pg_get_expr(i.indpred, i.indrelid),
+       ARRAY(SELECT pg_get_indexdef(i.indexrelid, k, true)
+                    || CASE WHEN i.indoption[k - 1] & 1 = 1 THEN ' DESC' ELSE '' END
+             FROM generate_series(1, i.indnkeyatts) k),
+       ARRAY(SELECT pg_get_indexdef(i.indexrelid, k, true) FROM generate_series(i.indnkeyatts + 1, i.indnatts) k),
+       (SELECT COALESCE(sum(s.idx_scan), 0) FROM pg_stat_user_indexes s
+        WHERE s.indexrelid = i.indexrelid
+           OR ic.relkind = 'I' AND s.indexrelid IN (SELECT relid FROM pg_partition_tree(i.indexrelid))),
+       CASE WHEN ic.relkind = 'I'
+            THEN (SELECT sum(pg_relation_size(p.relid)) FROM pg_partition_tree(i.indexrelid) p)
+            ELSE pg_relation_size(i.indexrelid) END,
+       ic.relkind = 'I'
+FROM pg_index i
+JOIN pg_class ic ON ic.oid = i.indexrelid
+JOIN pg_class t ON t.oid = i.indrelid
+JOIN pg_namespace n ON n.oid = t.relnamespace
+JOIN pg_am am ON am.oid = ic.relam
+WHERE n.nspname = 'public' AND NOT t.relispartition
+ORDER BY 2, 1
+"""
+
+# Каждая вставка и каждое не-HOT обновление добавляют запись во все индексы
+# таблицы; для секционированных таблиц суммируются секции
+TABLE_WRITES_SQL = """
+SELECT COALESCE(pg_partition_root(relid), relid)::regclass::text,
+       sum(n_tup_ins + n_tup_upd - n_tup_hot_upd), sum(n_live_tup)
+FROM pg_stat_user_tables GROUP BY 1
+"""
+
+STATS_AGE_SQL = """
+SELECT EXTRACT(EPOCH FROM now() - COALESCE(stats_reset, pg_postmaster_start_time())) / 86400
+FROM pg_stat_database WHERE datname = current_database()
+"""
+
+
+class PgAdvisor:
+    def __init__(self, args):
+        self.conn = psycopg2.connect(args.dsn)
+        self.args = args
+        self.cur = self.conn.cursor()
+        self.cur.execute("SHOW server_version_num")
+        self.version = int(self.cur.fetchone()[0])
+        self.cur.execute("SELECT extname FROM pg_extension WHERE extname IN ('pg_stat_statements', 'hypopg')")
+        self.extensions = {row[0] for row in self.cur.fetchall()}
+        self.conn.rollback()
+        self.root = {}
+
+    def workload(self):
+        """Самые дорогие запросы: [{query, calls, total_ms}]"""
+        if "pg_stat_statements" in self.extensions:
+            self.cur.execute(r"""
+                SELECT query, calls, total_exec_time FROM pg_stat_statements
+                WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())
+                  AND query ~* '^\s*(SELECT|WITH|UPDATE|DELETE)\M'
+                ORDER BY total_exec_time DESC LIMIT %s
+            """, (self.args.top,))
+            queries = [{"query": query, "calls": calls, "total_ms": round(total, 1)}
+                       for query, calls, total in self.cur.fetchall()]
+            self.conn.rollback()
+            print(f"Нагрузка: pg_stat_statements, {len(queries)} запросов")
+        else:
+            queries = [{"query": sql, "calls": 1, "total_ms": None}
+                       for path in self.args.files for sql in parse_queries(path).values()]
+            print("pg_stat_statements не подключен (shared_preload_libraries = 'pg_stat_statements' и "
+                  f"CREATE EXTENSION pg_stat_statements); нагрузка из файлов: {len(queries)} запросов")
+        if self.version < 160000:
+            # Параметры $1 можно спланировать только через EXPLAIN (GENERIC_PLAN), PostgreSQL 16+
+            queries = [q for q in queries if "$1" not in q["query"]]
+        return queries
+
+    def explain(self, query):
+        """План запроса (EXPLAIN без выполнения) или None, если запрос не планируется"""
+        options = "FORMAT JSON, VERBOSE, GENERIC_PLAN" if "$1" in query else "FORMAT JSON, VERBOSE"
+        self.cur.execute("SAVEPOINT advisor_explain")
+        try:
+            self.cur.execute(f"EXPLAIN ({options}) {query}")
+        except psycopg2.Error:
+            self.cur.execute("ROLLBACK TO SAVEPOINT advisor_explain")
+            return None
+        return self.cur.fetchone()[0][0]["Plan"]
+
+    def costs(self, queries):
+        return [plan["Total Cost"] if plan else None for plan in (self.explain(q["query"]) for q in queries)]
+
+    def load_catalog(self):
+        self.cur.execute("""
+            SELECT c.relname, COALESCE(pg_partition_root(c.oid), c.oid)::regclass::text
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p')
+        """)
+        self.root = dict(self.cur.fetchall())
+        self.cur.execute("""
+            SELECT c.oid::regclass::text, array_agg(a.attname::text)
+            FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p') AND NOT c.relispartition
+            GROUP BY 1
+        """)
+        self.columns = {table: set(columns) for table, columns in self.cur.fetchall()}
+        self.cur.execute(TABLE_WRITES_SQL)
+        self.writes = {table: (int(writes), int(rows)) for table, writes, rows in self.cur.fetchall()}
+        self.cur.execute(STATS_AGE_SQL)
+        self.stats_days = float(self.cur.fetchone()[0] or 0)
+        self.cur.execute(INDEXES_SQL)
+        self.indexes = [
+            {"name": name, "table": table, "method": method, "droppable": not unique, "predicate": predicate,
+             "keys": keys, "include": include, "scans": int(scans), "size_bytes": int(size or 0),
+             "partitioned": partitioned}
+            for name, table, method, unique, predicate, keys, include, scans, size, partitioned
+            in self.cur.fetchall()]
+        self.conn.rollback()
+
+    def tables_of(self, plan):
+        return {self.root.get(node["Relation Name"], node["Relation Name"])
+                for node in walk(plan) if "Relation Name" in node}
+
+    def index_writes(self, table):
+        return per_day(self.writes.get(table, (0, 0))[0], self.stats_days)
+
+    # --- проверка ---
+
+    def with_hypothetical(self, ddl, queries):
+        if "hypopg" in self.extensions:
+            self.cur.execute("SELECT indexrelid FROM hypopg_create_index(%s)", (ddl,))
+            oid = self.cur.fetchone()[0]
+            after = self.costs(queries)
+            self.cur.execute("SELECT hypopg_drop_index(%s)", (oid,))
+            self.conn.rollback()
+            return after, "hypopg"
+        if not self.args.allow_temp:
+            return None, "не проверено (нужен hypopg или --allow-temp)"
+        return self.in_rolled_back(ddl.replace("CREATE INDEX ON", f"CREATE INDEX {TEMP_INDEX} ON"),
+                                   queries), "временный индекс"
+
+    def without_index(self, name, queries):
+        if "hypopg" in self.extensions and self.version >= 120000:
+            self.cur.execute("SELECT hypopg_hide_index(%s::regclass)", (name,))
+            after = self.costs(queries)
+            self.cur.execute("SELECT hypopg_unhide_index(%s::regclass)", (name,))
+            self.conn.rollback()
+            return after, "hypopg_hide_index"
+        if not self.args.allow_temp:
+            return None, "не проверено (нужен hypopg или --allow-temp)"
+        return self.in_rolled_back(f"DROP INDEX {name}", queries), "DROP в откатываемой транзакции"
+
+    def in_rolled_back(self, statement, queries):
+        try:
+            self.cur.execute("SET LOCAL lock_timeout = %s", (f"{self.args.lock_timeout_ms}ms",))
+            self.cur.execute(statement)
+            return self.costs(queries)
+        except psycopg2.Error as e:
+            print(f"  {statement}: {e.pgerror or e}".rstrip())
+            return None
+        finally:
+            self.conn.rollback()
+
+    # --- анализ ---
+
+    def drops(self, queries, plans):
+        found = redundant(self.indexes)
+        covering = {other for other, _ in found.values()}
+        fresh_enough = self.stats_days >= self.args.min_stats_days
+        drops = []
+        for index in self.indexes:
+            if index["name"] in found:
+                other, kind = found[index["name"]]
+                reason = f"{kind} {other}"
+            elif index["droppable"] and index["scans"] == 0 and index["name"] not in covering and fresh_enough:
+                reason = "не используется"
+            else:
+                continue
+            related = [q for q, plan in zip(queries, plans) if plan and index["table"] in self.tables_of(plan)]
+            before = self.costs(related)
+            after, method = self.without_index(index["name"], related)
+            costs = [(q["query"], b, a) for q, b, a in zip(related, before, after or [None] * len(related))
+                     if b is not None]
+            if after is None:
+                validation = method
+            elif any(a is not None and a > b * (1 + self.args.max_regression) for _, b, a in costs):
+                validation = f"{method}: запросы дорожают, оставить"
+            else:
+                validation = f"{method}: планы не дорожают"
+            drops.append({
+                "index": index["name"], "table": index["table"], "partitioned": index["partitioned"],
+                "reason": reason, "scans": index["scans"],
+                "size_bytes": index["size_bytes"], "validation": validation,
+                "index_writes_per_day": self.index_writes(index["table"]), "costs": costs,
+            })
+        return drops
+
+    def candidate(self, node, sort_keys):
+        """Ключ (равенства, сортировка, диапазон) и INCLUDE для узла сканирования"""
+        table = self.root.get(node["Relation Name"], node["Relation Name"])
+        columns = self.columns.get(table, set())
+        equality, ranges = [], []
+        for key in CONDITION_KEYS:
+            for column, op in COMPARISON.findall(node.get(key, "")):
+                if column in columns:
+                    (equality if op == "=" else ranges).append(column)
+        equality = list(dict.fromkeys(equality))
+        ranges = [c for c in dict.fromkeys(ranges) if c not in equality]
+        if not equality and not ranges:
+            return None
+        keys = equality + [k for k in sort_keys if key_names([k])[0] not in equality]
+        keys += [c for c in ranges if c not in key_names(keys)][:1]
+        output = [item.split(".")[-1] for item in node.get("Output", [])]
+        extra = [c for c in dict.fromkeys(output) if c not in key_names(keys)]
+        include = extra if all(c in columns for c in extra) and len(extra) <= self.args.max_include else []
+        return table, keys, include
+
+    def proposals(self, queries, plans):
+        seen, proposals = set(), []
+        for query, plan in zip(queries, plans):
+            if not plan:
+                continue
+            for node, sort_keys in scans_with_sort(plan):
+                if node["Node Type"] not in SCAN_NODES or node["Node Type"] == "Index Only Scan":
+                    continue
+                table = self.root.get(node["Relation Name"], node["Relation Name"])
+                if node["Node Type"] == "Seq Scan" and self.writes.get(table, (0, 0))[1] < self.args.min_rows:
+                    continue
+                # Сортировка по выражению индексом по колонкам не покрыть
+                if not all(SORT_COLUMN.match(k) for k in sort_keys):
+                    sort_keys = []
+                found = self.candidate(node, [k.split(".")[-1] for k in sort_keys])
+                if not found:
+                    continue
+                table, keys, include = found
+                if any(i["table"] == table and covers(i["keys"], keys) and set(include) <= set(i["include"])
+                       for i in self.indexes) or (table, tuple(keys)) in seen:
+                    continue
+                seen.add((table, tuple(keys)))
+                ddl = f"CREATE INDEX ON {table} ({', '.join(keys)})"
+                if include:
+                    ddl += f" INCLUDE ({', '.join(include)})"
+                related = [q for q, p in zip(queries, plans) if p and table in self.tables_of(p)]
+                before = self.costs(related)
+                after, method = self.with_hypothetical(ddl, related)
+                weighted_before = sum(q["calls"] * b for q, b in zip(related, before) if b is not None)
+                weighted_after = None if after is None else sum(
+                    q["calls"] * (a if a is not None else b) for q, b, a in zip(related, before, after)
+                    if b is not None)
+                if weighted_after is not None and weighted_after >= weighted_before * (1 - self.args.min_gain):
+                    continue
+                proposals.append({
+                    "ddl": ddl, "table": table, "query": " ".join(query["query"].split()),
+                    "cost_metric": "стоимость x вызовы", "cost_before": round(weighted_before, 1),
+                    "cost_after": None if weighted_after is None else round(weighted_after, 1),
+                    "validation": method, "index_writes_per_day": self.index_writes(table),
+                })
+        return proposals
+
+    def run(self):
+        queries = self.workload()
+        self.load_catalog()
+        print(f"Статистика использования индексов за {self.stats_days:.1f} сут.; hypopg: "
+              f"{'есть' if 'hypopg' in self.extensions else 'нет'}")
+        if self.stats_days < self.args.min_stats_days:
+            print(f"  меньше {self.args.min_stats_days} сут.: неиспользуемые индексы не отмечаются, "
+                  "записи в сутки - экстраполяция")
+        plans = [self.explain(q["query"]) for q in queries]
+        self.conn.rollback()
+        drops = self.drops(queries, plans)
+        proposals = self.proposals(queries, plans)
+        self.conn.close()
+        print_drops(drops, "PostgreSQL")
+        print_proposals(proposals, "PostgreSQL")
+        confirmed = [d for d in drops if "не дорожают" in d["validation"]]
+        if confirmed:
+            print("\n  -- удаление (CONCURRENTLY нельзя для индексов секционированных таблиц):")
+            for drop in confirmed:
+                concurrently = "" if drop["partitioned"] else "CONCURRENTLY "
+                print(f"  DROP INDEX {concurrently}IF EXISTS {drop['index']};")
+            saved = sum(d["index_writes_per_day"] or 0 for d in confirmed)
+            print(f"  экономия: {saved} записей индексов/сутки, "
+                  f"{sum(d['size_bytes'] for d in confirmed) / 1048576:.1f} MB")
+        return {"stats_days": round(self.stats_days, 1), "queries": len(queries),
+                "hypopg": "hypopg" in self.extensions, "drops": drops, "proposals": proposals}
+
+
+def walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from walk(child)
+
+
+def scans_with_sort(plan, sort_keys=()):
+    """Узлы плана и ключи сортировки над ними, если под Sort ровно одна таблица"""
+    if plan["Node Type"] in ("Sort", "Incremental Sort"):
+        scans = [node for node in walk(plan) if "Relation Name" in node]
+        sort_keys = plan.get("Sort Key", []) if len(scans) == 1 else ()
+    yield plan, list(sort_keys)
+    for child in plan.get("Plans", []):
+        yield from scans_with_sort(child, sort_keys)
+
+
+# ---------- MongoDB ----------
+
+def mongo_keys(key):
+    """{"user_id": 1, "created_at": -1} -> ["user_id", "created_at DESC"]; None для text/2dsphere/hashed"""
+    if any(direction not in (1, -1) for direction in key.values()):
+        return None
+    return [field + (" DESC" if direction == -1 else "") for field, direction in key.items()]
+
+
+def mongo_shape(command):
+    """(filter, sort) запроса из записи профилировщика"""
+    if "find" in command:
+        return command.get("filter", {}), command.get("sort") or {}
+    if "aggregate" in command:
+        pipeline = command.get("pipeline", [])
+        match = pipeline[0].get("$match", {}) if pipeline else {}
+        sort = next((stage["$sort"] for stage in pipeline[1:3] if "$sort" in stage), {})
+        return match, sort
+    if "q" in command:
+        return command["q"], {}
+    return command.get("query", {}), {}
+
+
+def split_predicates(query):
+    """Поля с равенством ($eq, $in) и с диапазоном из фильтра; $or и $expr пропускаются"""
+    equality, ranges = [], []
+    for field, cond in query.items():
+        if field == "$and":
+            for part in cond:
+                e, r = split_predicates(part)
+                equality += e
+                ranges += r
+            continue
+        if field.startswith("$"):
+            continue
+        ops = set(cond) if isinstance(cond, dict) and all(k.startswith("$") for k in cond) else {"$eq"}
+        if ops & MONGO_RANGE:
+            ranges.append(field)
+        elif ops <= {"$eq", "$in"}:
+            equality.append(field)
+    return equality, ranges
+
+
+def esr_keys(query, sort):
+    equality, ranges = split_predicates(query)
+    keys = list(dict.fromkeys(equality))
+    keys += [f + (" DESC" if d == -1 else "") for f, d in sort.items() if f not in keys]
+    keys += [f for f in dict.fromkeys(ranges) if f not in key_names(keys)][:1]
+    return keys
+
+
+class MongoAdvisor:
+    def __init__(self, args):
+        from pymongo import MongoClient
+        self.db = MongoClient(args.uri, serverSelectionTimeoutMS=5000)[DB_NAME]
+        self.args = args
+
+    def workload(self):
+        rows = list(self.db["system.profile"].aggregate([
+            {"$match": {"op": {"$in": ["query", "command", "update", "remove", "getmore"]},
+                        "ns": {"$regex": f"^{DB_NAME}\\.(?!system\\.)"}}},
+            {"$group": {"_id": {"ns": "$ns", "shape": {"$ifNull": ["$queryHash", "$planSummary"]}},
+                        "count": {"$sum": 1}, "millis": {"$sum": "$millis"},
+                        "docs": {"$sum": "$docsExamined"}, "returned": {"$sum": "$nreturned"},
+                        "plan": {"$last": "$planSummary"}, "command": {"$last": "$command"}}},
+            {"$sort": {"millis": -1}},
+            {"$limit": self.args.top},
+        ]))
+        print(f"Нагрузка: system.profile, {len(rows)} форм запросов"
+              + ("" if rows else " (включите профилировщик: mongo_exporter.py --enable-profiler 100)"))
+        return rows
+
+    def explain(self, collection, query, sort):
+        command = {"find": collection, "filter": query}
+        if sort:
+            command["sort"] = sort
+        stats = self.db.command("explain", command, verbosity="executionStats")["executionStats"]
+        return stats["totalKeysExamined"] + stats["totalDocsExamined"]
+
+    def explain_all(self, shapes):
+        return [self.explain(*shape) for shape in shapes]
+
+    def writes_per_day(self, collection):
+        stats = next(self.db[collection].aggregate([{"$collStats": {"latencyStats": {}}}]))
+        uptime_days = self.db.client.admin.command("serverStatus")["uptime"] / 86400
+        return per_day(stats["latencyStats"]["writes"]["ops"], uptime_days)
+
+    def indexes(self, collection):
+        sizes = self.db.command("collStats", collection).get("indexSizes", {})
+        result = []
+        for stat in self.db[collection].aggregate([{"$indexStats": {}}]):
+            spec = stat.get("spec", {})
+            keys = mongo_keys(stat["key"])
+            droppable = (keys is not None and stat["name"] != "_id_" and not spec.get("unique")
+                         and "expireAfterSeconds" not in spec and not spec.get("hidden"))
+            result.append({"name": stat["name"], "table": collection, "method": "btree", "keys": keys or [],
+                           "include": [], "predicate": str(spec.get("partialFilterExpression")),
+                           "droppable": droppable, "scans": stat["accesses"]["ops"],
+                           "size_bytes": sizes.get(stat["name"], 0)})
+        return result
+
+    def run(self):
+        from pymongo.errors import OperationFailure
+        workload = self.workload()
+        shapes = {}
+        for row in workload:
+            collection = row["_id"]["ns"].split(".", 1)[1]
+            query, sort = mongo_shape(row["command"])
+            shapes.setdefault(collection, []).append((collection, query, sort, row))
+
+        drops, proposals = [], []
+        for collection in sorted(set(self.db.list_collection_names()) & (set(shapes) | set(self.args.collections))):
+            try:
+                indexes = self.indexes(collection)
+            except OperationFailure as e:
+                # Для time-series коллекций $indexStats недоступен (как в mongo_exporter.py)
+                print(f"  {collection}: пропущена, $indexStats недоступен ({e.details.get('errmsg', e)})")
+                continue
+            found = redundant(indexes)
+            covering = {other for other, _ in found.values()}
+            related = [shape[:3] for shape in shapes.get(collection, [])]
+            writes = self.writes_per_day(collection)
+            for index in indexes:
+                if index["name"] in found:
+                    reason = "{1} {0}".format(*found[index["name"]])
+                elif index["droppable"] and index["scans"] == 0 and index["name"] not in covering:
+                    reason = "не используется"
+                else:
+                    continue
+                before = self.explain_all(related)
+                validation = "не проверено (нужен --allow-temp)"
+                if self.args.allow_temp:
+                    # Скрытый индекс не используется планировщиком, но обновляется
+                    self.db.command("collMod", collection, index={"name": index["name"], "hidden": True})
+                    try:
+                        after = self.explain_all(related)
+                    finally:
+                        self.db.command("collMod", collection, index={"name": index["name"], "hidden": False})
+                    worse = any(a > b * (1 + self.args.max_regression) for b, a in zip(before, after))
+                    validation = "hidden: запросы дорожают, оставить" if worse else "hidden: планы не дорожают"
+                drops.append({"index": f"{collection}.{index['name']}", "table": collection, "reason": reason,
+                              "scans": index["scans"], "size_bytes": index["size_bytes"],
+                              "validation": validation, "index_writes_per_day": writes, "costs": []})
+
+            for _, query, sort, row in shapes.get(collection, []):
+                if row["plan"] != "COLLSCAN" and row["docs"] < self.args.min_ratio * max(row["returned"], 1):
+                    continue
+                keys = esr_keys(query, sort)
+                if not keys or any(covers(i["keys"], keys) for i in indexes) or \
+                        any(p["table"] == collection and p["keys"] == keys for p in proposals):
+                    continue
+                spec = [(key.removesuffix(" DESC"), -1 if key.endswith(" DESC") else 1) for key in keys]
+                before = self.explain(collection, query, sort)
+                after, validation = None, "не проверено (нужен --allow-temp)"
+                if self.args.allow_temp:
+                    try:
+                        self.db[collection].create_index(spec, name=TEMP_INDEX)
+                        after, validation = self.explain(collection, query, sort), "временный индекс"
+                    except OperationFailure as e:
+                        validation = f"ошибка: {e}"
+                    finally:
+                        if TEMP_INDEX in self.db[collection].index_information():
+                            self.db[collection].drop_index(TEMP_INDEX)
+                if after is not None and after >= before * (1 - self.args.min_gain):
+                    continue
+                proposals.append({
+                    "ddl": f"db.{collection}.createIndex({{{', '.join(f'{f}: {d}' for f, d in spec)}}})",
+                    "table": collection, "keys": keys, "query": str(query),
+                    "cost_metric": "ключей+документов", "cost_before": before, "cost_after": after,
+                    "validation": validation, "index_writes_per_day": writes,
+                })
+
+        print_drops(drops, "MongoDB")
+        print_proposals(proposals, "MongoDB")
+        return {"shapes": len(workload), "drops": drops, "proposals": proposals}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Советник по индексам по нагрузке PostgreSQL и MongoDB")
+    parser.add_argument("--engines", default="postgres,mongo")
+    parser.add_argument("--dsn", default="dbname=bd")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--files", nargs="+", default=DEFAULT_FILES,
+                        help="SQL-файлы с запросами, если pg_stat_statements не подключен")
+    parser.add_argument("--collections", default="events,users,bookings,reviews",
+                        help="коллекции MongoDB, которые проверяются даже без запросов в профиле")
+    parser.add_argument("--top", type=int, default=20, help="сколько самых дорогих запросов брать")
+    parser.add_argument("--allow-temp", action="store_true",
+                        help="проверять временными/скрытыми индексами, если нет hypopg")
+    parser.add_argument("--min-rows", type=int, default=10000, help="меньшие таблицы можно сканировать целиком")
+    parser.add_argument("--min-ratio", type=float, default=10, help="docsExamined / nreturned для MongoDB")
+    parser.add_argument("--max-include", type=int, default=2, help="колонок в INCLUDE покрывающего индекса")
+    parser.add_argument("--min-gain", type=float, default=0.1, help="минимальное снижение стоимости")
+    parser.add_argument("--max-regression", type=float, default=0.05,
+                        help="допустимое удорожание запроса после удаления индекса")
+    parser.add_argument("--min-stats-days", type=float, default=7,
+                        help="idx_scan = 0 считается неиспользуемым только при статистике за столько суток")
+    parser.add_argument("--lock-timeout-ms", type=int, default=2000)
+    parser.add_argument("--output", help="JSON-отчет")
+    args = parser.parse_args()
+    args.collections = args.collections.split(",")
+    return args
+
+
+def main():
+    args = parse_args()
+    engines = args.engines.split(",")
+    print(f"=== INDEX ADVISOR {datetime.now():%Y-%m-%d %H:%M} ===")
+    report = {"generated_at": datetime.now().isoformat(timespec="seconds")}
+    if "postgres" in engines:
+        report["postgres"] = PgAdvisor(args).run()
+    if "mongo" in engines:
+        report["mongo"] = MongoAdvisor(args).run()
+    if args.output:
+        save_report(args.output, report)
+        print(f"\nОтчет: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# mongo_exporter.py - Экспортер метрик MongoDB (event_booking_system) для Prometheus
+#
+# За один опрос снимает serverStatus (opcounters, соединения, кэш WiredTiger),
+# $collStats (документы, размеры данных и индексов) и $indexStats (обращения
+# к каждому индексу) для коллекций из create_collections.js, а также считает
+# медленные запросы из профилировщика (system.profile). Так под нагрузкой
+# видно, какие индексы из create_indexes_simple.js и
+# lab2/create_permanent_indexes.js не используются, а какие горячие.
+# Метрики отдаются по HTTP (/metrics) и/или пишутся в textfile атомарно.
+#
+# Примеры:
+#   python3 mongo_exporter.py --uri mongodb://localhost:27017/ --listen 0.0.0.0:9216
+#   python3 mongo_exporter.py --enable-profiler 100 --textfile /tmp/prometheus_export/mongo_metrics.prom
+import argparse
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from pymongo import MongoClient
+from pymongo.errors import OperationFailure, PyMongoError
+
+from promtext import render, write_textfile
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+COLLECTIONS = ['events', 'users', 'bookings', 'reviews', 'user_activity_logs']
+TEXTFILE = "/tmp/prometheus_export/mongo_metrics.prom"
+
+# Поля serverStatus().wiredTiger.cache
+WT_CACHE = [
+    ("mongodb_wt_cache_bytes", "gauge", "Bytes currently in the WiredTiger cache",
+     "bytes currently in the cache"),
+    ("mongodb_wt_cache_max_bytes", "gauge", "Configured WiredTiger cache size",
+     "maximum bytes configured"),
+    ("mongodb_wt_cache_dirty_bytes", "gauge", "Dirty bytes in the WiredTiger cache",
+     "tracked dirty bytes in the cache"),
+    ("mongodb_wt_cache_app_evictions_total", "counter", "Pages evicted by application threads",
+     "pages evicted by application threads"),
+    ("mongodb_wt_cache_read_into_total", "counter", "Pages read into the cache",
+     "pages read into cache"),
+]
+
+COLLECTION_STATS = [
+    ("mongodb_collection_documents", "gauge", "Documents in the collection", "count"),
+    ("mongodb_collection_size_bytes", "gauge", "Uncompressed data size", "size"),
+    ("mongodb_collection_storage_bytes", "gauge", "Storage size on disk", "storageSize"),
+    ("mongodb_collection_index_bytes", "gauge", "Total size of the collection indexes", "totalIndexSize"),
+    ("mongodb_collection_avg_document_bytes", "gauge", "Average document size", "avgObjSize"),
+]
+
+
+class Exporter:
+    def __init__(self, uri, collections):
+        # Один клиент со своим пулом на всё время работы
+        self.client = MongoClient(uri, appname="mongo_exporter", serverSelectionTimeoutMS=3000)
+        self.db = self.client[DB_NAME]
+        self.collections = collections
+        self.lock = threading.Lock()
+        self.scrapes = 0
+        self.errors = 0
+        # Профилировщик хранит ограниченное окно (capped), поэтому счетчики копятся здесь
+        self.slow_queries = {}
+        self.slow_millis = {}
+        self.profile_seen_until = None
+
+    def server_samples(self):
+        status = self.db.command("serverStatus")
+        samples = []
+        for op, value in status.get("opcounters", {}).items():
+            samples.append(("mongodb_opcounters_total", "counter", "Operations by type", {"type": op}, value))
+        connections = status.get("connections", {})
+        for state in ("current", "available"):
+            samples.append(("mongodb_connections", "gauge", "Client connections", {"state": state},
+                            connections.get(state, 0)))
+        cache = status.get("wiredTiger", {}).get("cache", {})
+        for name, kind, help_text, key in WT_CACHE:
+            samples.append((name, kind, help_text, {}, cache.get(key, 0)))
+        if cache.get("maximum bytes configured"):
+            fill = cache.get("bytes currently in the cache", 0) / cache["maximum bytes configured"]
+            dirty = cache.get("tracked dirty bytes in the cache", 0) / cache["maximum bytes configured"]
+            samples.append(("mongodb_wt_cache_fill_ratio", "gauge", "Cache fill ratio (eviction starts at 0.8)",
+                            {}, round(fill, 4)))
+            samples.append(("mongodb_wt_cache_dirty_ratio", "gauge", "Dirty cache ratio (eviction starts at 0.05)",
+                            {}, round(dirty, 4)))
+        return samples
+
+    def collection_samples(self, name):
+        labels = {"collection": name}
+        samples = []
+        stats = next(self.db[name].aggregate([{"$collStats": {"storageStats": {}}}]), {})
+        storage = stats.get("storageStats", {})
+        for metric, kind, help_text, key in COLLECTION_STATS:
+            samples.append((metric, kind, help_text, labels, storage.get(key, 0)))
+        for index, size in storage.get("indexSizes", {}).items():
+            samples.append(("mongodb_index_size_bytes", "gauge", "Index size", dict(labels, index=index), size))
+
+        # Для time-series коллекций $indexStats недоступен
+        try:
+            for index in self.db[name].aggregate([{"$indexStats": {}}]):
+                index_labels = dict(labels, index=index["name"])
+                accesses = index.get("accesses", {})
+                samples.append(("mongodb_index_accesses_total", "counter",
+                                "Index accesses since the server start or index creation",
+                                index_labels, accesses.get("ops", 0)))
+                since = accesses.get("since")
+                if since:
+                    samples.append(("mongodb_index_accesses_since_seconds", "gauge",
+                                    "Start of the index access counter (unix time)", index_labels,
+                                    int(since.timestamp())))
+        except OperationFailure:
+            pass
+        return samples
+
+    def profile_samples(self):
+        """Медленные запросы из system.profile, накопленные с момента запуска экспортера"""
+        match = {"ns": {"$in": [f"{DB_NAME}.{name}" for name in self.collections]}}
+        if self.profile_seen_until is not None:
+            match["ts"] = {"$gt": self.profile_seen_until}
+        for row in self.db["system.profile"].aggregate([
+            {"$match": match},
+            {"$group": {"_id": {"ns": "$ns", "op": "$op"}, "count": {"$sum": 1},
+                        "millis": {"$sum": "$millis"}, "last": {"$max": "$ts"}}},
+        ]):
+            key = (row["_id"]["ns"].split(".", 1)[1], row["_id"]["op"])
+            self.slow_queries[key] = self.slow_queries.get(key, 0) + row["count"]
+            self.slow_millis[key] = self.slow_millis.get(key, 0) + row["millis"]
+            if self.profile_seen_until is None or row["last"] > self.profile_seen_until:
+                self.profile_seen_until = row["last"]
+        samples = []
+        for (collection, op), count in self.slow_queries.items():
+            labels = {"collection": collection, "op": op}
+            samples.append(("mongodb_slow_queries_total", "counter", "Operations recorded by the profiler",
+                            labels, count))
+            samples.append(("mongodb_slow_queries_millis_total", "counter", "Time spent in profiled operations",
+                            labels, self.slow_millis[(collection, op)]))
+        return samples
+
+    def scrape(self):
+        with self.lock:
+            self.scrapes += 1
+            started = time.perf_counter()
+            samples = []
+            try:
+                samples += self.server_samples()
+                for name in self.collections:
+                    samples += self.collection_samples(name)
+                samples += self.profile_samples()
+                up = 1
+            except PyMongoError as e:
+                print(f"Ошибка опроса MongoDB: {e}")
+                self.errors += 1
+                samples, up = [], 0
+            samples.append(("mongodb_up", "gauge", "Whether the last scrape succeeded", {}, up))
+            samples.append(("mongodb_exporter_scrape_duration_seconds", "gauge", "Duration of the last scrape", {},
+                            round(time.perf_counter() - started, 6)))
+            samples.append(("mongodb_exporter_scrapes_total", "counter", "Scrapes performed", {}, self.scrapes))
+            samples.append(("mongodb_exporter_scrape_errors_total", "counter", "Failed scrapes", {}, self.errors))
+            return render(samples)
+
+
+def make_handler(exporter):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = exporter.scrape().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def textfile_loop(exporter, path, interval):
+    while True:
+        write_textfile(path, exporter.scrape())
+        time.sleep(interval)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Экспортер метрик MongoDB для Prometheus")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--collections", default=",".join(COLLECTIONS))
+    parser.add_argument("--listen", help="host:port для /metrics, например 0.0.0.0:9216")
+    parser.add_argument("--textfile", help=f"файл для textfile-коллектора, например {TEXTFILE}")
+    parser.add_argument("--interval", type=float, default=5, help="период записи textfile, с")
+    parser.add_argument("--once", action="store_true", help="записать textfile один раз и выйти")
+    parser.add_argument("--enable-profiler", type=int, metavar="SLOWMS",
+                        help="включить профилировщик для запросов дольше SLOWMS мс")
+    args = parser.parse_args()
+    if not (args.listen or args.textfile or args.once):
+        args.listen = "0.0.0.0:9216"
+    return args
+
+
+def main():
+    args = parse_args()
+    exporter = Exporter(args.uri, args.collections.split(","))
+    if args.enable_profiler is not None:
+        exporter.db.command("profile", 1, slowms=args.enable_profiler)
+        print(f"Профилировщик включен: slowms={args.enable_profiler}")
+
+    if args.once:
+        write_textfile(args.textfile or TEXTFILE, exporter.scrape())
+        return
+    if args.textfile:
+        print(f"Файл метрик: {args.textfile} (каждые {args.interval} с)")
+        thread = threading.Thread(target=textfile_loop, args=(exporter, args.textfile, args.interval),
+                                  daemon=True)
+        thread.start()
+        if not args.listen:
+            thread.join()
+    if args.listen:
+        host, port = args.listen.rsplit(":", 1)
+        print(f"Метрики: http://{args.listen}/metrics")
+        ThreadingHTTPServer((host, int(port)), make_handler(exporter)).serve_forever()
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,32 @@
+# promtext.py - Текстовый формат Prometheus для экспортеров lab5
+import os
+
+
+def escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def render(samples):
+    """Сэмплы (имя, тип, описание, метки, значение) в текст; HELP/TYPE - один раз на метрику"""
+    grouped = {}
+    for name, kind, help_text, labels, value in samples:
+        grouped.setdefault(name, (kind, help_text, []))[2].append((labels, value))
+    lines = []
+    for name, (kind, help_text, series) in grouped.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in series:
+            label_text = ",".join(f'{key}="{escape(val)}"' for key, val in labels.items())
+            label_text = f"{{{label_text}}}" if label_text else ""
+            lines.append(f"{name}{label_text} {0 if value is None else value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_textfile(path, text):
+    """Атомарная запись для textfile-коллектора node-exporter: временный файл + rename"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # node-exporter читает только *.prom, поэтому недописанный временный файл он не увидит
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -11,7 +11,7 @@ fi
 
 if [ ! -f "/tmp/prometheus_export/postgres_metrics.prom" ]; then
     echo "Сбор метрик..."
-    ./collect_prometheus_metrics.sh
+    python3 pg_exporter.py --once --textfile /tmp/prometheus_export/postgres_metrics.prom
 fi
 
 echo "Файл метрик создан:"
@@ -51,8 +51,10 @@ echo "   - URL: http://prometheus:9090"
 echo "4. Создайте новый Dashboard"
 echo ""
 echo "=== АВТОМАТИЧЕСКИЙ СБОР МЕТРИК ==="
-echo "Для автоматического обновления добавьте в crontab:"
-echo "*/5 * * * * $(pwd)/collect_prometheus_metrics.sh"
+echo "Экспортер с одним подключением к базе (job 'postgres' в prometheus.yml):"
+echo "   python3 $(pwd)/pg_exporter.py --listen 0.0.0.0:9187"
+echo "Экспортер MongoDB (job 'mongodb', индексы и медленные запросы):"
+echo "   python3 $(pwd)/mongo_exporter.py --listen 0.0.0.0:9216 --enable-profiler 100"
 echo ""
 echo "Текущие контейнеры:"
 docker-compose ps
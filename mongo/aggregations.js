@@ -1,92 +1,53 @@
 db = db.getSiblingDB('event_booking_system');
 
-console.log("=== АГРЕГАЦИОННЫЕ PIPELINES ===\n");
-
-console.log("Pipeline 1: Каталог мероприятий с тегами и отзывами");
-const pipeline1 = [
-    {
-        $match: {
-            status: "published",
-            date: { $gte: new Date() }
-        }
-    },
-    {
-        $lookup: {
-            from: "reviews",
-            localField: "_id",
-            foreignField: "event_id",
-            as: "reviews",
-            pipeline: [
-                {
-                    $sort: { created_at: -1 }
-                },
-                {
-                    $limit: 5
-                }
-            ]
-        }
-    },
-    {
-        $lookup: {
-            from: "venues",
-            localField: "venue_id",
-            foreignField: "_id",
-            as: "venue"
-        }
-    },
-    {
-        $unwind: "$venue"
-    },
-    {
-        $lookup: {
-            from: "organizers",
-            localField: "organizer_id",
-            foreignField: "_id",
-            as: "organizer"
-        }
-    },
-    {
-        $unwind: "$organizer"
-    },
-    {
-        $project: {
-            title: 1,
-            description: 1,
-            date: 1,
-            categories: 1,
-            tags: 1,
-            available_seats: 1,
-            venue: {
-                name: "$venue.name",
-                address: "$venue.address"
-            },
-            organizer: {
-                name: "$organizer.name",
-                rating: "$organizer.rating"
-            },
-            ticket_types: 1,
-            review_count: { $size: "$reviews" },
-            average_rating: {
-                $cond: {
-                    if: { $gt: [{ $size: "$reviews" }, 0] },
-                    then: { $avg: "$reviews.rating" },
-                    else: 0
+// Просмотры и активность берутся из сверток user_activity_hourly /
+// user_activity_daily (python3 user_activity.py --rollup), а не из сырого
+// лога: в users.view_history хранятся только последние просмотры
+const userActivityLookup = {
+    $lookup: {
+        from: "user_activity_daily",
+        localField: "_id",
+        foreignField: "user_id",
+        as: "activity",
+        pipeline: [
+            {
+                $group: {
+                    _id: null,
+                    views: { $sum: "$views" },
+                    last_at: { $max: "$last_at" }
                 }
-            },
-            recent_reviews: {
-                $slice: ["$reviews", 3]
             }
-        }
-    },
-    {
-        $sort: { date: 1 }
-    },
-    {
-        $limit: 10
+        ]
     }
-];
+};
 
-const result1 = db.events.aggregate(pipeline1).toArray();
+console.log("=== АГРЕГАЦИОННЫЕ PIPELINES ===\n");
+
+// Каталог читается из витрины event_cards (event_cards.py): место,
+// организатор, рейтинг и последние отзывы уже в карточке, поэтому вместо
+// трех $lookup - один find по индексу {status, date, _id}. Приложение отдает
+// страницы каталога еще и через кэш catalog_cache.py
+console.log("Pipeline 1: Каталог мероприятий с тегами и отзывами");
+const result1 = db.event_cards.find(
+    {
+        status: "published",
+        date: { $gte: new Date() }
+    },
+    {
+        title: 1,
+        description: 1,
+        date: 1,
+        categories: 1,
+        tags: 1,
+        available_seats: 1,
+        venue: 1,
+        organizer: 1,
+        ticket_types: 1,
+        review_count: "$reviews.count",
+        average_rating: "$reviews.average_rating",
+        recent_reviews: "$top_reviews"
+    }
+).sort({ date: 1, _id: 1 }).limit(10).toArray();
 console.log("Каталог мероприятий:");
 result1.forEach((event, i) => {
     console.log(`${i+1}. ${event.title} - ${event.venue.name}`);
@@ -100,6 +61,7 @@ const pipeline2 = [
             "stats.total_bookings": { $gte: 2 }
         }
     },
+    userActivityLookup,
     {
         $project: {
             name: 1,
@@ -107,7 +69,7 @@ const pipeline2 = [
             total_bookings: "$stats.total_bookings",
             total_spent: "$stats.total_spent",
             favorites_count: { $size: "$favorites" },
-            view_history_count: { $size: "$view_history" },
+            view_history_count: { $ifNull: [{ $arrayElemAt: ["$activity.views", 0] }, 0] },
             booking_history: {
                 $slice: ["$booking_history", 5]
             },
@@ -182,13 +144,24 @@ result2.forEach((user, i) => {
 console.log("\nPipeline 3: Популярность по просмотрам");
 const pipeline3 = [
     {
-        $unwind: "$view_history"
+        $match: { action: "view" }
     },
     {
         $group: {
-            _id: "$view_history.event_id",
-            view_count: { $sum: 1 },
-            unique_users: { $addToSet: "$_id" }
+            _id: "$event_id",
+            view_count: { $sum: "$count" },
+            unique_users: { $push: "$users" }
+        }
+    },
+    {
+        $set: {
+            unique_users: {
+                $reduce: {
+                    input: "$unique_users",
+                    initialValue: [],
+                    in: { $setUnion: ["$$value", "$$this"] }
+                }
+            }
         }
     },
     {
@@ -249,7 +222,7 @@ const pipeline3 = [
     }
 ];
 
-const result3 = db.users.aggregate(pipeline3).toArray();
+const result3 = db.user_activity_hourly.aggregate(pipeline3).toArray();
 console.log("Популярные мероприятия по просмотрам:");
 result3.forEach((event, i) => {
     console.log(`${i+1}. ${event.event_title}`);
@@ -333,69 +306,49 @@ result4.forEach((cat, i) => {
 });
 
 console.log("\nPipeline 5: Полный отчет по мероприятию");
+// Продажи и отзывы берутся из event_cards; $lookup остались только для
+// избранного и просмотров и выполняются для 10 мероприятий после $limit
 const pipeline5 = [
     {
         $match: {
             status: "published",
-            date: { $gte: new Date() }
+            date: { $gte: new Date() },
+            "sales.bookings": { $gt: 0 }
         }
     },
     {
-        $lookup: {
-            from: "bookings",
-            localField: "_id",
-            foreignField: "event_id",
-            as: "bookings",
-            pipeline: [
-                {
-                    $match: { status: "confirmed" }
-                }
-            ]
-        }
+        $sort: { "sales.revenue": -1 }
     },
     {
-        $lookup: {
-            from: "reviews",
-            localField: "_id",
-            foreignField: "event_id",
-            as: "reviews"
-        }
+        $limit: 10
     },
     {
         $lookup: {
             from: "users",
-            let: { eventId: "$_id" },
+            localField: "_id",
+            foreignField: "favorites",
+            as: "in_favorites",
             pipeline: [
-                {
-                    $match: {
-                        $expr: { $in: ["$$eventId", "$favorites"] }
-                    }
-                },
                 {
                     $count: "count"
                 }
-            ],
-            as: "in_favorites"
+            ]
         }
     },
     {
         $lookup: {
-            from: "users",
-            let: { eventId: "$_id" },
+            from: "user_activity_hourly",
+            localField: "_id",
+            foreignField: "event_id",
+            as: "view_stats",
             pipeline: [
                 {
-                    $unwind: "$view_history"
-                },
-                {
-                    $match: {
-                        $expr: { $eq: ["$view_history.event_id", "$$eventId"] }
-                    }
+                    $match: { action: "view" }
                 },
                 {
-                    $count: "count"
+                    $group: { _id: null, count: { $sum: "$count" } }
                 }
-            ],
-            as: "view_stats"
+            ]
         }
     },
     {
@@ -408,21 +361,11 @@ const pipeline5 = [
             organizer_id: 1,
             ticket_types: 1,
             available_seats: 1,
-            total_bookings: { $size: "$bookings" },
-            total_tickets_sold: {
-                $sum: "$bookings.quantity"
-            },
-            total_revenue: {
-                $sum: "$bookings.total_amount"
-            },
-            avg_rating: {
-                $cond: {
-                    if: { $gt: [{ $size: "$reviews" }, 0] },
-                    then: { $avg: "$reviews.rating" },
-                    else: 0
-                }
-            },
-            review_count: { $size: "$reviews" },
+            total_bookings: "$sales.bookings",
+            total_tickets_sold: "$sales.tickets_sold",
+            total_revenue: "$sales.revenue",
+            avg_rating: "$reviews.average_rating",
+            review_count: "$reviews.count",
             in_favorites_count: {
                 $ifNull: [{ $arrayElemAt: ["$in_favorites.count", 0] }, 0]
             },
@@ -436,8 +379,8 @@ const pipeline5 = [
                         $multiply: [
                             {
                                 $divide: [
-                                    { $size: "$bookings" },
-                                    { $ifNull: [{ $arrayElemAt: ["$view_stats.count", 0] }, 1] }
+                                    "$sales.bookings",
+                                    { $arrayElemAt: ["$view_stats.count", 0] }
                                 ]
                             },
                             100
@@ -446,33 +389,12 @@ const pipeline5 = [
                     else: 0
                 }
             },
-            occupancy_rate: {
-                $multiply: [
-                    {
-                        $divide: [
-                            { $sum: "$bookings.quantity" },
-                            "$capacity"
-                        ]
-                    },
-                    100
-                ]
-            }
-        }
-    },
-    {
-        $match: {
-            total_bookings: { $gt: 0 }
+            occupancy_rate: 1
         }
-    },
-    {
-        $sort: { total_revenue: -1 }
-    },
-    {
-        $limit: 10
     }
 ];
 
-const result5 = db.events.aggregate(pipeline5).toArray();
+const result5 = db.event_cards.aggregate(pipeline5).toArray();
 console.log("Топ мероприятий по выручке:");
 result5.forEach((event, i) => {
     console.log(`${i+1}. ${event.title}`);
@@ -486,6 +408,7 @@ const pipeline6 = [
             "stats.total_bookings": { $gte: 1 }
         }
     },
+    userActivityLookup,
     {
         $project: {
             name: 1,
@@ -493,7 +416,7 @@ const pipeline6 = [
             created_at: 1,
             stats: 1,
             favorites_count: { $size: "$favorites" },
-            view_history_count: { $size: "$view_history" },
+            view_history_count: { $ifNull: [{ $arrayElemAt: ["$activity.views", 0] }, 0] },
             booking_history_count: { $size: "$booking_history" },
             days_since_last_activity: {
                 $divide: [
@@ -503,7 +426,7 @@ const pipeline6 = [
                             {
                                 $max: [
                                     "$stats.last_booking_date",
-                                    { $arrayElemAt: ["$view_history.viewed_at", 0] }
+                                    { $arrayElemAt: ["$activity.last_at", 0] }
                                 ]
                             }
                         ]
@@ -544,59 +467,6 @@ console.log("\n=== АГРЕГАЦИИ ЗАВЕРШЕНЫ ===");
 
 console.log("\n=== СОЗДАНИЕ МАТЕРИАЛИЗОВАННОЙ ВИТРИНЫ ===");
 
-db.createCollection("user_behavior_dashboard", {
-    viewOn: "users",
-    pipeline: [
-        {
-            $match: {
-                "stats.total_bookings": { $gte: 0 }
-            }
-        },
-        {
-            $lookup: {
-                from: "user_activity_logs",
-                localField: "_id",
-                foreignField: "user_id",
-                as: "activity_logs"
-            }
-        },
-        {
-            $project: {
-                _id: 1,
-                name: 1,
-                email: 1,
-                created_at: 1,
-                total_bookings: "$stats.total_bookings",
-                total_spent: "$stats.total_spent",
-                last_booking_date: "$stats.last_booking_date",
-                favorites_count: { $size: "$favorites" },
-                view_history_count: { $size: "$view_history" },
-                preferred_categories: "$preferences.categories",
-                activity_count: { $size: "$activity_logs" },
-                last_activity_date: { $max: "$activity_logs.timestamp" },
-                activity_types: {
-                    $reduce: {
-                        input: "$activity_logs",
-                        initialValue: [],
-                        in: {
-                            $cond: {
-                                if: { $in: ["$$this.action", "$$value"] },
-                                then: "$$value",
-                                else: { $concatArrays: ["$$value", ["$$this.action"]] }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    ]
-});
-
-console.log("Витрина создана: user_behavior_dashboard");
-console.log(`Записей в витрине: ${db.user_behavior_dashboard.countDocuments({})}`);
-
-db.user_behavior_dashboard.createIndex({ "total_spent": -1 });
-db.user_behavior_dashboard.createIndex({ "last_activity_date": -1 });
-db.user_behavior_dashboard.createIndex({ "preferred_categories": 1 });
-
-console.log("Индексы для витрины созданы");
+// Витрина поддерживается инкрементально: $merge только новых бронирований
+// и логов активности (см. refresh_dashboard.js), без пересчета всей истории
+load("refresh_dashboard.js");
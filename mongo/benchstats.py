@@ -0,0 +1,134 @@
+# benchstats.py - Общие функции для отчетов бенчмарков (задержки, сравнение с базой)
+import json
+import math
+
+
+def percentile(sorted_values, p):
+    """Перцентиль методом ближайшего ранга по отсортированному списку"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(p / 100.0 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies_ms):
+    """Сводка распределения задержек в миллисекундах"""
+    values = sorted(latencies_ms)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "min_ms": round(values[0], 3),
+        "mean_ms": round(sum(values) / len(values), 3),
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+def load_report(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_report(path, report):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, default=str)
+
+
+def compare(baseline, current, metric="p95_ms", threshold=1.2):
+    """Сравнение двух наборов {имя: сводка}; регрессия - рост metric больше чем в threshold раз"""
+    rows = []
+    for name, stats in current.items():
+        base = baseline.get(name)
+        if not base or base.get(metric) is None or stats.get(metric) is None:
+            rows.append((name, None, stats.get(metric), None, False))
+            continue
+        ratio = stats[metric] / base[metric] if base[metric] else math.inf
+        rows.append((name, base[metric], stats[metric], ratio, ratio > threshold))
+    return rows
+
+
+def print_comparison(rows, metric="p95_ms"):
+    print(f"{'name':<50} {'base ' + metric:>14} {metric:>14} {'ratio':>8}")
+    for name, base, value, ratio, regressed in rows:
+        base_text = "-" if base is None else f"{base:.3f}"
+        value_text = "-" if value is None else f"{value:.3f}"
+        ratio_text = "-" if ratio is None else f"{ratio:.2f}x"
+        flag = "  REGRESSION" if regressed else ""
+        print(f"{name[:50]:<50} {base_text:>14} {value_text:>14} {ratio_text:>8}{flag}")
+
+
+class Histogram:
+    """Логарифмическая гистограмма задержек (мс): память не растет с числом замеров,
+    гистограммы разных процессов складываются через merge(); точность перцентилей ~growth"""
+
+    def __init__(self, growth=1.05, smallest_ms=0.01):
+        self.growth = growth
+        self.smallest_ms = smallest_ms
+        self.counts = {}
+        self.count = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = None
+
+    def bucket(self, value_ms):
+        if value_ms <= self.smallest_ms:
+            return 0
+        return math.ceil(math.log(value_ms / self.smallest_ms, self.growth))
+
+    def upper_ms(self, bucket):
+        return self.smallest_ms * self.growth ** bucket
+
+    def add(self, value_ms):
+        bucket = self.bucket(value_ms)
+        self.counts[bucket] = self.counts.get(bucket, 0) + 1
+        self.count += 1
+        self.total_ms += value_ms
+        self.min_ms = value_ms if self.min_ms is None else min(self.min_ms, value_ms)
+        self.max_ms = value_ms if self.max_ms is None else max(self.max_ms, value_ms)
+
+    def merge(self, other):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.count += other.count
+        self.total_ms += other.total_ms
+        for value in (other.min_ms, other.max_ms):
+            if value is not None:
+                self.min_ms = value if self.min_ms is None else min(self.min_ms, value)
+                self.max_ms = value if self.max_ms is None else max(self.max_ms, value)
+
+    def percentile(self, p):
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(p / 100.0 * self.count))
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(self.upper_ms(bucket), self.max_ms)
+        return self.max_ms
+
+    def summary(self):
+        """Сводка в формате summarize()"""
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "min_ms": round(self.min_ms, 3),
+            "mean_ms": round(self.total_ms / self.count, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p95_ms": round(self.percentile(95), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+    def buckets(self, per_decade=4):
+        """Грубые корзины для отчета: [[верхняя граница, мс], число замеров]"""
+        coarse = {}
+        for bucket, count in self.counts.items():
+            value = self.upper_ms(bucket)
+            edge = 10 ** (math.ceil(math.log10(value) * per_decade) / per_decade)
+            coarse[edge] = coarse.get(edge, 0) + count
+        return [[round(edge, 3), coarse[edge]] for edge in sorted(coarse)]
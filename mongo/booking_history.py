@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# booking_history.py - История бронирований пользователя с keyset-пагинацией
+#
+# Страницы выбираются по ключу (дата, id бронирования) после курсора, а не
+# через OFFSET: каждая следующая страница стоит столько же, сколько первая.
+# Курсор - непрозрачная строка, которую клиент возвращает за следующей
+# страницей. Полная история берется из bookings (MongoDB) / Bookings (lab2),
+# а в документе пользователя хранятся только последние BOOKING_HISTORY_LIMIT
+# записей booking_history.
+#
+# Примеры:
+#   python3 booking_history.py --engine mongo --user-id 65f0... --limit 20
+#   python3 booking_history.py --engine postgres --pg-dsn "dbname=event_booking" --user-id 42 --after <курсор>
+#   python3 booking_history.py --ensure-indexes --trim
+import argparse
+import base64
+import json
+from datetime import datetime
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+# Сколько последних бронирований хранится внутри документа пользователя
+BOOKING_HISTORY_LIMIT = 50
+
+# Индекс под сортировку страницы: равенство по пользователю, затем ключ поиска
+MONGO_HISTORY_INDEX = [("user_id", 1), ("created_at", -1), ("_id", -1)]
+PG_HISTORY_INDEX = ("CREATE INDEX IF NOT EXISTS idx_bookings_user_date_id "
+                    "ON Bookings(user_id, booking_date DESC, booking_id DESC)")
+
+
+def history_push(entries, limit=BOOKING_HISTORY_LIMIT):
+    """$push для booking_history: добавить записи и оставить последние limit по дате"""
+    return {"$each": entries, "$sort": {"date": 1}, "$slice": -limit}
+
+
+def encode_cursor(date, booking_id):
+    payload = json.dumps([date.isoformat(), str(booking_id)])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    date, booking_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    return datetime.fromisoformat(date), booking_id
+
+
+def mongo_history_page(db, user_id, after=None, limit=20):
+    """Страница бронирований пользователя из bookings; возвращает (записи, курсор или None)"""
+    from bson import ObjectId
+
+    query = {"user_id": user_id}
+    if after:
+        date, booking_id = decode_cursor(after)
+        booking_id = ObjectId(booking_id)
+        # Условие на created_at в корне дает границу индекса (user_id, created_at):
+        # одного $or планировщику хватает только на фильтр без сужения диапазона
+        query["created_at"] = {"$lte": date}
+        query["$or"] = [
+            {"created_at": {"$lt": date}},
+            {"created_at": date, "_id": {"$lt": booking_id}},
+        ]
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    docs = list(
+        db.bookings.find(query)
+        .sort([("created_at", -1), ("_id", -1)])
+        .limit(limit + 1)
+        .hint(MONGO_HISTORY_INDEX)
+    )
+    page = docs[:limit]
+    next_cursor = None
+    if len(docs) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last["created_at"], last["_id"])
+    return page, next_cursor
+
+
+def pg_history_page(conn, user_id, after=None, limit=20):
+    """Страница бронирований пользователя из Bookings (схема lab2)"""
+    conditions = ["b.user_id = %(user_id)s"]
+    params = {"user_id": user_id, "limit": limit + 1}
+    if after:
+        params["date"], params["booking_id"] = decode_cursor(after)
+        # Сравнение кортежей совпадает с порядком индекса (booking_date DESC, booking_id DESC)
+        conditions.append("(b.booking_date, b.booking_id) < (%(date)s, %(booking_id)s)")
+
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT b.booking_id, b.booking_date, b.event_id, e.title, b.status_id, b.total_amount
+            FROM Bookings b
+            JOIN Events e ON e.event_id = b.event_id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY b.booking_date DESC, b.booking_id DESC
+            LIMIT %(limit)s
+        """, params)
+        columns = [column.name for column in cur.description]
+        rows = [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    page = rows[:limit]
+    next_cursor = None
+    if len(rows) > limit:
+        last = page[-1]
+        next_cursor = encode_cursor(last["booking_date"], last["booking_id"])
+    return page, next_cursor
+
+
+def ensure_mongo_indexes(db):
+    db.bookings.create_index(MONGO_HISTORY_INDEX, name="idx_user_created_id")
+
+
+def ensure_pg_indexes(conn):
+    with conn.cursor() as cur:
+        cur.execute(PG_HISTORY_INDEX)
+    conn.commit()
+
+
+def trim_histories(db, limit=BOOKING_HISTORY_LIMIT):
+    """Обрезка уже накопленных booking_history до последних limit записей"""
+    result = db.users.update_many(
+        {f"booking_history.{limit}": {"$exists": True}},
+        {"$push": {"booking_history": history_push([], limit)}}
+    )
+    return result.modified_count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="История бронирований с keyset-пагинацией")
+    parser.add_argument("--engine", choices=["mongo", "postgres"], default="mongo")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--user-id", help="ObjectId (mongo) или user_id (postgres)")
+    parser.add_argument("--after", help="курсор предыдущей страницы")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--ensure-indexes", action="store_true", help="создать составные индексы")
+    parser.add_argument("--trim", action="store_true",
+                        help=f"обрезать booking_history до {BOOKING_HISTORY_LIMIT} записей")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.engine == "mongo":
+        from bson import ObjectId
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo_uri)[DB_NAME]
+        if args.ensure_indexes:
+            ensure_mongo_indexes(db)
+            print("✓ Индекс bookings {user_id, created_at, _id} создан")
+        if args.trim:
+            print(f"✓ Обрезано историй: {trim_histories(db)}")
+        if not args.user_id:
+            return
+        page, next_cursor = mongo_history_page(db, ObjectId(args.user_id), args.after, args.limit)
+        for booking in page:
+            print(f"{booking['created_at']:%Y-%m-%d %H:%M}  {booking['_id']}  "
+                  f"{booking.get('status')}  {booking.get('total_amount')}")
+    else:
+        import psycopg2
+        conn = psycopg2.connect(args.pg_dsn)
+        if args.ensure_indexes:
+            ensure_pg_indexes(conn)
+            print("✓ Индекс idx_bookings_user_date_id создан")
+        if not args.user_id:
+            return
+        page, next_cursor = pg_history_page(conn, int(args.user_id), args.after, args.limit)
+        for booking in page:
+            print(f"{booking['booking_date']:%Y-%m-%d %H:%M}  {booking['booking_id']}  "
+                  f"{booking['title']}  {booking['total_amount']}")
+
+    print(f"\nСледующая страница: {next_cursor or 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
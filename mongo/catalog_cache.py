@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+# catalog_cache.py - Read-through кэш каталога мероприятий (Pipeline 1 из aggregations.js)
+#
+# Страница каталога - опубликованные будущие мероприятия с пятью последними
+# отзывами, местом проведения и организатором - кэшируется по ключу
+# (категория, тег, номер страницы, размер страницы):
+#   - lru   - в памяти процесса: LRU на --max-entries записей с TTL;
+#   - redis - общий для процессов Redis-совместимый сервер (SET с EX).
+# Для каждой записи запоминаются зависимости - мероприятия, места и
+# организаторы на странице. Change stream по events, reviews, venues и
+# organizers сбрасывает только записи с измененным объектом; вставка или
+# удаление мероприятия и смена полей, от которых зависит попадание в выборку
+# (MEMBERSHIP_FIELDS), сбрасывают весь каталог. Change stream требует
+# replica set; без него записи устаревают только по TTL.
+# Метрики (попадания/промахи, сбросы, задержки ответа из кэша и из базы)
+# отдаются в формате Prometheus (--listen, job catalog_cache в lab5/prometheus.yml).
+#
+# Примеры:
+#   python3 catalog_cache.py --requests 5000 --listen 0.0.0.0:9218
+#   python3 catalog_cache.py --backend redis --redis-url redis://localhost:6379/0 --requests 5000
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bson import json_util
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from benchstats import Histogram, save_report
+from datagen import ZipfSampler
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lab5'))
+from promtext import render  # noqa: E402
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+CATALOG_TTL = 60
+CATALOG_MAX_ENTRIES = 1000
+PAGE_SIZE = 10
+WATCHED = ['events', 'reviews', 'venues', 'organizers']
+# Изменение этих полей может добавить мероприятие в выборку или убрать из нее
+MEMBERSHIP_FIELDS = {'status', 'date', 'categories', 'tags'}
+
+
+def catalog_pipeline(category=None, tag=None, page=0, page_size=PAGE_SIZE):
+    """Pipeline 1 из aggregations.js с фильтром и страницей.
+
+    Сортировка и $skip/$limit стоят до $lookup: отзывы, место и организатор
+    подтягиваются только для мероприятий страницы.
+    """
+    match = {"status": "published", "date": {"$gte": datetime.now()}}
+    if category:
+        match["categories"] = category
+    if tag:
+        match["tags"] = tag
+    return [
+        {"$match": match},
+        {"$sort": {"date": 1, "_id": 1}},
+        {"$skip": page * page_size},
+        {"$limit": page_size},
+        {"$lookup": {
+            "from": "reviews",
+            "localField": "_id",
+            "foreignField": "event_id",
+            "as": "reviews",
+            "pipeline": [{"$sort": {"created_at": -1}}, {"$limit": 5}],
+        }},
+        {"$lookup": {"from": "venues", "localField": "venue_id", "foreignField": "_id", "as": "venue"}},
+        {"$unwind": {"path": "$venue", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {"from": "organizers", "localField": "organizer_id", "foreignField": "_id",
+                     "as": "organizer"}},
+        {"$unwind": {"path": "$organizer", "preserveNullAndEmptyArrays": True}},
+        {"$project": {
+            "title": 1,
+            "description": 1,
+            "date": 1,
+            "categories": 1,
+            "tags": 1,
+            "available_seats": 1,
+            "venue_id": 1,
+            "organizer_id": 1,
+            "venue": {"name": "$venue.name", "address": "$venue.address"},
+            "organizer": {"name": "$organizer.name", "rating": "$organizer.rating"},
+            "ticket_types": 1,
+            "review_count": {"$size": "$reviews"},
+            "average_rating": {"$cond": {
+                "if": {"$gt": [{"$size": "$reviews"}, 0]},
+                "then": {"$avg": "$reviews.rating"},
+                "else": 0,
+            }},
+            "recent_reviews": {"$slice": ["$reviews", 3]},
+        }},
+    ]
+
+
+def cache_key(category, tag, page, page_size):
+    raw = json.dumps([category, tag, page, page_size])
+    return hashlib.sha1(raw.encode()).hexdigest()[:20]
+
+
+def page_dependencies(events):
+    """Объекты, изменение которых делает страницу устаревшей"""
+    deps = set()
+    for event in events:
+        deps.add(f"event:{event['_id']}")
+        if event.get("venue_id") is not None:
+            deps.add(f"venue:{event['venue_id']}")
+        if event.get("organizer_id") is not None:
+            deps.add(f"organizer:{event['organizer_id']}")
+    return deps
+
+
+class LruTtlCache:
+    """LRU в памяти процесса; запись живет не дольше ttl секунд"""
+
+    def __init__(self, max_entries=CATALOG_MAX_ENTRIES, ttl=CATALOG_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.key_deps = {}
+        self.dep_keys = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, deps):
+        with self.lock:
+            self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.key_deps[key] = deps
+            for dep in deps:
+                self.dep_keys.setdefault(dep, set()).add(key)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        if self.entries.pop(key, None) is None:
+            return False
+        for dep in self.key_deps.pop(key, ()):
+            keys = self.dep_keys.get(dep)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.dep_keys[dep]
+        return True
+
+    def invalidate(self, deps):
+        with self.lock:
+            keys = set().union(*(self.dep_keys.get(dep, ()) for dep in deps))
+            return sum(self._remove(key) for key in keys)
+
+    def clear(self):
+        with self.lock:
+            count = len(self.entries)
+            self.entries.clear()
+            self.key_deps.clear()
+            self.dep_keys.clear()
+            return count
+
+    def size(self):
+        return len(self.entries)
+
+
+class RedisCache:
+    """Redis-совместимый сервер; зависимости - множества ключей с тем же TTL"""
+
+    def __init__(self, url, ttl=CATALOG_TTL, prefix="catalog:"):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key):
+        raw = self.redis.get(self.prefix + key)
+        return None if raw is None else json_util.loads(raw)
+
+    def set(self, key, value, deps):
+        pipe = self.redis.pipeline()
+        pipe.set(self.prefix + key, json_util.dumps(value), ex=self.ttl)
+        for dep in deps:
+            pipe.sadd(f"{self.prefix}dep:{dep}", self.prefix + key)
+            pipe.expire(f"{self.prefix}dep:{dep}", self.ttl)
+        pipe.execute()
+
+    def invalidate(self, deps):
+        dep_keys = [f"{self.prefix}dep:{dep}" for dep in deps]
+        keys = self.redis.sunion(dep_keys) if dep_keys else set()
+        if not keys:
+            return 0
+        removed = self.redis.delete(*keys)
+        self.redis.delete(*dep_keys)
+        return removed
+
+    def clear(self):
+        keys = list(self.redis.scan_iter(match=self.prefix + "*", count=1000))
+        return self.redis.delete(*keys) if keys else 0
+
+    def size(self):
+        # Считать ключи Redis на каждый опрос метрик слишком дорого
+        return None
+
+
+class CatalogCache:
+    """Read-through страницы каталога со сбросом по change stream и метриками"""
+
+    def __init__(self, db, backend):
+        self.db = db
+        self.backend = backend
+        # Растет при каждом сбросе: результат запроса, начатого до сброса, не кладется в кэш
+        self.version = 0
+        self.requests = {"hit": 0, "miss": 0}
+        self.invalidations = {"targeted": 0, "full": 0}
+        self.invalidated_entries = 0
+        self.latency = {"cache": Histogram(), "database": Histogram()}
+        self.watcher_up = 0
+        self.lock = threading.Lock()
+        # Сравнение версии и запись в кэш атомарны относительно сброса
+        self.version_lock = threading.Lock()
+
+    def page(self, category=None, tag=None, page=0, page_size=PAGE_SIZE):
+        started = time.perf_counter()
+        key = cache_key(category, tag, page, page_size)
+        events = self.backend.get(key)
+        if events is not None:
+            self._record("hit", "cache", started)
+            return events
+        version = self.version
+        events = list(self.db.events.aggregate(catalog_pipeline(category, tag, page, page_size)))
+        with self.version_lock:
+            if version == self.version:
+                self.backend.set(key, events, page_dependencies(events))
+        self._record("miss", "database", started)
+        return events
+
+    def _record(self, result, source, started):
+        with self.lock:
+            self.requests[result] += 1
+            self.latency[source].add((time.perf_counter() - started) * 1000)
+
+    def invalidate(self, deps=None):
+        """Сброс записей с зависимостями deps; None - весь каталог"""
+        with self.version_lock:
+            self.version += 1
+        if deps is None:
+            removed = self.backend.clear()
+            scope = "full"
+        else:
+            removed = self.backend.invalidate(deps)
+            scope = "targeted"
+        with self.lock:
+            self.invalidations[scope] += 1
+            self.invalidated_entries += removed
+        return removed
+
+    def apply_change(self, change):
+        """Событие change stream -> зависимости для сброса (None - сбросить все)"""
+        operation = change["operationType"]
+        collection = change.get("ns", {}).get("coll")
+        document_id = change.get("documentKey", {}).get("_id")
+        document = change.get("fullDocument") or {}
+
+        deps = None
+        if collection == "events" and operation == "update":
+            description = change.get("updateDescription", {})
+            changed = set(description.get("updatedFields", {})) | set(description.get("removedFields", []))
+            if not {field.split(".")[0] for field in changed} & MEMBERSHIP_FIELDS:
+                deps = {f"event:{document_id}"}
+        elif collection == "reviews" and document.get("event_id") is not None:
+            deps = {f"event:{document['event_id']}"}
+        elif collection in ("venues", "organizers") and operation != "insert":
+            deps = {f"{collection[:-1]}:{document_id}"}
+        elif collection in ("venues", "organizers"):
+            # Новое место или организатор появится в каталоге только с новым мероприятием
+            return 0
+        return self.invalidate(deps)
+
+    def watch(self, stop=None):
+        """Цикл change stream; после обрыва кэш сбрасывается целиком - события могли потеряться"""
+        pipeline = [{"$match": {"ns.coll": {"$in": WATCHED}}}]
+        resume_token = None
+        while stop is None or not stop.is_set():
+            try:
+                with self.db.watch(pipeline, full_document="updateLookup", resume_after=resume_token,
+                                   max_await_time_ms=1000) as stream:
+                    self.watcher_up = 1
+                    while stream.alive and (stop is None or not stop.is_set()):
+                        change = stream.try_next()
+                        resume_token = stream.resume_token
+                        if change is not None:
+                            self.apply_change(change)
+            except PyMongoError as e:
+                self.watcher_up = 0
+                print(f"Change stream недоступен ({e}); кэш сброшен, повтор через 5 с")
+                self.invalidate()
+                resume_token = None
+                if stop is not None and stop.wait(5):
+                    break
+                if stop is None:
+                    time.sleep(5)
+        self.watcher_up = 0
+
+    def start_watcher(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=self.watch, args=(stop,), daemon=True)
+        thread.start()
+        return stop
+
+    def hit_ratio(self):
+        total = self.requests["hit"] + self.requests["miss"]
+        return self.requests["hit"] / total if total else 0.0
+
+    def samples(self):
+        with self.lock:
+            samples = [("catalog_cache_requests_total", "counter", "Catalog page requests",
+                        {"result": result}, count) for result, count in self.requests.items()]
+            samples.append(("catalog_cache_hit_ratio", "gauge", "Share of requests served from the cache", {},
+                            round(self.hit_ratio(), 6)))
+            samples += [("catalog_cache_invalidations_total", "counter", "Cache invalidations by scope",
+                         {"scope": scope}, count) for scope, count in self.invalidations.items()]
+            samples.append(("catalog_cache_invalidated_entries_total", "counter", "Entries removed by invalidations",
+                            {}, self.invalidated_entries))
+            for source, histogram in self.latency.items():
+                for quantile in (50, 95, 99):
+                    value = histogram.percentile(quantile)
+                    samples.append(("catalog_cache_latency_ms", "gauge", "Catalog page latency by source",
+                                    {"source": source, "quantile": quantile / 100},
+                                    None if value is None else round(value, 3)))
+        size = self.backend.size()
+        if size is not None:
+            samples.append(("catalog_cache_entries", "gauge", "Entries in the in-process cache", {}, size))
+        samples.append(("catalog_cache_watcher_up", "gauge", "Whether the change stream is open", {},
+                        self.watcher_up))
+        return samples
+
+
+def make_handler(cache):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render(cache.samples()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def browse(cache, args):
+    """Просмотр каталога: категории и страницы выбираются по Zipf, первые страницы - чаще"""
+    rng = random.Random(args.seed)
+    categories = sorted(cache.db.events.distinct("categories", {"status": "published"}))
+    category_sampler = ZipfSampler(max(len(categories), 1), args.skew)
+    page_sampler = ZipfSampler(args.pages, args.skew)
+    for number in range(args.requests):
+        category = categories[category_sampler.sample(rng)] if categories and rng.random() < 0.5 else None
+        cache.page(category=category, page=page_sampler.sample(rng), page_size=args.page_size)
+        if args.progress and (number + 1) % args.progress == 0:
+            print(f"  {number + 1} запросов, попаданий {cache.hit_ratio():.1%}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Read-through кэш каталога мероприятий")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--backend", choices=["lru", "redis"], default="lru")
+    parser.add_argument("--redis-url", default="redis://localhost:6379/0")
+    parser.add_argument("--ttl", type=int, default=CATALOG_TTL, help="время жизни записи, с")
+    parser.add_argument("--max-entries", type=int, default=CATALOG_MAX_ENTRIES, help="размер LRU")
+    parser.add_argument("--no-watch", action="store_true", help="не слушать change stream")
+    parser.add_argument("--requests", type=int, default=0, help="смоделировать N просмотров каталога")
+    parser.add_argument("--pages", type=int, default=20, help="число страниц в модели просмотра")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--skew", type=float, default=1.1, help="показатель Zipf для категорий и страниц")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--progress", type=int, default=1000, help="печатать прогресс каждые N запросов")
+    parser.add_argument("--listen", help="host:port для /metrics, например 0.0.0.0:9218")
+    parser.add_argument("--output", help="JSON-отчет о прогоне")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = MongoClient(args.uri)[DB_NAME]
+    if args.backend == "redis":
+        backend = RedisCache(args.redis_url, args.ttl)
+    else:
+        backend = LruTtlCache(args.max_entries, args.ttl)
+    cache = CatalogCache(db, backend)
+    if not args.no_watch:
+        cache.start_watcher()
+    if args.listen:
+        host, port = args.listen.rsplit(":", 1)
+        server = ThreadingHTTPServer((host, int(port)), make_handler(cache))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Метрики: http://{args.listen}/metrics")
+
+    if args.requests:
+        print(f"=== КЭШ КАТАЛОГА: {args.backend}, TTL {args.ttl} с, {args.requests} запросов ===")
+        browse(cache, args)
+        summary = {source: histogram.summary() for source, histogram in cache.latency.items()}
+        print(f"Попаданий: {cache.requests['hit']}, промахов: {cache.requests['miss']} "
+              f"({cache.hit_ratio():.1%})")
+        for source, stats in summary.items():
+            if stats["count"]:
+                print(f"  {source:<9} p50 {stats['p50_ms']} мс, p95 {stats['p95_ms']} мс, p99 {stats['p99_ms']} мс")
+        print(f"Сбросов: {cache.invalidations}, удалено записей: {cache.invalidated_entries}")
+        if args.output:
+            save_report(args.output, {
+                "meta": {"backend": args.backend, "ttl": args.ttl, "requests": args.requests,
+                         "pages": args.pages, "page_size": args.page_size, "skew": args.skew,
+                         "started_at": datetime.now().isoformat(timespec="seconds")},
+                "requests": cache.requests,
+                "hit_ratio": round(cache.hit_ratio(), 4),
+                "invalidations": cache.invalidations,
+                "latency": summary,
+            })
+            print(f"Отчет: {args.output}")
+
+    if args.listen:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -83,8 +83,11 @@ db.createCollection("users", {
                bsonType: "array",
                items: { bsonType: "objectId" }
             },
+            // Только последние просмотры (user_activity.py, VIEW_HISTORY_LIMIT);
+            // полный лог - в user_activity_logs
             view_history: {
                bsonType: "array",
+               maxItems: 10,
                items: {
                   bsonType: "object",
                   properties: {
@@ -115,6 +118,7 @@ db.createCollection("bookings", {
             seats: { bsonType: "array", items: { bsonType: "string" } },
             created_at: { bsonType: "date" },
             updated_at: { bsonType: "date" },
+            written_at: { bsonType: "date" },
             cancelled_at: { bsonType: "date" }
          }
       }
@@ -189,27 +193,43 @@ db.createCollection("organizers", {
    }
 });
 
+// Лог активности: time-series коллекция, сырые записи живут 90 дней (TTL).
+// Почасовые и дневные свертки строит user_activity.py --rollup
 db.createCollection("user_activity_logs", {
    timeseries: {
       timeField: "timestamp",
-      metaField: "user_id",
+      metaField: "meta",
       granularity: "hours"
    },
+   expireAfterSeconds: 90 * 24 * 3600,
    validator: {
       $jsonSchema: {
          bsonType: "object",
-         required: ["user_id", "action", "timestamp"],
+         required: ["meta", "action", "timestamp"],
          properties: {
-            user_id: { bsonType: "objectId" },
+            meta: {
+               bsonType: "object",
+               required: ["user_id"],
+               properties: {
+                  user_id: { bsonType: "objectId" },
+                  event_id: { bsonType: "objectId" }
+               }
+            },
             action: { bsonType: "string" },
-            entity_type: { bsonType: "string", enum: ["event", "booking", "review"] },
-            entity_id: { bsonType: "objectId" },
             details: { bsonType: "object" },
             timestamp: { bsonType: "date" },
+            written_at: { bsonType: "date" },
             ip_address: { bsonType: "string" }
          }
       }
    }
 });
 
+db.user_activity_logs.createIndex({ "meta.user_id": 1, timestamp: -1 });
+db.user_activity_logs.createIndex({ "meta.event_id": 1, timestamp: -1 });
+db.user_activity_logs.createIndex({ written_at: 1 });
+db.user_activity_hourly.createIndex({ event_id: 1, hour: -1 });
+db.user_activity_hourly.createIndex({ hour: 1 }, { expireAfterSeconds: 365 * 24 * 3600 });
+db.user_activity_daily.createIndex({ user_id: 1, day: -1 });
+
 console.log("Коллекции созданы успешно!");
@@ -11,6 +11,8 @@ try {
     db.bookings.createIndex({ "user_id": 1 });
     db.bookings.createIndex({ "event_id": 1 });
     db.bookings.createIndex({ "status": 1 });
+    // keyset-пагинация истории бронирований (booking_history.py)
+    db.bookings.createIndex({ "user_id": 1, "created_at": -1, "_id": -1 });
 
     db.reviews.createIndex({ "event_id": 1 });
     db.reviews.createIndex({ "user_id": 1 });
@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+# datagen.py - Общая спецификация синтетических данных для MongoDB и PostgreSQL
+#
+# Данные полностью определяются --seed, --scale и --anchor (по умолчанию -
+# начало текущих суток, чтобы мероприятия были впереди, а просмотры - в сроке
+# TTL; для того же набора в другой день --anchor нужно указать явно): каждый блок записей
+# генерируется своим random.Random, засеянным (seed, тип, номер блока), поэтому
+# результат не зависит ни от размера чанка, ни от числа воркеров. Популярность
+# мероприятий и активность пользователей распределены по Zipf. Значения Faker
+# считаются один раз в пулы, документы собираются из пулов.
+#
+# Одна и та же спецификация выдает документы MongoDB (generate_data.py) и
+# строки для COPY в схему lab2/01_database_setup.sql:
+#   python3 datagen.py --seed 42 --scale 10 --csv-dir /tmp/event_booking_csv
+import argparse
+import bisect
+import csv
+import itertools
+import os
+import random
+import struct
+from array import array
+from datetime import datetime, timedelta
+
+from faker import Faker
+
+BASE_SIZES = {
+    "organizers": 10,
+    "venues": 15,
+    "users": 200,
+    "events": 100,
+    "bookings": 300,
+    "reviews": 150,
+}
+
+# Записи одного блока генерируются одним RNG
+RNG_BLOCK = 1000
+POOL_SIZE = 1000
+
+# Бронирования создаются за последние BOOKING_DAYS дней до anchor
+BOOKING_DAYS = 60
+
+CATEGORIES = ["концерт", "театр", "спорт", "выставка"]
+EVENT_CATEGORIES = ["концерт", "театр", "спорт", "выставка", "фестиваль"]
+TAGS = ["популярное", "новинка", "рекомендуем"]
+EVENT_KINDS = ["Концерт", "Спектакль", "Матч", "Выставка"]
+VENUE_NAMES = [
+    "Кремлевский дворец", "Стадион Лужники",
+    "Театр им. Вахтангова", "Концертный зал Чайковского"
+]
+CITIES = ["Москва", "Санкт-Петербург", "Казань", "Екатеринбург", "Новосибирск"]
+SECTIONS = [("Партер", 20, 25), ("Балкон", 15, 20)]
+SEATS_PER_VENUE = sum(rows * per_row for _, rows, per_row in SECTIONS)
+
+# Справочники из lab2/01_database_setup.sql
+TICKET_TYPE_IDS = {"Standard": 1, "VIP": 2, "Student": 3}
+BOOKING_STATUS_IDS = {"pending": 1, "confirmed": 2, "cancelled": 3, "refunded": 4}
+PAYMENT_METHOD_IDS = {"cash": 1, "card": 2, "online": 3}
+TRANSACTION_STATUSES = {
+    "pending": "pending", "confirmed": "completed",
+    "cancelled": "failed", "refunded": "refunded"
+}
+BOOKING_STATUSES = ["confirmed"] * 14 + ["pending"] * 2 + ["cancelled"] * 3 + ["refunded"]
+
+# Типы документов в детерминированных ObjectId
+OID_KINDS = {"organizers": 1, "venues": 2, "events": 3, "users": 4, "bookings": 5, "reviews": 6}
+
+# Колонки COPY для таблиц lab2/01_database_setup.sql, в порядке загрузки
+PG_COLUMNS = {
+    "organizers": ("organizer_id", "name", "contact_email", "phone", "description"),
+    "venues": ("venue_id", "name", "address", "capacity", "city"),
+    "seats": ("seat_id", "venue_id", "seat_row", "seat_number", "section"),
+    "users": ("user_id", "email", "first_name", "last_name", "phone", "created_at"),
+    "events": ("event_id", "title", "description", "event_date", "venue_id",
+               "organizer_id", "base_price", "created_at"),
+    "bookings": ("booking_id", "user_id", "event_id", "seat_id", "ticket_type_id",
+                 "status_id", "booking_date", "quantity", "total_amount"),
+    "transactions": ("transaction_id", "booking_id", "amount", "method_id",
+                     "status", "transaction_time"),
+    "reviews": ("review_id", "event_id", "user_id", "rating", "comment", "created_at"),
+}
+
+# Копия ключа секционирования родителя после lab2/09_partitioning.sql:
+# таблица -> (колонка, поле записи)
+PG_CARRIED_COLUMNS = {"transactions": ("booking_date", "created_at")}
+
+
+def parse_scale(text, base=BASE_SIZES):
+    """Разбор --scale: общий множитель ("10") и/или поименные ("users=5,bookings=100")"""
+    multipliers = dict.fromkeys(base, 1.0)
+    for part in filter(None, (p.strip() for p in str(text).split(","))):
+        if "=" not in part:
+            multipliers = dict.fromkeys(base, float(part))
+            continue
+        name, value = part.split("=", 1)
+        if name not in base:
+            raise ValueError(f"неизвестная сущность в --scale: {name}")
+        multipliers[name] = float(value)
+    return {name: max(1, round(base[name] * multipliers[name])) for name in base}
+
+
+class ZipfSampler:
+    """Выбор индекса 0..n-1 с вероятностью ~ 1 / (rank + 1) ** skew; skew = 0 - равномерно"""
+
+    def __init__(self, n, skew):
+        self.n = n
+        self.skew = skew
+        self.cumulative = None
+        if skew > 0:
+            weights = (1.0 / k ** skew for k in range(1, n + 1))
+            self.cumulative = array("d", itertools.accumulate(weights))
+
+    def sample(self, rng):
+        if self.cumulative is None:
+            return rng.randrange(self.n)
+        index = bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+        return min(index, self.n - 1)
+
+
+class FakerPools:
+    """Значения Faker, посчитанные один раз; документы выбирают из пулов"""
+
+    def __init__(self, seed, size=POOL_SIZE):
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(size)]
+        self.last_names = [fake.last_name() for _ in range(size)]
+        self.logins = [fake.user_name() for _ in range(size)]
+        self.domains = [fake.free_email_domain() for _ in range(20)]
+        self.phones = [fake.phone_number()[:20] for _ in range(size)]
+        self.companies = [fake.company() for _ in range(size)]
+        self.addresses = [fake.address() for _ in range(size)]
+        self.words = [fake.word().capitalize() for _ in range(size)]
+        self.short_texts = [fake.text(max_nb_chars=200) for _ in range(size)]
+        self.long_texts = [fake.text(max_nb_chars=500) for _ in range(size)]
+
+
+class DataSpec:
+    """Детерминированная спецификация набора данных"""
+
+    def __init__(self, seed=42, scale="1", event_skew=1.1, user_skew=0.8, anchor=None):
+        self.seed = seed
+        self.sizes = parse_scale(scale)
+        # Все даты и время в ObjectId отсчитываются от anchor; по умолчанию - начало
+        # текущих суток. Даты и _id (по ним lab2 и MongoDB сопоставляют записи)
+        # повторяются в другой день только с тем же явным anchor
+        self.anchor = anchor or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.pools = FakerPools(seed)
+        self.event_sampler = ZipfSampler(self.sizes["events"], event_skew)
+        self.user_sampler = ZipfSampler(self.sizes["users"], user_skew)
+        self._oid_ts = int(self.anchor.timestamp()) & 0xFFFFFFFF
+        self._organizers = None
+        self._venues = None
+        self._events = None
+
+    def rng(self, kind, block):
+        return random.Random(f"{self.seed}:{kind}:{block}")
+
+    def date_between(self, rng, start_days, end_days):
+        return self.anchor + timedelta(days=rng.uniform(start_days, end_days))
+
+    def object_id(self, kind, number):
+        """ObjectId документа по его номеру: одинаковый при повторных запусках"""
+        # bson нужен только для MongoDB; выгрузка в PostgreSQL работает без pymongo
+        from bson import ObjectId
+        prefix = struct.pack(">IB", self._oid_ts, OID_KINDS[kind])
+        return ObjectId(prefix + number.to_bytes(7, "big"))
+
+    def iter_records(self, kind, start=0, size=None):
+        """Записи kind с номерами start+1 .. start+size"""
+        make = getattr(self, "_make_" + kind.rstrip("s"))
+        end = self.sizes[kind] if size is None else min(self.sizes[kind], start + size)
+        block_start = start - start % RNG_BLOCK
+        rng = None
+        for index in range(block_start, end):
+            if index % RNG_BLOCK == 0:
+                rng = self.rng(kind, index // RNG_BLOCK)
+            record = make(rng, index + 1)
+            if index >= start:
+                yield record
+
+    @property
+    def organizers(self):
+        if self._organizers is None:
+            self._organizers = list(self.iter_records("organizers"))
+        return self._organizers
+
+    @property
+    def venues(self):
+        if self._venues is None:
+            self._venues = list(self.iter_records("venues"))
+        return self._venues
+
+    @property
+    def events(self):
+        if self._events is None:
+            self._events = list(self.iter_records("events"))
+        return self._events
+
+    def pick_event(self, rng):
+        return self.events[self.event_sampler.sample(rng)]
+
+    def pick_user_id(self, rng):
+        return self.user_sampler.sample(rng) + 1
+
+    def _make_organizer(self, rng, number):
+        pools = self.pools
+        return {
+            "id": number,
+            "name": rng.choice(pools.companies),
+            "email": f"{rng.choice(pools.logins)}{number}@{rng.choice(pools.domains)}",
+            "phone": rng.choice(pools.phones),
+            "description": rng.choice(pools.short_texts),
+            "rating": round(rng.uniform(3.5, 5.0), 1),
+            "total_events": rng.randint(1, 50),
+        }
+
+    def _make_venue(self, rng, number):
+        return {
+            "id": number,
+            "name": rng.choice(VENUE_NAMES),
+            "city": rng.choice(CITIES),
+            "address": rng.choice(self.pools.addresses),
+            "capacity": rng.choice([100, 500, 1000, 5000]),
+            "coordinates": [round(rng.uniform(37.0, 38.0), 6), round(rng.uniform(55.0, 56.0), 6)],
+            "first_seat_id": (number - 1) * SEATS_PER_VENUE + 1,
+        }
+
+    def _make_event(self, rng, number):
+        capacity = rng.choice([100, 200, 500, 1000])
+        return {
+            "id": number,
+            "title": f"{rng.choice(EVENT_KINDS)} {rng.choice(self.pools.words)}",
+            "description": rng.choice(self.pools.long_texts),
+            "date": self.date_between(rng, 1, 90),
+            "venue_id": rng.randint(1, self.sizes["venues"]),
+            "organizer_id": rng.randint(1, self.sizes["organizers"]),
+            "categories": rng.sample(EVENT_CATEGORIES, k=rng.randint(1, 3)),
+            "tags": rng.sample(TAGS, k=rng.randint(1, 2)),
+            "ticket_types": [
+                {"type": "VIP", "price": rng.randint(5000, 20000), "quantity": rng.randint(10, 50)},
+                {"type": "Standard", "price": rng.randint(1000, 5000), "quantity": rng.randint(100, 500)},
+                {"type": "Student", "price": rng.randint(500, 2000), "quantity": rng.randint(50, 200)},
+            ],
+            "status": rng.choice(["draft", "published", "published", "published"]),
+            "capacity": capacity,
+            "created_at": self.date_between(rng, -30, 0),
+        }
+
+    def _make_user(self, rng, number):
+        pools = self.pools
+        viewed = {}
+        for _ in range(rng.randint(5, 20)):
+            event = self.pick_event(rng)
+            viewed[event["id"]] = self.date_between(rng, -30, 0)
+        view_history = list(viewed.items())
+        favorites = [event_id for event_id, _ in
+                     rng.sample(view_history, k=min(len(view_history), rng.randint(2, 5)))]
+        return {
+            "id": number,
+            "first_name": rng.choice(pools.first_names),
+            "last_name": rng.choice(pools.last_names),
+            "email": f"{rng.choice(pools.logins)}{number}@{rng.choice(pools.domains)}",
+            "phone": rng.choice(pools.phones),
+            "categories": rng.sample(CATEGORIES, k=rng.randint(1, 3)),
+            "notifications": rng.random() < 0.5,
+            "view_history": view_history,
+            "favorites": favorites,
+            "created_at": self.date_between(rng, -730, 0),
+        }
+
+    def _make_booking(self, rng, number):
+        event = self.pick_event(rng)
+        ticket_type = rng.choice(event["ticket_types"])
+        quantity = rng.randint(1, 4)
+        seat_index = rng.randrange(SEATS_PER_VENUE - quantity)
+        first_seat_id = self.venues[event["venue_id"] - 1]["first_seat_id"]
+        return {
+            "id": number,
+            "user_id": self.pick_user_id(rng),
+            "event_id": event["id"],
+            "event_title": event["title"],
+            "ticket_type": ticket_type["type"],
+            "quantity": quantity,
+            "total_amount": ticket_type["price"] * quantity,
+            "status": rng.choice(BOOKING_STATUSES),
+            "payment_method": rng.choice(list(PAYMENT_METHOD_IDS)),
+            "seat_id": first_seat_id + seat_index,
+            "seats": [seat_label(seat_index + k) for k in range(quantity)],
+            "created_at": self.date_between(rng, -BOOKING_DAYS, 0),
+        }
+
+    def _make_review(self, rng, number):
+        return {
+            "id": number,
+            "event_id": self.pick_event(rng)["id"],
+            "user_id": self.pick_user_id(rng),
+            "rating": rng.randint(1, 5),
+            "comment": rng.choice(self.pools.short_texts),
+            "created_at": self.date_between(rng, -60, 0),
+            "helpful_count": rng.randint(0, 50),
+        }
+
+    # Документы MongoDB
+
+    def mongo_organizer(self, rec):
+        return {
+            "_id": self.object_id("organizers", rec["id"]),
+            "name": rec["name"],
+            "email": rec["email"],
+            "phone": rec["phone"],
+            "description": rec["description"],
+            "rating": rec["rating"],
+            "total_events": rec["total_events"],
+        }
+
+    def mongo_venue(self, rec):
+        return {
+            "_id": self.object_id("venues", rec["id"]),
+            "name": rec["name"],
+            "location": {"type": "Point", "coordinates": rec["coordinates"]},
+            "address": rec["address"],
+            "capacity": rec["capacity"],
+            "sections": [
+                {"name": name, "rows": rows, "seats_per_row": per_row}
+                for name, rows, per_row in SECTIONS
+            ],
+        }
+
+    def mongo_event(self, rec):
+        return {
+            "_id": self.object_id("events", rec["id"]),
+            "title": rec["title"],
+            "description": rec["description"],
+            "date": rec["date"],
+            "venue_id": self.object_id("venues", rec["venue_id"]),
+            "organizer_id": self.object_id("organizers", rec["organizer_id"]),
+            "categories": rec["categories"],
+            "tags": rec["tags"],
+            "ticket_types": [dict(t, sold=0) for t in rec["ticket_types"]],
+            "status": rec["status"],
+            "capacity": rec["capacity"],
+            "available_seats": rec["capacity"],
+            "created_at": rec["created_at"],
+            "updated_at": self.anchor,
+        }
+
+    def mongo_user(self, rec):
+        return {
+            "_id": self.object_id("users", rec["id"]),
+            "email": rec["email"],
+            "name": f"{rec['first_name']} {rec['last_name']}",
+            "phone": rec["phone"],
+            "preferences": {
+                "categories": rec["categories"],
+                "notifications": rec["notifications"],
+            },
+            "stats": {
+                "total_bookings": 0,
+                "total_spent": 0.0,
+                "last_booking_date": None,
+            },
+            "booking_history": [],
+            "favorites": [self.object_id("events", event_id) for event_id in rec["favorites"]],
+            "view_history": [
+                {"event_id": self.object_id("events", event_id), "viewed_at": viewed_at}
+                for event_id, viewed_at in rec["view_history"]
+            ],
+            "created_at": rec["created_at"],
+            "updated_at": self.anchor,
+        }
+
+    def mongo_booking(self, rec):
+        return {
+            "_id": self.object_id("bookings", rec["id"]),
+            "user_id": self.object_id("users", rec["user_id"]),
+            "event_id": self.object_id("events", rec["event_id"]),
+            "ticket_type": rec["ticket_type"],
+            "quantity": rec["quantity"],
+            "total_amount": rec["total_amount"],
+            "status": rec["status"],
+            "payment_method": rec["payment_method"],
+            "transaction_id": f"TXN{rec['id']:09d}",
+            "seats": rec["seats"],
+            "created_at": rec["created_at"],
+            "updated_at": rec["created_at"],
+        }
+
+    def mongo_review(self, rec):
+        return {
+            "_id": self.object_id("reviews", rec["id"]),
+            "event_id": self.object_id("events", rec["event_id"]),
+            "user_id": self.object_id("users", rec["user_id"]),
+            "rating": rec["rating"],
+            "comment": rec["comment"],
+            "created_at": rec["created_at"],
+            "helpful_count": rec["helpful_count"],
+        }
+
+    # Строки PostgreSQL в порядке колонок PG_COLUMNS
+
+    def pg_rows(self, table, start=0, size=None, carried=False):
+        """Строки таблицы lab2 для записей start+1 .. start+size;
+        carried=True добавляет колонку из PG_CARRIED_COLUMNS"""
+        if table == "seats":
+            yield from self._pg_seats(start, size)
+            return
+        kind = "bookings" if table == "transactions" else table
+        make = getattr(self, "_pg_" + table.rstrip("s"))
+        carry = PG_CARRIED_COLUMNS.get(table) if carried else None
+        for rec in self.iter_records(kind, start, size):
+            yield make(rec) + (rec[carry[1]],) if carry else make(rec)
+
+    def _pg_organizer(self, rec):
+        return (rec["id"], rec["name"], rec["email"], rec["phone"], rec["description"])
+
+    def _pg_venue(self, rec):
+        return (rec["id"], rec["name"], rec["address"], rec["capacity"], rec["city"])
+
+    def _pg_seats(self, start=0, size=None):
+        total = self.sizes["venues"] * SEATS_PER_VENUE
+        end = total if size is None else min(total, start + size)
+        for index in range(start, end):
+            venue_id, seat_index = divmod(index, SEATS_PER_VENUE)
+            section, row, seat_number = seat_position(seat_index)
+            yield (index + 1, venue_id + 1, row, seat_number, section)
+
+    def _pg_user(self, rec):
+        return (rec["id"], rec["email"], rec["first_name"], rec["last_name"],
+                rec["phone"], rec["created_at"])
+
+    def _pg_event(self, rec):
+        base_price = next(t["price"] for t in rec["ticket_types"] if t["type"] == "Standard")
+        return (rec["id"], rec["title"], rec["description"], rec["date"], rec["venue_id"],
+                rec["organizer_id"], base_price, rec["created_at"])
+
+    def _pg_booking(self, rec):
+        return (rec["id"], rec["user_id"], rec["event_id"], rec["seat_id"],
+                TICKET_TYPE_IDS[rec["ticket_type"]], BOOKING_STATUS_IDS[rec["status"]],
+                rec["created_at"], rec["quantity"], rec["total_amount"])
+
+    def _pg_transaction(self, rec):
+        # Одна транзакция на бронирование, transaction_id совпадает с booking_id
+        return (rec["id"], rec["id"], rec["total_amount"], PAYMENT_METHOD_IDS[rec["payment_method"]],
+                TRANSACTION_STATUSES[rec["status"]], rec["created_at"] + timedelta(hours=1))
+
+    def _pg_review(self, rec):
+        return (rec["id"], rec["event_id"], rec["user_id"], rec["rating"],
+                rec["comment"], rec["created_at"])
+
+    def pg_date_range(self):
+        """Границы booking_date и transaction_time в строках PostgreSQL"""
+        return self.anchor - timedelta(days=BOOKING_DAYS), self.anchor + timedelta(hours=1)
+
+    def pg_row_count(self, table):
+        if table == "seats":
+            return self.sizes["venues"] * SEATS_PER_VENUE
+        if table == "transactions":
+            return self.sizes["bookings"]
+        return self.sizes[table]
+
+
+def seat_position(seat_index):
+    """Секция, ряд и номер места по его номеру внутри площадки"""
+    for section, rows, per_row in SECTIONS:
+        if seat_index < rows * per_row:
+            row, number = divmod(seat_index, per_row)
+            return section, chr(ord('A') + row), number + 1
+        seat_index -= rows * per_row
+    raise ValueError("номер места вне площадки")
+
+
+def seat_label(seat_index):
+    _, row, number = seat_position(seat_index)
+    return f"{row}{number}"
+
+
+def write_csv(spec, out_dir):
+    """Выгрузка всех таблиц в CSV с заголовком для COPY ... WITH (FORMAT csv, HEADER)"""
+    os.makedirs(out_dir, exist_ok=True)
+    for table, columns in PG_COLUMNS.items():
+        path = os.path.join(out_dir, f"{table}.csv")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(spec.pg_rows(table))
+        print(f"{table}: {spec.pg_row_count(table)} строк -> {path}")
+        print(f"  \\copy {table} ({', '.join(columns)}) FROM '{path}' WITH (FORMAT csv, HEADER)")
+
+
+def add_spec_arguments(parser):
+    """Общие параметры спецификации для скриптов генерации и загрузки"""
+    parser.add_argument("--seed", type=int, default=42,
+                        help="зерно генератора: одинаковое зерно дает одинаковые данные")
+    parser.add_argument("--scale", default="1",
+                        help="множитель объема: '10' или 'users=5,events=2,bookings=100'")
+    parser.add_argument("--event-skew", type=float, default=1.1,
+                        help="показатель Zipf для популярности мероприятий (0 - равномерно)")
+    parser.add_argument("--user-skew", type=float, default=0.8,
+                        help="показатель Zipf для активности пользователей (0 - равномерно)")
+    parser.add_argument("--anchor", type=datetime.fromisoformat, default=None,
+                        help="дата, от которой отсчитываются все даты (по умолчанию - сегодня; "
+                             "для повторения набора в другой день укажите ту же дату)")
+
+
+def spec_from_args(args):
+    return DataSpec(seed=args.seed, scale=args.scale, event_skew=args.event_skew,
+                    user_skew=args.user_skew, anchor=args.anchor)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Выгрузка синтетических данных в CSV для PostgreSQL")
+    add_spec_arguments(parser)
+    parser.add_argument("--csv-dir", default="event_booking_csv")
+    args = parser.parse_args()
+    write_csv(spec_from_args(args), args.csv_dir)
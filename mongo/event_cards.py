@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# event_cards.py - Витрина event_cards: карточки мероприятий без $lookup при чтении
+#
+# Карточка - документ events с уже подставленными данными: место проведения
+# (название, адрес, координаты), организатор (название, рейтинг), агрегаты
+# отзывов (число, средняя оценка), последние TOP_REVIEWS отзывов с обрезанным
+# текстом и продажи (подтвержденные бронирования, билеты, выручка). Описание
+# хранится дважды: description - превью PREVIEW_CHARS символов для показа,
+# search_text - полный текст для индекса cards_text (в выдачу не попадает). Каталог
+# (Pipeline 1) и отчет по мероприятиям (Pipeline 5) в aggregations.js читают
+# карточки одним find по индексу.
+#
+# Карточка всегда пересчитывается из источников целиком (build_pipeline), а не
+# дельтами, поэтому повторная обработка события безопасна:
+#   --rebuild  - полная перестройка во временную коллекцию и атомарная замена
+#                (renameCollection с dropTarget);
+#   --run      - проектор: change stream по events, venues, organizers, reviews
+#                и bookings, затронутые мероприятия пересчитываются пачками;
+#                resume token сохраняется в dashboard_state после каждой пачки,
+#                после перезапуска проектор продолжает с него. Удаления
+#                отзывов и бронирований определяются по pre-image
+#                (changeStreamPreAndPostImages, MongoDB 6.0+);
+#   --check    - сверка случайной выборки карточек с пересчетом из источников
+#                и поиск мероприятий без карточек; --fix пересчитывает расхождения.
+#
+# Примеры:
+#   python3 event_cards.py --rebuild
+#   python3 event_cards.py --run --batch-ms 500
+#   python3 event_cards.py --check --sample 500 --fix
+import argparse
+import time
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT, MongoClient
+from pymongo.errors import OperationFailure
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+CARDS = 'event_cards'
+BUILD = 'event_cards_build'
+STATE = 'dashboard_state'
+STATE_ID = 'event_cards'
+WATCHED = ['events', 'venues', 'organizers', 'reviews', 'bookings']
+
+TOP_REVIEWS = 3
+PREVIEW_CHARS = 200
+EXCERPT_CHARS = 160
+# Код ChangeStreamHistoryLost: resume token уже вытеснен из oplog
+HISTORY_LOST = 286
+# IndexOptionsConflict / IndexKeySpecsConflict: индекс с тем же именем, но другим определением
+INDEX_CONFLICTS = (85, 86)
+
+CARD_INDEXES = [
+    [("status", ASCENDING), ("date", ASCENDING), ("_id", ASCENDING)],
+    [("categories", ASCENDING), ("status", ASCENDING), ("date", ASCENDING)],
+    [("tags", ASCENDING), ("status", ASCENDING), ("date", ASCENDING)],
+    [("sales.revenue", DESCENDING)],
+    [("venue_id", ASCENDING)],
+    [("organizer_id", ASCENDING)],
+]
+# Индексы поиска (event_search.py); живут на карточках, поэтому создаются и при перестройке
+SEARCH_INDEXES = [
+    ([("title", TEXT), ("categories", TEXT), ("tags", TEXT), ("search_text", TEXT)],
+     {"name": "cards_text", "default_language": "russian",
+      "weights": {"title": 10, "categories": 5, "tags": 5, "search_text": 1}}),
+    ([("venue.location", GEOSPHERE), ("date", ASCENDING)], {"name": "cards_geo_date"}),
+]
+
+
+def build_pipeline(match=None):
+    """Карточки мероприятий из источников; match ограничивает пересчет"""
+    pipeline = [{"$match": match}] if match else []
+    pipeline += [
+        {"$lookup": {"from": "venues", "localField": "venue_id", "foreignField": "_id", "as": "venue"}},
+        {"$unwind": {"path": "$venue", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {"from": "organizers", "localField": "organizer_id", "foreignField": "_id",
+                     "as": "organizer"}},
+        {"$unwind": {"path": "$organizer", "preserveNullAndEmptyArrays": True}},
+        {"$lookup": {
+            "from": "reviews",
+            "localField": "_id",
+            "foreignField": "event_id",
+            "as": "review_stats",
+            "pipeline": [{"$group": {"_id": None, "count": {"$sum": 1}, "average": {"$avg": "$rating"}}}],
+        }},
+        {"$lookup": {
+            "from": "reviews",
+            "localField": "_id",
+            "foreignField": "event_id",
+            "as": "top_reviews",
+            "pipeline": [
+                {"$sort": {"created_at": -1, "_id": -1}},
+                {"$limit": TOP_REVIEWS},
+                {"$project": {
+                    "user_id": 1,
+                    "rating": 1,
+                    "created_at": 1,
+                    "excerpt": {"$substrCP": [{"$ifNull": ["$comment", ""]}, 0, EXCERPT_CHARS]},
+                }},
+            ],
+        }},
+        {"$lookup": {
+            "from": "bookings",
+            "localField": "_id",
+            "foreignField": "event_id",
+            "as": "sales",
+            "pipeline": [
+                {"$match": {"status": "confirmed"}},
+                {"$group": {"_id": None, "bookings": {"$sum": 1}, "tickets_sold": {"$sum": "$quantity"},
+                            "revenue": {"$sum": "$total_amount"}}},
+            ],
+        }},
+        {"$set": {
+            "review_stats": {"$ifNull": [{"$first": "$review_stats"}, {"count": 0, "average": None}]},
+            "sales": {"$ifNull": [{"$first": "$sales"}, {"bookings": 0, "tickets_sold": 0, "revenue": 0}]},
+        }},
+        {"$project": {
+            "title": 1,
+            "description": {"$substrCP": [{"$ifNull": ["$description", ""]}, 0, PREVIEW_CHARS]},
+            "search_text": {"$ifNull": ["$description", ""]},
+            "date": 1,
+            "status": 1,
+            "categories": 1,
+            "tags": 1,
+            "ticket_types": 1,
+            "capacity": 1,
+            "available_seats": 1,
+            "venue_id": 1,
+            "organizer_id": 1,
+            "venue": {"name": "$venue.name", "address": "$venue.address", "location": "$venue.location"},
+            "organizer": {"name": "$organizer.name", "rating": "$organizer.rating"},
+            "reviews": {
+                "count": "$review_stats.count",
+                "average_rating": {"$round": [{"$ifNull": ["$review_stats.average", 0]}, 2]},
+            },
+            "top_reviews": 1,
+            "sales": {"bookings": "$sales.bookings", "tickets_sold": "$sales.tickets_sold",
+                      "revenue": "$sales.revenue"},
+            "occupancy_rate": {"$cond": [
+                {"$gt": [{"$ifNull": ["$capacity", 0]}, 0]},
+                {"$round": [{"$multiply": [{"$divide": ["$sales.tickets_sold", "$capacity"]}, 100]}, 1]},
+                0,
+            ]},
+        }},
+    ]
+    return pipeline
+
+
+def merge_stage(into):
+    return [
+        {"$set": {"projected_at": "$$NOW"}},
+        {"$merge": {"into": into, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+
+
+def ensure_indexes(collection):
+    for keys in CARD_INDEXES:
+        collection.create_index(keys)
+    for keys, options in SEARCH_INDEXES:
+        try:
+            collection.create_index(keys, **options)
+        except OperationFailure as e:
+            # Определение индекса изменилось (раньше cards_text покрывал превью description)
+            if e.code not in INDEX_CONFLICTS:
+                raise
+            collection.drop_index(options["name"])
+            collection.create_index(keys, **options)
+
+
+def enable_pre_images(db):
+    """Pre-image нужен, чтобы по удаленному отзыву или бронированию узнать мероприятие"""
+    for name in ("reviews", "bookings"):
+        try:
+            db.command("collMod", name, changeStreamPreAndPostImages={"enabled": True})
+        except OperationFailure as e:
+            print(f"  {name}: pre-image недоступен ({e.details.get('errmsg', e)}); "
+                  f"удаления находит только --check")
+
+
+def rebuild(db):
+    """Полная перестройка: временная коллекция, индексы, атомарная замена"""
+    started = time.perf_counter()
+    db.drop_collection(BUILD)
+    db.events.aggregate(build_pipeline() + merge_stage(BUILD), allowDiskUse=True)
+    ensure_indexes(db[BUILD])
+    count = db[BUILD].estimated_document_count()
+    if count:
+        db.client.admin.command("renameCollection", f"{db.name}.{BUILD}", to=f"{db.name}.{CARDS}",
+                                dropTarget=True)
+    else:
+        db.drop_collection(BUILD)
+        db[CARDS].delete_many({})
+        ensure_indexes(db[CARDS])
+    print(f"✓ {CARDS}: перестроено {count} карточек ({time.perf_counter() - started:.1f} с)")
+    return count
+
+
+def project(db, event_ids):
+    """Пересчет карточек мероприятий event_ids; карточки удаленных мероприятий удаляются"""
+    event_ids = list(event_ids)
+    db.events.aggregate(build_pipeline({"_id": {"$in": event_ids}}) + merge_stage(CARDS))
+    existing = set(db.events.distinct("_id", {"_id": {"$in": event_ids}}))
+    removed = [event_id for event_id in event_ids if event_id not in existing]
+    if removed:
+        db[CARDS].delete_many({"_id": {"$in": removed}})
+    return len(event_ids)
+
+
+def affected_events(db, change):
+    """Мероприятия, чьи карточки устарели после события change stream"""
+    collection = change.get("ns", {}).get("coll")
+    document_id = change.get("documentKey", {}).get("_id")
+    document = change.get("fullDocument") or change.get("fullDocumentBeforeChange") or {}
+    if collection == "events":
+        return {document_id}
+    if collection in ("reviews", "bookings"):
+        if document.get("event_id") is None:
+            print(f"  {collection} {document_id}: мероприятие неизвестно (нет pre-image), нужен --check")
+            return set()
+        return {document["event_id"]}
+    if collection in ("venues", "organizers"):
+        field = "venue_id" if collection == "venues" else "organizer_id"
+        return {event["_id"] for event in db.events.find({field: document_id}, {"_id": 1})}
+    return set()
+
+
+def save_token(db, token):
+    db[STATE].update_one({"_id": STATE_ID}, {"$set": {"resume_token": token, "updated_at": datetime.now()}},
+                         upsert=True)
+
+
+def run_projector(db, batch_ms=500, batch_size=500):
+    """Проектор: пачка - события за batch_ms мс, но не больше batch_size мероприятий"""
+    state = db[STATE].find_one({"_id": STATE_ID}) or {}
+    token = state.get("resume_token")
+    pipeline = [{"$match": {"ns.coll": {"$in": WATCHED}}}]
+    while True:
+        try:
+            with db.watch(pipeline, full_document="updateLookup", full_document_before_change="whenAvailable",
+                          resume_after=token, max_await_time_ms=batch_ms) as stream:
+                if token is None:
+                    # Поток открыт до перестройки: изменения во время нее будут обработаны повторно
+                    rebuild(db)
+                    token = stream.resume_token
+                    save_token(db, token)
+                print(f"Проектор {CARDS} слушает {', '.join(WATCHED)}")
+                pending = set()
+                batch_started = time.monotonic()
+                while stream.alive:
+                    change = stream.try_next()
+                    if change is not None:
+                        if not pending:
+                            batch_started = time.monotonic()
+                        pending |= affected_events(db, change)
+                    window_over = (time.monotonic() - batch_started) * 1000 >= batch_ms
+                    if pending and (change is None or window_over or len(pending) >= batch_size):
+                        started = time.perf_counter()
+                        count = project(db, pending)
+                        pending.clear()
+                        print(f"  {datetime.now():%H:%M:%S} пересчитано {count} карточек "
+                              f"({(time.perf_counter() - started) * 1000:.0f} мс)")
+                    # Токен сохраняется только после применения пачки: после сбоя она повторится
+                    if not pending and stream.resume_token != token:
+                        token = stream.resume_token
+                        save_token(db, token)
+        except OperationFailure as e:
+            if e.code != HISTORY_LOST:
+                raise
+            print("Resume token вытеснен из oplog - полная перестройка")
+            token = None
+
+
+def check(db, sample=200, fix=False):
+    """Сверка выборки карточек с пересчетом и поиск мероприятий без карточек"""
+    ignored = {"projected_at"}
+    ids = [doc["_id"] for doc in db.events.aggregate([{"$sample": {"size": sample}}, {"$project": {"_id": 1}}])]
+    expected = {card["_id"]: card for card in db.events.aggregate(build_pipeline({"_id": {"$in": ids}}))}
+    actual = {card["_id"]: card for card in db[CARDS].find({"_id": {"$in": ids}})}
+
+    missing = [event_id for event_id in ids if event_id not in actual]
+    stale = []
+    for event_id, card in expected.items():
+        current = actual.get(event_id)
+        if current is None:
+            continue
+        fields = sorted(key for key in (set(card) | set(current)) - ignored
+                        if card.get(key) != current.get(key))
+        if fields:
+            stale.append((event_id, fields))
+
+    # Сироты и пропуски по всей коллекции - по числу документов из метаданных
+    events_count = db.events.estimated_document_count()
+    cards_count = db[CARDS].estimated_document_count()
+
+    print(f"=== ПРОВЕРКА {CARDS}: выборка {len(ids)} ===")
+    print(f"Мероприятий {events_count}, карточек {cards_count}")
+    print(f"Без карточки: {len(missing)}, устаревших: {len(stale)}")
+    for event_id, fields in stale[:20]:
+        print(f"  {event_id}: {', '.join(fields)}")
+    if fix and (missing or stale):
+        project(db, missing + [event_id for event_id, _ in stale])
+        print(f"✓ Пересчитано {len(missing) + len(stale)} карточек")
+    return not missing and not stale and events_count == cards_count
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Витрина карточек мероприятий event_cards")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--rebuild", action="store_true", help="перестроить все карточки")
+    parser.add_argument("--run", action="store_true", help="запустить проектор по change stream")
+    parser.add_argument("--batch-ms", type=int, default=500, help="окно пачки проектора, мс")
+    parser.add_argument("--batch-size", type=int, default=500, help="максимум мероприятий в пачке")
+    parser.add_argument("--check", action="store_true", help="сверить карточки с источниками")
+    parser.add_argument("--sample", type=int, default=200, help="размер выборки для --check")
+    parser.add_argument("--fix", action="store_true", help="пересчитать найденные расхождения")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = MongoClient(args.uri)[DB_NAME]
+    if args.rebuild:
+        rebuild(db)
+    if args.check:
+        ok = check(db, args.sample, args.fix)
+        print("✓ Карточки согласованы" if ok else "✗ Есть расхождения")
+    if args.run:
+        enable_pre_images(db)
+        try:
+            run_projector(db, args.batch_ms, args.batch_size)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# event_media.py - Хранение больших полей мероприятий вне каталога (PostgreSQL и MongoDB)
+#
+# Длинные описания, объекты metadata, афиши и вложения больше MEDIA_THRESHOLD
+# байт хранятся отдельно от карточки мероприятия, а в каталоге остаются только
+# превью и ссылки:
+#   - PostgreSQL: таблица EventMedia (lab2/08_event_media.sql), содержимое в
+#     TOAST без сжатия (STORAGE EXTERNAL), чтобы substring() читал только
+#     нужные чанки; Events.description_media_id; каталог - представление EventCatalog;
+#   - MongoDB: GridFS-бакет event_media, коллекции которого создаются со
+#     сжатием блоков zstd; в документе мероприятия - media: [{file_id, kind,
+#     content_type, size}], description_file_id, metadata_file_id.
+# Содержимое отдается потоком по CHUNK_SIZE байт, целиком в память не читается.
+# Сравнение скорости каталога и занимаемого кэша: media_benchmark.py
+#
+# Примеры:
+#   python3 event_media.py --engine postgres --pg-dsn "dbname=event_booking" --migrate
+#   python3 event_media.py --engine mongo --migrate --threshold 4096
+#   python3 event_media.py --engine mongo --put poster.jpg --event-id 65f0... --kind poster
+#   python3 event_media.py --engine postgres --pg-dsn "dbname=event_booking" --get 17 --out poster.jpg
+import argparse
+import hashlib
+import mimetypes
+import os
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+# Поля больше порога уходят из карточки мероприятия
+MEDIA_THRESHOLD = 2000
+PREVIEW_CHARS = 200
+# Размер куска при чтении; совпадает с размером чанка GridFS по умолчанию
+CHUNK_SIZE = 255 * 1024
+BUCKET = 'event_media'
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lab2', '08_event_media.sql')
+
+
+class PgMediaStore:
+    def __init__(self, dsn):
+        import psycopg2
+        self.conn = psycopg2.connect(dsn)
+
+    def ensure_schema(self):
+        with open(SCHEMA_FILE, encoding="utf-8") as f, self.conn, self.conn.cursor() as cur:
+            cur.execute(f.read())
+
+    def put(self, event_id, kind, data, content_type="application/octet-stream", filename=None):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO EventMedia (event_id, kind, content_type, filename, size_bytes, sha256, data)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                RETURNING media_id
+            """, (event_id, kind, content_type, filename, len(data), hashlib.sha256(data).hexdigest(), data))
+            return cur.fetchone()[0]
+
+    def info(self, media_id):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SELECT content_type, filename, size_bytes, sha256 FROM EventMedia WHERE media_id = %s",
+                        (media_id,))
+            row = cur.fetchone()
+        if row is None:
+            raise KeyError(media_id)
+        return dict(zip(("content_type", "filename", "size", "sha256"), row))
+
+    def stream(self, media_id, chunk_size=CHUNK_SIZE):
+        """Содержимое кусками: для несжатого значения substring() читает только нужные чанки TOAST"""
+        size = self.info(media_id)["size"]
+        with self.conn, self.conn.cursor() as cur:
+            for offset in range(0, size, chunk_size):
+                cur.execute("SELECT substring(data FROM %s FOR %s) FROM EventMedia WHERE media_id = %s",
+                            (offset + 1, chunk_size, media_id))
+                yield bytes(cur.fetchone()[0])
+
+    def catalog(self, limit=20):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("""
+                SELECT event_id, title, event_date, description_preview, description_media_id, media
+                FROM EventCatalog ORDER BY event_date LIMIT %s
+            """, (limit,))
+            columns = [c.name for c in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
+
+    def migrate(self, threshold=MEDIA_THRESHOLD):
+        with self.conn, self.conn.cursor() as cur:
+            cur.execute("SELECT move_large_descriptions(%s, %s)", (threshold, PREVIEW_CHARS))
+            return {"descriptions": cur.fetchone()[0]}
+
+    def close(self):
+        self.conn.close()
+
+
+class MongoMediaStore:
+    def __init__(self, uri=MONGO_URI):
+        from gridfs import GridFSBucket
+        from pymongo import MongoClient
+        self.db = MongoClient(uri)[DB_NAME]
+        self.ensure_storage()
+        self.bucket = GridFSBucket(self.db, bucket_name=BUCKET, chunk_size_bytes=CHUNK_SIZE)
+
+    def ensure_storage(self):
+        """Коллекции бакета со сжатием zstd; создаются один раз
+
+        GridFS читает кусок по номеру чанка, поэтому сжатие блоков не мешает
+        потоковому чтению (в отличие от сжатого значения в TOAST).
+        """
+        existing = set(self.db.list_collection_names())
+        for name in (f"{BUCKET}.files", f"{BUCKET}.chunks"):
+            if name not in existing:
+                self.db.create_collection(
+                    name, storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}}
+                )
+        self.db[f"{BUCKET}.files"].create_index([("metadata.event_id", 1), ("metadata.kind", 1)])
+
+    def put(self, event_id, kind, data, content_type="application/octet-stream", filename=None):
+        """Загрузить содержимое в GridFS и добавить ссылку в документ мероприятия"""
+        file_id = self.bucket.upload_from_stream(
+            filename or f"{event_id}-{kind}",
+            data,
+            metadata={"event_id": event_id, "kind": kind, "content_type": content_type,
+                      "sha256": hashlib.sha256(data).hexdigest()},
+        )
+        reference = {"file_id": file_id, "kind": kind, "content_type": content_type, "size": len(data)}
+        self.db.events.update_one({"_id": event_id}, {"$push": {"media": reference}})
+        return file_id
+
+    def info(self, file_id):
+        grid_out = self.bucket.open_download_stream(file_id)
+        metadata = grid_out.metadata or {}
+        return {"content_type": metadata.get("content_type"), "filename": grid_out.filename,
+                "size": grid_out.length, "sha256": metadata.get("sha256")}
+
+    def stream(self, file_id, chunk_size=CHUNK_SIZE):
+        grid_out = self.bucket.open_download_stream(file_id)
+        while True:
+            chunk = grid_out.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def catalog(self, limit=20):
+        return list(self.db.events.find(
+            {},
+            {"title": 1, "date": 1, "description": 1, "description_file_id": 1, "media": 1,
+             "categories": 1, "available_seats": 1}
+        ).sort("date", 1).limit(limit))
+
+    def migrate(self, threshold=MEDIA_THRESHOLD):
+        """Вынести из документов мероприятий описания и metadata больше threshold байт"""
+        import bson
+
+        moved = {"descriptions": 0, "metadata": 0}
+        large = {"$or": [
+            {"description_file_id": {"$exists": False},
+             "$expr": {"$gt": [{"$strLenBytes": {"$ifNull": ["$description", ""]}}, threshold]}},
+            {"metadata": {"$type": "object"},
+             "$expr": {"$gt": [{"$bsonSize": "$metadata"}, threshold]}},
+        ]}
+        for event in self.db.events.find(large, {"description": 1, "metadata": 1, "description_file_id": 1}):
+            description = event.get("description") or ""
+            if "description_file_id" not in event and len(description.encode()) > threshold:
+                file_id = self.bucket.upload_from_stream(
+                    f"{event['_id']}-description", description.encode(),
+                    metadata={"event_id": event["_id"], "kind": "description",
+                              "content_type": "text/plain; charset=utf-8"},
+                )
+                self.db.events.update_one({"_id": event["_id"]}, {"$set": {
+                    "description": description[:PREVIEW_CHARS], "description_file_id": file_id}})
+                moved["descriptions"] += 1
+            metadata = event.get("metadata")
+            if isinstance(metadata, dict) and len(bson.encode(metadata)) > threshold:
+                file_id = self.bucket.upload_from_stream(
+                    f"{event['_id']}-metadata", bson.encode(metadata),
+                    metadata={"event_id": event["_id"], "kind": "metadata", "content_type": "application/bson"},
+                )
+                self.db.events.update_one({"_id": event["_id"]}, {
+                    "$unset": {"metadata": ""}, "$set": {"metadata_file_id": file_id}})
+                moved["metadata"] += 1
+        return moved
+
+    def close(self):
+        self.db.client.close()
+
+
+def open_store(args):
+    if args.engine == "postgres":
+        store = PgMediaStore(args.pg_dsn)
+        store.ensure_schema()
+        return store
+    return MongoMediaStore(args.mongo_uri)
+
+
+def parse_id(engine, value):
+    if engine == "postgres":
+        return int(value)
+    from bson import ObjectId
+    return ObjectId(value)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Большие поля мероприятий вне каталога")
+    parser.add_argument("--engine", choices=["mongo", "postgres"], default="mongo")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--migrate", action="store_true", help="вынести большие описания (и metadata)")
+    parser.add_argument("--threshold", type=int, default=MEDIA_THRESHOLD, help="порог, байт")
+    parser.add_argument("--put", metavar="FILE", help="загрузить файл для --event-id")
+    parser.add_argument("--event-id")
+    parser.add_argument("--kind", default="attachment", choices=["poster", "attachment", "description"])
+    parser.add_argument("--get", metavar="MEDIA_ID", help="выгрузить содержимое потоком")
+    parser.add_argument("--out", help="файл для --get")
+    parser.add_argument("--catalog", type=int, metavar="N", help="показать N карточек каталога")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    store = open_store(args)
+    if args.migrate:
+        moved = store.migrate(args.threshold)
+        print("Вынесено: " + ", ".join(f"{name} {count}" for name, count in moved.items()))
+    if args.put:
+        with open(args.put, "rb") as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(args.put)[0] or "application/octet-stream"
+        media_id = store.put(parse_id(args.engine, args.event_id), args.kind, data, content_type,
+                             os.path.basename(args.put))
+        print(f"Загружено {len(data)} байт: {media_id}")
+    if args.get:
+        media_id = parse_id(args.engine, args.get)
+        info = store.info(media_id)
+        out = args.out or info["filename"] or f"media-{media_id}"
+        digest = hashlib.sha256()
+        with open(out, "wb") as f:
+            for chunk in store.stream(media_id):
+                digest.update(chunk)
+                f.write(chunk)
+        check = "" if info["sha256"] is None else (
+            " ✓ sha256" if digest.hexdigest() == info["sha256"] else " ✗ sha256 не совпадает")
+        print(f"{out}: {info['size']} байт, {info['content_type']}{check}")
+    if args.catalog:
+        for card in store.catalog(args.catalog):
+            print(card)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
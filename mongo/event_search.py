@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# event_search.py - Поиск мероприятий: полнотекстовый, «рядом со мной» и фильтры
+#
+# Поиск идет по витрине event_cards (event_cards.py), где у мероприятия уже
+# есть координаты места проведения, цены билетов и рейтинг. Индексы создает
+# event_cards.ensure_indexes:
+#   - cards_text      - текстовый индекс (title, categories, tags, search_text -
+#                       полное описание, а не превью из description) с русским
+#                       стеммингом и весами 10/5/5/1; описания, вынесенные в
+#                       GridFS (event_media.py), ищутся по их превью;
+#   - cards_geo_date  - 2dsphere по venue.location.
+# Режимы и порядок результатов:
+#   - есть текст      - $text, по убыванию релевантности (textScore); радиус
+#                       вокруг точки, если задан, - фильтр $geoWithin;
+#   - только точка    - $geoNear, по расстоянию, затем по дате;
+#   - только фильтры  - по дате (индекс {status, date, _id}).
+# Во всех режимах доступны фильтры по дате, категориям и цене билета.
+# Страницы - keyset: курсор хранит ключ сортировки последней записи, а не OFFSET.
+# Сравнение с поиском через regex и $or: search_benchmark.py
+#
+# Примеры:
+#   python3 event_search.py --text "джаз концерт" --category концерт --max-price 5000
+#   python3 event_search.py --near 37.62,55.75 --radius-km 5 --from 2025-06-01
+#   python3 event_search.py --text "выставка" --after <курсор>
+import argparse
+import base64
+import json
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import MongoClient
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+CARDS = 'event_cards'
+EARTH_RADIUS_KM = 6378.1
+PAGE_SIZE = 20
+
+RESULT_FIELDS = {"title": 1, "date": 1, "categories": 1, "tags": 1, "venue": 1, "ticket_types": 1,
+                 "available_seats": 1, "reviews": 1}
+
+
+def encode_cursor(values):
+    payload = json.dumps([v.isoformat() if isinstance(v, datetime) else str(v) if isinstance(v, ObjectId) else v
+                          for v in values])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def decode_cursor(cursor):
+    return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+
+
+def filters(date_from=None, date_to=None, categories=None, price_min=None, price_max=None):
+    """Общие фильтры: опубликованные мероприятия в окне дат, категории, цена хотя бы одного билета"""
+    query = {"status": "published", "date": {"$gte": date_from or datetime.now()}}
+    if date_to:
+        query["date"]["$lt"] = date_to
+    if categories:
+        query["categories"] = {"$in": categories}
+    price = {}
+    if price_min is not None:
+        price["$gte"] = price_min
+    if price_max is not None:
+        price["$lte"] = price_max
+    if price:
+        query["ticket_types"] = {"$elemMatch": {"price": price}}
+    return query
+
+
+def text_pipeline(text, query, near, radius_km, after, limit):
+    query = dict(query, **{"$text": {"$search": text, "$language": "russian"}})
+    if near and radius_km:
+        query["venue.location"] = {"$geoWithin": {"$centerSphere": [list(near), radius_km / EARTH_RADIUS_KM]}}
+    pipeline = [{"$match": query}, {"$addFields": {"score": {"$meta": "textScore"}}}]
+    if after:
+        score, last_id = decode_cursor(after)
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "_id": {"$gt": ObjectId(last_id)}},
+        ]}})
+    pipeline += [{"$sort": {"score": -1, "_id": 1}}, {"$limit": limit + 1}]
+    return pipeline, lambda doc: encode_cursor([doc["score"], doc["_id"]])
+
+
+def near_pipeline(query, near, radius_km, after, limit):
+    geo = {"near": {"type": "Point", "coordinates": list(near)}, "distanceField": "distance_m",
+           "key": "venue.location", "spherical": True, "query": query}
+    if radius_km:
+        geo["maxDistance"] = radius_km * 1000
+    pipeline = [{"$geoNear": geo}]
+    if after:
+        distance, date, last_id = decode_cursor(after)
+        date, last_id = datetime.fromisoformat(date), ObjectId(last_id)
+        # Записи ближе последней отсекает сам $geoNear
+        geo["minDistance"] = distance
+        pipeline.append({"$match": {"$or": [
+            {"distance_m": {"$gt": distance}},
+            {"distance_m": distance, "date": {"$gt": date}},
+            {"distance_m": distance, "date": date, "_id": {"$gt": last_id}},
+        ]}})
+    # У одного места много мероприятий на одном расстоянии - порядок внутри по дате
+    pipeline += [{"$sort": {"distance_m": 1, "date": 1, "_id": 1}}, {"$limit": limit + 1}]
+    return pipeline, lambda doc: encode_cursor([doc["distance_m"], doc["date"], doc["_id"]])
+
+
+def date_pipeline(query, after, limit):
+    if after:
+        date, last_id = decode_cursor(after)
+        date, last_id = datetime.fromisoformat(date), ObjectId(last_id)
+        query = {"$and": [query, {"$or": [{"date": {"$gt": date}}, {"date": date, "_id": {"$gt": last_id}}]}]}
+    pipeline = [{"$match": query}, {"$sort": {"date": 1, "_id": 1}}, {"$limit": limit + 1}]
+    return pipeline, lambda doc: encode_cursor([doc["date"], doc["_id"]])
+
+
+def search(db, text=None, near=None, radius_km=None, date_from=None, date_to=None, categories=None,
+           price_min=None, price_max=None, after=None, limit=PAGE_SIZE):
+    """Страница результатов и курсор следующей страницы (или None).
+
+    near - (долгота, широта). Курсор действителен только с теми же параметрами поиска.
+    """
+    query = filters(date_from, date_to, categories, price_min, price_max)
+    if text:
+        pipeline, make_cursor = text_pipeline(text, query, near, radius_km, after, limit)
+    elif near:
+        pipeline, make_cursor = near_pipeline(query, near, radius_km, after, limit)
+    else:
+        pipeline, make_cursor = date_pipeline(query, after, limit)
+    pipeline.append({"$project": dict(RESULT_FIELDS, score=1, distance_m=1)})
+
+    # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+    docs = list(db[CARDS].aggregate(pipeline))
+    page = docs[:limit]
+    next_cursor = make_cursor(page[-1]) if len(docs) > limit else None
+    return page, next_cursor
+
+
+def parse_point(value):
+    lon, lat = (float(part) for part in value.split(","))
+    return lon, lat
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Поиск мероприятий по event_cards")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--text", help="поисковая строка")
+    parser.add_argument("--near", type=parse_point, metavar="LON,LAT", help="точка «рядом со мной»")
+    parser.add_argument("--radius-km", type=float)
+    parser.add_argument("--from", dest="date_from", type=datetime.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=datetime.fromisoformat)
+    parser.add_argument("--category", action="append", dest="categories", help="можно несколько раз")
+    parser.add_argument("--min-price", type=float)
+    parser.add_argument("--max-price", type=float)
+    parser.add_argument("--after", help="курсор предыдущей страницы")
+    parser.add_argument("--limit", type=int, default=PAGE_SIZE)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = MongoClient(args.uri)[DB_NAME]
+    page, next_cursor = search(db, args.text, args.near, args.radius_km, args.date_from, args.date_to,
+                               args.categories, args.min_price, args.max_price, args.after, args.limit)
+    for event in page:
+        rank = (f"score {event['score']:.2f}" if "score" in event else
+                f"{event['distance_m'] / 1000:.1f} км" if "distance_m" in event else "")
+        prices = sorted(t["price"] for t in event.get("ticket_types", []))
+        price = f"от {prices[0]}" if prices else "-"
+        print(f"{event['date']:%Y-%m-%d %H:%M}  {event['title']:<40} {event.get('venue', {}).get('name', '-'):<25} "
+              f"{price:>10}  {rank}")
+    print(f"\nСледующая страница: {next_cursor or 'нет'}")
+
+
+if __name__ == "__main__":
+    main()
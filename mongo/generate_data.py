@@ -1,268 +1,230 @@
 #!/usr/bin/env python3
 # generate_data.py - Генерация тестовых данных для MongoDB
-from pymongo import MongoClient
-from datetime import datetime, timedelta
-import random
-from faker import Faker
-from bson import ObjectId
+#
+# Данные генерируются потоково: документы создаются генераторами и пишутся
+# чанками фиксированного размера (неупорядоченные insert_many / bulk_write),
+# поэтому расход памяти не растет вместе с объемом. Чанки пользователей,
+# бронирований и отзывов раздаются пулу процессов (--workers N), каждый
+# воркер сам пишет свой чанк через собственное подключение.
+#
+# Состав данных задает общая спецификация datagen.py (--seed, --scale,
+# распределения Zipf, --anchor), поэтому повторный запуск с тем же --anchor дает
+# тот же набор; дата отсчета печатается при запуске.
+#
+# Пример: python3 generate_data.py --seed 7 --scale users=5000,bookings=70000 --workers 8
+import argparse
+import time
+from multiprocessing import Pool
 
-fake = Faker('ru_RU')
-client = MongoClient('mongodb://localhost:27017/')
-db = client.event_booking_system
+from pymongo import MongoClient, UpdateOne
 
-def generate_data():
-    print("=== ГЕНЕРАЦИЯ ТЕСТОВЫХ ДАННЫХ ===")
-    
-    # Очистка старых данных
-    db.events.delete_many({})
-    db.users.delete_many({})
-    db.bookings.delete_many({})
-    db.reviews.delete_many({})
-    db.venues.delete_many({})
-    db.organizers.delete_many({})
-    
-    # Генерация организаторов
-    organizers = []
-    for i in range(10):
-        organizer = {
-            "_id": ObjectId(),
-            "name": fake.company(),
-            "email": fake.email(),
-            "phone": fake.phone_number(),
-            "description": fake.text(max_nb_chars=200),
-            "rating": round(random.uniform(3.5, 5.0), 1),
-            "total_events": random.randint(1, 50)
-        }
-        organizers.append(organizer)
-    
-    db.organizers.insert_many(organizers)
-    print(f"Создано организаторов: {len(organizers)}")
-    
-    # Генерация мест проведения
-    venues = []
-    for i in range(15):
-        venue = {
-            "_id": ObjectId(),
-            "name": fake.random_element([
-                "Кремлевский дворец", "Стадион Лужники", 
-                "Театр им. Вахтангова", "Концертный зал Чайковского"
-            ]),
-            "location": {
-                "type": "Point",
-                "coordinates": [
-                    round(random.uniform(37.0, 38.0), 6),
-                    round(random.uniform(55.0, 56.0), 6)
-                ]
-            },
-            "address": fake.address(),
-            "capacity": random.choice([100, 500, 1000, 5000]),
-            "sections": [
-                {"name": "Партер", "rows": 20, "seats_per_row": 25},
-                {"name": "Балкон", "rows": 15, "seats_per_row": 20}
-            ]
-        }
-        venues.append(venue)
-    
-    db.venues.insert_many(venues)
-    print(f"Создано мест проведения: {len(venues)}")
-    
-    # Генерация пользователей
-    users = []
-    for i in range(200):
-        user = {
-            "_id": ObjectId(),
-            "email": fake.email(),
-            "name": fake.name(),
-            "phone": fake.phone_number(),
-            "preferences": {
-                "categories": random.sample(
-                    ["концерт", "театр", "спорт", "выставка"], 
-                    k=random.randint(1, 3)
-                ),
-                "notifications": random.choice([True, False])
-            },
-            "stats": {
-                "total_bookings": 0,
-                "total_spent": 0.0,
-                "last_booking_date": None
-            },
-            "booking_history": [],
-            "favorites": [],
-            "view_history": [],
-            "created_at": fake.date_time_between(start_date='-2y', end_date='now'),
-            "updated_at": datetime.now()
-        }
-        users.append(user)
-    
-    db.users.insert_many(users)
-    print(f"Создано пользователей: {len(users)}")
-    
-    # Генерация мероприятий
-    events = []
-    for i in range(100):
-        capacity = random.choice([100, 200, 500, 1000])
-        event = {
-            "_id": ObjectId(),
-            "title": f"{fake.random_element(['Концерт', 'Спектакль', 'Матч', 'Выставка'])} {fake.word().capitalize()}",
-            "description": fake.text(max_nb_chars=500),
-            "date": fake.date_time_between(start_date='+1d', end_date='+90d'),
-            "venue_id": random.choice(venues)["_id"],
-            "organizer_id": random.choice(organizers)["_id"],
-            "categories": random.sample(
-                ["концерт", "театр", "спорт", "выставка", "фестиваль"], 
-                k=random.randint(1, 3)
-            ),
-            "tags": random.sample(["популярное", "новинка", "рекомендуем"], k=random.randint(1, 2)),
-            "ticket_types": [
-                {
-                    "type": "VIP",
-                    "price": random.randint(5000, 20000),
-                    "quantity": random.randint(10, 50),
-                    "sold": 0
-                },
-                {
-                    "type": "Standard",
-                    "price": random.randint(1000, 5000),
-                    "quantity": random.randint(100, 500),
-                    "sold": 0
-                },
-                {
-                    "type": "Student",
-                    "price": random.randint(500, 2000),
-                    "quantity": random.randint(50, 200),
-                    "sold": 0
-                }
-            ],
-            "status": random.choice(["draft", "published", "published", "published"]),
-            "capacity": capacity,
-            "available_seats": capacity,
-            "created_at": fake.date_time_between(start_date='-30d', end_date='now'),
-            "updated_at": datetime.now()
-        }
-        events.append(event)
-    
-    db.events.insert_many(events)
-    print(f"Создано мероприятий: {len(events)}")
-    
-    # Генерация бронирований
-    bookings = []
-    for i in range(300):
-        user = random.choice(users)
-        event = random.choice(events)
-        
-        ticket_type = random.choice(event["ticket_types"])
-        quantity = random.randint(1, 4)
-        total_amount = ticket_type["price"] * quantity
-        
-        # ИСПРАВЛЕННЫЙ КОД: больше рядов для выборки
-        rows = ['A', 'B', 'C', 'D', 'E', 'F', 'G', 'H', 'I', 'J']
-        seats = [f"{row}{num}" for row, num in 
-                 zip(random.sample(rows, k=quantity),
-                     random.sample(range(1, 30), k=quantity))]
-        
-        booking = {
-            "_id": ObjectId(),
-            "user_id": user["_id"],
-            "event_id": event["_id"],
-            "ticket_type": ticket_type["type"],
-            "quantity": quantity,
-            "total_amount": total_amount,
-            "status": random.choice(["confirmed", "confirmed", "cancelled"]),
-            "payment_method": random.choice(["cash", "card", "online"]),
-            "transaction_id": f"TXN{random.randint(100000, 999999)}",
-            "seats": seats,
-            "created_at": fake.date_time_between(start_date='-60d', end_date='now'),
-            "updated_at": datetime.now()
-        }
-        bookings.append(booking)
-    
-    db.bookings.insert_many(bookings)
-    print(f"Создано бронирований: {len(bookings)}")
-    
-    # Обновление статистики пользователей и истории
+from booking_history import history_push
+from datagen import DataSpec, add_spec_arguments, spec_from_args
+from event_cards import rebuild as rebuild_event_cards
+from user_activity import ACTIVITY, activity_doc, insert_stamped, recent_views, refresh_rollups, reset_collections
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+client = None
+db = None
+
+# Спецификация данных воркера, заполняется в init_worker
+spec = None
+
+
+def connect(uri=MONGO_URI):
+    """Подключение к базе данных"""
+    global client, db
+    client = MongoClient(uri)
+    db = client[DB_NAME]
+    return db
+
+
+def iter_chunks(total, chunk_size):
+    """Разбиение диапазона [0, total) на чанки (start, size)"""
+    for start in range(0, total, chunk_size):
+        yield start, min(chunk_size, total - start)
+
+
+def init_worker(uri, data_spec):
+    """Инициализация процесса-воркера: свое подключение и копия спецификации"""
+    global spec
+    connect(uri)
+    spec = data_spec
+
+
+def run_chunks(func, total, chunk_size, workers, initargs):
+    """Обработка чанков в текущем процессе или в пуле из workers процессов"""
+    done = 0
+    if workers <= 1:
+        init_worker(*initargs)
+        for chunk in iter_chunks(total, chunk_size):
+            done += func(chunk)
+        return done
+
+    with Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+        for count in pool.imap_unordered(func, iter_chunks(total, chunk_size)):
+            done += count
+    return done
+
+
+def user_history_updates(bookings):
+    """Статистика и последние бронирования пользователей по чанку: одна операция на пользователя"""
+    per_user = {}
     for booking in bookings:
-        # Находим событие
-        event = next(e for e in events if e["_id"] == booking["event_id"])
-        
-        # Обновляем пользователя
-        db.users.update_one(
-            {"_id": booking["user_id"]},
+        entry = per_user.setdefault(booking["user_id"], {
+            "count": 0, "spent": 0, "last": booking["created_at"], "history": []
+        })
+        entry["count"] += 1
+        entry["spent"] += booking["total_amount"]
+        entry["last"] = max(entry["last"], booking["created_at"])
+        entry["history"].append({
+            "booking_id": spec.object_id("bookings", booking["id"]),
+            "event_id": spec.object_id("events", booking["event_id"]),
+            "event_title": booking["event_title"],
+            "date": booking["created_at"],
+            "status": booking["status"],
+            "amount": booking["total_amount"]
+        })
+
+    return [
+        UpdateOne(
+            {"_id": spec.object_id("users", user_id)},
             {
                 "$inc": {
-                    "stats.total_bookings": 1,
-                    "stats.total_spent": booking["total_amount"]
-                },
-                "$set": {
-                    "stats.last_booking_date": booking["created_at"]
+                    "stats.total_bookings": entry["count"],
+                    "stats.total_spent": entry["spent"]
                 },
-                "$push": {
-                    "booking_history": {
-                        "booking_id": booking["_id"],
-                        "event_id": booking["event_id"],
-                        "event_title": event["title"],
-                        "date": booking["created_at"],
-                        "status": booking["status"],
-                        "amount": booking["total_amount"]
-                    }
-                }
+                "$max": {"stats.last_booking_date": entry["last"]},
+                # В документе остаются только последние записи, полная история - в bookings
+                "$push": {"booking_history": history_push(entry["history"])}
             }
         )
-    
-    # Генерация отзывов
-    reviews = []
-    for i in range(150):
-        review = {
-            "_id": ObjectId(),
-            "event_id": random.choice(events)["_id"],
-            "user_id": random.choice(users)["_id"],
-            "rating": random.randint(1, 5),
-            "comment": fake.text(max_nb_chars=200),
-            "created_at": fake.date_time_between(start_date='-60d', end_date='now'),
-            "helpful_count": random.randint(0, 50)
-        }
-        reviews.append(review)
-    
-    db.reviews.insert_many(reviews)
-    print(f"Создано отзывов: {len(reviews)}")
-    
-    # Генерация истории просмотров и избранного
+        for user_id, entry in per_user.items()
+    ]
+
+
+def load_users_chunk(chunk):
+    # Избранное создается вместе с пользователем; все просмотры идут в
+    # time-series лог активности, в документе остаются только последние
+    start, size = chunk
+    users = [spec.mongo_user(rec) for rec in spec.iter_records("users", start, size)]
+    views = [activity_doc(user["_id"], view["event_id"], view["viewed_at"])
+             for user in users for view in user["view_history"]]
     for user in users:
-        viewed_events = random.sample(events, k=random.randint(5, 20))
-        view_history = []
-        
-        for event in viewed_events:
-            view_history.append({
-                "event_id": event["_id"],
-                "viewed_at": fake.date_time_between(start_date='-30d', end_date='now')
-            })
-        
-        # Добавляем в избранное
-        favorites = random.sample(viewed_events, k=random.randint(2, 5))
-        
-        db.users.update_one(
-            {"_id": user["_id"]},
-            {
-                "$set": {
-                    "view_history": view_history,
-                    "favorites": [e["_id"] for e in favorites]
-                }
-            }
+        user["view_history"] = recent_views(user["view_history"])
+    db.users.insert_many(users, ordered=False)
+    insert_stamped(db[ACTIVITY], views)
+    return size
+
+
+def load_bookings_chunk(chunk):
+    start, size = chunk
+    bookings = list(spec.iter_records("bookings", start, size))
+    # written_at - время записи (окно refresh_dashboard.js), а не сгенерированная дата;
+    # ставится каждой пачке, чтобы опережать запись не больше чем на одну пачку
+    insert_stamped(db.bookings, (spec.mongo_booking(rec) for rec in bookings))
+    db.users.bulk_write(user_history_updates(bookings), ordered=False)
+    return size
+
+
+def load_reviews_chunk(chunk):
+    start, size = chunk
+    docs = (spec.mongo_review(rec) for rec in spec.iter_records("reviews", start, size))
+    db.reviews.insert_many(docs, ordered=False)
+    return size
+
+
+def report(name, count, started):
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f"Создано {name}: {count} ({elapsed:.1f} с, {rate:.0f} док/с)")
+
+
+def generate_data(data_spec=None, chunk_size=10000, workers=1, uri=MONGO_URI):
+    print("=== ГЕНЕРАЦИЯ ТЕСТОВЫХ ДАННЫХ ===")
+    global spec
+    spec = data_spec or DataSpec()
+    connect(uri)
+    print(f"Зерно: {spec.seed}, объем: {spec.sizes}, --anchor {spec.anchor:%Y-%m-%d}")
+
+    # Очистка старых данных
+    for name in ['events', 'users', 'bookings', 'reviews', 'venues', 'organizers']:
+        db[name].delete_many({})
+    reset_collections(db)
+
+    # Организаторы, места проведения и мероприятия малы и нужны всем воркерам,
+    # поэтому создаются в основном процессе
+    db.organizers.insert_many([spec.mongo_organizer(rec) for rec in spec.organizers])
+    print(f"Создано организаторов: {len(spec.organizers)}")
+
+    db.venues.insert_many([spec.mongo_venue(rec) for rec in spec.venues])
+    print(f"Создано мест проведения: {len(spec.venues)}")
+
+    started = time.perf_counter()
+    for start, size in iter_chunks(len(spec.events), chunk_size):
+        db.events.insert_many(
+            (spec.mongo_event(rec) for rec in spec.events[start:start + size]), ordered=False
         )
-    
+    report("мероприятий", len(spec.events), started)
+
+    initargs = (uri, spec)
+
+    # Генерация пользователей
+    started = time.perf_counter()
+    count = run_chunks(load_users_chunk, spec.sizes["users"], chunk_size, workers, initargs)
+    report("пользователей", count, started)
+
+    # Генерация бронирований и обновление статистики пользователей
+    started = time.perf_counter()
+    count = run_chunks(load_bookings_chunk, spec.sizes["bookings"], chunk_size, workers, initargs)
+    report("бронирований", count, started)
+
+    # Генерация отзывов
+    started = time.perf_counter()
+    count = run_chunks(load_reviews_chunk, spec.sizes["reviews"], chunk_size, workers, initargs)
+    report("отзывов", count, started)
+
+    # Свертки активности для пайплайнов aggregations.js
+    started = time.perf_counter()
+    refresh_rollups(db, full=True)
+    print(f"Свертки активности по {db[ACTIVITY].count_documents({})} записям лога "
+          f"({time.perf_counter() - started:.1f} с)")
+
+    # Карточки каталога (event_cards) по уже загруженным данным
+    rebuild_event_cards(db)
+
+    # estimated_document_count берет число из метаданных и не сканирует коллекцию
     print("\n=== СВОДКА ===")
-    print(f"Организаторы: {db.organizers.count_documents({})}")
-    print(f"Места проведения: {db.venues.count_documents({})}")
-    print(f"Пользователи: {db.users.count_documents({})}")
-    print(f"Мероприятия: {db.events.count_documents({})}")
-    print(f"Бронирования: {db.bookings.count_documents({})}")
-    print(f"Отзывы: {db.reviews.count_documents({})}")
-    
-    total = (db.organizers.count_documents({}) + db.venues.count_documents({}) + 
-             db.users.count_documents({}) + db.events.count_documents({}) + 
-             db.bookings.count_documents({}) + db.reviews.count_documents({}))
+    total = 0
+    for title, name in [("Организаторы", "organizers"), ("Места проведения", "venues"),
+                        ("Пользователи", "users"), ("Мероприятия", "events"),
+                        ("Бронирования", "bookings"), ("Отзывы", "reviews")]:
+        count = db[name].estimated_document_count()
+        total += count
+        print(f"{title}: {count}")
     print(f"Всего документов: {total}")
-    
+
     print("\n✓ Генерация данных завершена!")
 
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Генерация тестовых данных для MongoDB")
+    parser.add_argument("--uri", default=MONGO_URI)
+    add_spec_arguments(parser)
+    parser.add_argument("--chunk-size", type=int, default=10000,
+                        help="размер пачки документов для insert_many / bulk_write")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="число процессов, пишущих чанки параллельно")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    generate_data()
\ No newline at end of file
+    args = parse_args()
+    generate_data(
+        data_spec=spec_from_args(args),
+        chunk_size=args.chunk_size,
+        workers=args.workers,
+        uri=args.uri
+    )
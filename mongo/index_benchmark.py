@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+# index_benchmark.py - Повторяемый бенчмарк индексов для MongoDB и PostgreSQL
+#
+# Переносит benchmark_indexes.js в набор декларативных кейсов: у каждого кейса
+# есть запрос и индексы-кандидаты для обоих движков (для PostgreSQL - те же,
+# что в lab2/05_indexes_optimization.sql). Кейс прогоняется без кандидатов и
+# с ними: прогрев, замеряемые итерации, распределение задержек и статистика
+# плана (totalDocsExamined / totalKeysExamined / executionTimeMillis и их
+# аналоги из EXPLAIN ANALYZE). Индексы-кандидаты создаются с префиксом
+# benchmark_ и удаляются после прогона. Уже существующие индексы с тем же
+# первым ключом (create_indexes_simple.js, 05_indexes_optimization.sql) на
+# время замера "до" скрываются: в MongoDB - hidden через collMod, в
+# PostgreSQL - DROP INDEX в транзакции, которая затем откатывается (таблица
+# на это время заблокирована). Результат пишется в JSON и может
+# сравниваться с сохраненной базой.
+#
+# Пример:
+#   python3 index_benchmark.py --engines mongo,postgres --pg-dsn "dbname=event_booking" \
+#       --save-baseline baseline.json
+#   python3 index_benchmark.py --engines mongo,postgres --baseline baseline.json
+import argparse
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+
+from benchstats import compare, load_report, print_comparison, save_report, summarize
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+INDEX_PREFIX = 'benchmark_'
+
+# Кейсы: параметры запросов берутся из params, которые собирает каждый движок
+CASES = [
+    {
+        "name": "events_by_category",
+        "description": "Мероприятия категории 'концерт'",
+        "mongo": {
+            "collection": "events",
+            "filter": lambda p: {"categories": "концерт"},
+            "indexes": [[("categories", 1)]],
+        },
+        # В схеме lab2 у Events нет категорий; ближайший аналог - фильтр по площадке
+        "postgres": {
+            "sql": "SELECT * FROM Events WHERE venue_id = %(venue_id)s",
+            "indexes": ["ON Events (venue_id)"],
+        },
+    },
+    {
+        "name": "users_created_last_30d",
+        "description": "Пользователи, созданные за последние 30 дней",
+        "mongo": {
+            "collection": "users",
+            "filter": lambda p: {"created_at": {"$gte": p["since"], "$lte": p["now"]}},
+            "indexes": [[("created_at", 1)]],
+        },
+        "postgres": {
+            "sql": "SELECT * FROM Users WHERE created_at BETWEEN %(since)s AND %(now)s",
+            "indexes": ["ON Users (created_at)"],
+        },
+    },
+    {
+        "name": "bookings_by_user",
+        "description": "Последние 20 бронирований пользователя",
+        "mongo": {
+            "collection": "bookings",
+            "filter": lambda p: {"user_id": p["user_id"]},
+            "sort": [("created_at", -1)],
+            "limit": 20,
+            "indexes": [[("user_id", 1), ("created_at", -1)]],
+        },
+        "postgres": {
+            "sql": "SELECT * FROM Bookings WHERE user_id = %(user_id)s "
+                   "ORDER BY booking_date DESC LIMIT 20",
+            "indexes": ["ON Bookings (user_id, booking_date DESC)"],
+        },
+    },
+    {
+        "name": "events_by_date_range",
+        "description": "Мероприятия ближайших двух недель по дате",
+        "mongo": {
+            "collection": "events",
+            "filter": lambda p: {"date": {"$gte": p["now"], "$lt": p["until"]}},
+            "sort": [("date", 1)],
+            "indexes": [[("date", 1)]],
+        },
+        "postgres": {
+            "sql": "SELECT * FROM Events WHERE event_date >= %(now)s AND event_date < %(until)s "
+                   "ORDER BY event_date",
+            "indexes": ["ON Events (event_date)"],
+        },
+    },
+    {
+        "name": "bookings_by_status",
+        "description": "Последние 20 подтвержденных бронирований",
+        "mongo": {
+            "collection": "bookings",
+            "filter": lambda p: {"status": "confirmed"},
+            "sort": [("created_at", -1)],
+            "limit": 20,
+            "indexes": [[("status", 1), ("created_at", -1)]],
+        },
+        "postgres": {
+            "sql": "SELECT * FROM Bookings WHERE status_id = 2 ORDER BY booking_date DESC LIMIT 20",
+            "indexes": ["ON Bookings (status_id, booking_date DESC)"],
+        },
+    },
+]
+
+
+def timed(func):
+    started = time.perf_counter()
+    func()
+    return (time.perf_counter() - started) * 1000
+
+
+class MongoEngine:
+    name = "mongo"
+
+    def __init__(self, uri):
+        from pymongo import MongoClient
+        self.db = MongoClient(uri)[DB_NAME]
+
+    def params(self, now):
+        booking = self.db.bookings.find_one({}, {"user_id": 1}) or {}
+        return {
+            "now": now,
+            "since": now - timedelta(days=30),
+            "until": now + timedelta(days=14),
+            "user_id": booking.get("user_id"),
+        }
+
+    def _cursor(self, case, params):
+        cursor = self.db[case["collection"]].find(case["filter"](params))
+        if case.get("sort"):
+            cursor = cursor.sort(case["sort"])
+        if case.get("limit"):
+            cursor = cursor.limit(case["limit"])
+        return cursor
+
+    def run(self, case, params):
+        return timed(lambda: list(self._cursor(case, params)))
+
+    def explain(self, case, params):
+        stats = self._cursor(case, params).explain()["executionStats"]
+        return {
+            "executionTimeMillis": stats.get("executionTimeMillis"),
+            "totalDocsExamined": stats.get("totalDocsExamined"),
+            "totalKeysExamined": stats.get("totalKeysExamined"),
+            "nReturned": stats.get("nReturned"),
+            "indexUsed": find_index_names(stats.get("executionStages"), "IXSCAN", "indexName")
+                         or "COLLSCAN",
+        }
+
+    def create_indexes(self, case, names):
+        for keys, name in zip(case["indexes"], names):
+            self.db[case["collection"]].create_index(keys, name=name)
+
+    def drop_indexes(self, case, names):
+        existing = self.db[case["collection"]].index_information()
+        for name in names:
+            if name in existing:
+                self.db[case["collection"]].drop_index(name)
+
+    def hide_equivalents(self, case):
+        """Скрывает индексы с тем же первым ключом, что у кандидатов"""
+        leading = {keys[0][0] for keys in case["indexes"]}
+        hidden = []
+        for name, info in self.db[case["collection"]].index_information().items():
+            if name == "_id_" or name.startswith(INDEX_PREFIX) or info.get("hidden"):
+                continue
+            if info["key"][0][0] in leading:
+                self.db.command("collMod", case["collection"], index={"name": name, "hidden": True})
+                hidden.append(name)
+        return hidden
+
+    def restore_equivalents(self, case, hidden):
+        for name in hidden:
+            self.db.command("collMod", case["collection"], index={"name": name, "hidden": False})
+
+
+class PostgresEngine:
+    name = "postgres"
+
+    def __init__(self, dsn):
+        import psycopg2
+        self.conn = psycopg2.connect(dsn)
+        self.conn.autocommit = True
+
+    def _one(self, sql):
+        with self.conn.cursor() as cur:
+            cur.execute(sql)
+            row = cur.fetchone()
+            return row[0] if row else None
+
+    def params(self, now):
+        return {
+            "now": now,
+            "since": now - timedelta(days=30),
+            "until": now + timedelta(days=14),
+            "user_id": self._one("SELECT user_id FROM Bookings LIMIT 1"),
+            "venue_id": self._one("SELECT venue_id FROM Events LIMIT 1"),
+        }
+
+    def _fetch(self, sql, params):
+        with self.conn.cursor() as cur:
+            cur.execute(sql, params)
+            cur.fetchall()
+
+    def run(self, case, params):
+        return timed(lambda: self._fetch(case["sql"], params))
+
+    def explain(self, case, params):
+        with self.conn.cursor() as cur:
+            cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + case["sql"], params)
+            plan = cur.fetchone()[0][0]
+        root = plan["Plan"]
+        return {
+            "executionTimeMillis": plan.get("Execution Time"),
+            "rowsExamined": sum_rows_examined(root),
+            "nReturned": root.get("Actual Rows"),
+            "sharedHitBlocks": root.get("Shared Hit Blocks"),
+            "sharedReadBlocks": root.get("Shared Read Blocks"),
+            "indexUsed": find_index_names(root, None, "Index Name") or first_scan(root),
+        }
+
+    def create_indexes(self, case, names):
+        with self.conn.cursor() as cur:
+            for definition, name in zip(case["indexes"], names):
+                cur.execute(f"CREATE INDEX IF NOT EXISTS {name} {definition}")
+            for table in {index_target(definition)[0] for definition in case["indexes"]}:
+                cur.execute(f"ANALYZE {table}")
+
+    def drop_indexes(self, case, names):
+        with self.conn.cursor() as cur:
+            for name in names:
+                cur.execute(f"DROP INDEX IF EXISTS {name}")
+
+    def hide_equivalents(self, case):
+        """Удаляет индексы с тем же первым столбцом в открытой транзакции;
+        restore_equivalents откатывает ее и возвращает индексы"""
+        self.conn.autocommit = False
+        hidden = []
+        with self.conn.cursor() as cur:
+            for definition in case["indexes"]:
+                table, column = index_target(definition)
+                # Индексы ограничений (PRIMARY KEY, UNIQUE) через DROP INDEX не удалить
+                cur.execute("""
+                    SELECT i.indexrelid::regclass::text
+                    FROM pg_index i
+                    JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]
+                    WHERE i.indrelid = %s::regclass AND a.attname = %s
+                      AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+                      AND i.indexrelid::regclass::text NOT LIKE %s
+                """, (table, column, INDEX_PREFIX + "%"))
+                for (name,) in cur.fetchall():
+                    if name not in hidden:
+                        cur.execute(f"DROP INDEX {name}")
+                        hidden.append(name)
+        return hidden
+
+    def restore_equivalents(self, case, hidden):
+        self.conn.rollback()
+        self.conn.autocommit = True
+
+
+def index_target(definition):
+    """'ON Events (venue_id)' -> ('events', 'venue_id')"""
+    match = re.match(r"ON\s+(\w+)\s*\(\s*(\w+)", definition)
+    return match.group(1).lower(), match.group(2).lower()
+
+
+def find_index_names(stage, stage_name, key):
+    """Имена индексов из дерева плана (этапы MongoDB или узлы PostgreSQL)"""
+    if not stage:
+        return None
+    names = []
+    if key in stage and (stage_name is None or stage.get("stage") == stage_name):
+        names.append(stage[key])
+    for child_key in ("inputStage", "outerStage", "innerStage"):
+        found = find_index_names(stage.get(child_key), stage_name, key)
+        if found:
+            names.append(found)
+    for child in stage.get("inputStages", []) + stage.get("Plans", []):
+        found = find_index_names(child, stage_name, key)
+        if found:
+            names.append(found)
+    return ", ".join(names) if names else None
+
+
+def first_scan(node):
+    """Тип первого узла сканирования, если индексы не используются (Seq Scan)"""
+    if "Scan" in node.get("Node Type", ""):
+        return node["Node Type"]
+    for child in node.get("Plans", []):
+        found = first_scan(child)
+        if found:
+            return found
+    return node.get("Node Type")
+
+
+def sum_rows_examined(node):
+    """Аналог totalDocsExamined: строки, прочитанные узлами сканирования"""
+    total = 0
+    if "Scan" in node.get("Node Type", ""):
+        loops = node.get("Actual Loops", 1)
+        total += (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * loops
+    for child in node.get("Plans", []):
+        total += sum_rows_examined(child)
+    return total
+
+
+def measure(engine, case, params, warmup, iterations):
+    for _ in range(warmup):
+        engine.run(case, params)
+    latencies = [engine.run(case, params) for _ in range(iterations)]
+    return {"latency": summarize(latencies), "plan": engine.explain(case, params)}
+
+
+def run_case(engine, case, params, warmup, iterations, keep_indexes=False):
+    engine_case = case[engine.name]
+    names = [f"{INDEX_PREFIX}{case['name']}_{i}" for i in range(len(engine_case["indexes"]))]
+    engine.drop_indexes(engine_case, names)
+
+    result = {"description": case["description"]}
+    hidden = engine.hide_equivalents(engine_case)
+    try:
+        result["before"] = measure(engine, engine_case, params, warmup, iterations)
+    finally:
+        engine.restore_equivalents(engine_case, hidden)
+    result["hidden"] = hidden
+    engine.create_indexes(engine_case, names)
+    result["after"] = measure(engine, engine_case, params, warmup, iterations)
+    if not keep_indexes:
+        engine.drop_indexes(engine_case, names)
+    return result
+
+
+def print_case(engine_name, name, result):
+    before, after = result["before"], result["after"]
+    print(f"\n[{engine_name}] {name}: {result['description']}")
+    if result.get("hidden"):
+        print(f"   (до: скрыты {', '.join(result['hidden'])})")
+    for phase, data in (("ДО", before), ("ПОСЛЕ", after)):
+        latency, plan = data["latency"], data["plan"]
+        examined = plan.get("totalDocsExamined", plan.get("rowsExamined"))
+        print(f"   {phase:<6} p50 {latency['p50_ms']:>9} мс  p95 {latency['p95_ms']:>9} мс  "
+              f"проверено {examined}  индекс: {plan['indexUsed']}")
+    if after["latency"]["p50_ms"]:
+        print(f"   Ускорение p50: в {before['latency']['p50_ms'] / after['latency']['p50_ms']:.1f} раз")
+
+
+def flatten(report):
+    """{"engine:case:phase": сводка задержек} для сравнения с базой"""
+    flat = {}
+    for engine_name, cases in report["results"].items():
+        for case_name, result in cases.items():
+            for phase in ("before", "after"):
+                flat[f"{engine_name}:{case_name}:{phase}"] = result[phase]["latency"]
+    return flat
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк индексов MongoDB и PostgreSQL")
+    parser.add_argument("--engines", default="mongo", help="mongo,postgres")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--cases", help="имена кейсов через запятую (по умолчанию все)")
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--iterations", type=int, default=30)
+    parser.add_argument("--keep-indexes", action="store_true",
+                        help="не удалять индексы-кандидаты после прогона")
+    parser.add_argument("--output", default="index_benchmark_report.json")
+    parser.add_argument("--baseline", help="сравнить с сохраненным отчетом")
+    parser.add_argument("--save-baseline", help="сохранить отчет как базу")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    engines = []
+    for name in args.engines.split(","):
+        engines.append(MongoEngine(args.mongo_uri) if name == "mongo" else PostgresEngine(args.pg_dsn))
+    selected = set(args.cases.split(",")) if args.cases else None
+    cases = [case for case in CASES if not selected or case["name"] in selected]
+
+    now = datetime.now()
+    report = {
+        "meta": {
+            "started_at": now.isoformat(timespec="seconds"),
+            "warmup": args.warmup,
+            "iterations": args.iterations,
+        },
+        "results": {},
+    }
+
+    print("=== БЕНЧМАРК ИНДЕКСОВ: ДО/ПОСЛЕ ===")
+    for engine in engines:
+        params = engine.params(now)
+        report["results"][engine.name] = {}
+        for case in cases:
+            result = run_case(engine, case, params, args.warmup, args.iterations, args.keep_indexes)
+            report["results"][engine.name][case["name"]] = result
+            print_case(engine.name, case["name"], result)
+
+    save_report(args.output, report)
+    print(f"\nОтчет: {args.output}")
+    if args.save_baseline:
+        save_report(args.save_baseline, report)
+        print(f"База сохранена: {args.save_baseline}")
+
+    if args.baseline:
+        rows = compare(flatten(load_report(args.baseline)), flatten(report), threshold=args.threshold)
+        print()
+        print_comparison(rows)
+        if any(regressed for *_, regressed in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
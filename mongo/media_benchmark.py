@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# media_benchmark.py - Каталог мероприятий: большие поля внутри строки/документа и снаружи
+#
+# Строятся две копии каталога с одинаковыми данными:
+#   inline - описание (--description-bytes) и афиша (--poster-bytes) лежат в
+#            строке / документе мероприятия;
+#   refs   - в каталоге превью и ссылка, содержимое в отдельной таблице /
+#            коллекции (как делает event_media.py).
+# Для каждой копии замеряются скан каталога (только карточные поля) и
+# страница каталога с описанием, размеры хранения, а также объем, который
+# скан занимает в кэше: прочитанные/найденные в shared buffers блоки из
+# EXPLAIN (ANALYZE, BUFFERS) для PostgreSQL и байты коллекции в кэше
+# WiredTiger для MongoDB. Таблицы/коллекции с префиксом media_bench_
+# удаляются после прогона (если не указан --keep).
+#
+# Пример:
+#   python3 media_benchmark.py --engines mongo,postgres --pg-dsn "dbname=event_booking" --rows 10000
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchstats import save_report, summarize
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+PREFIX = 'media_bench_'
+PREVIEW_CHARS = 200
+BLOCK_SIZE = 8192
+WORDS = ["концерт", "сцена", "зал", "оркестр", "премьера", "билеты", "гастроли", "артист",
+         "программа", "антракт", "фестиваль", "выставка", "спектакль", "матч", "трибуна"]
+
+
+def make_rows(args):
+    """Одинаковые данные для обоих движков и обеих раскладок"""
+    rng = random.Random(args.seed)
+    start = datetime.now()
+    for number in range(1, args.rows + 1):
+        words = []
+        while sum(len(w) + 1 for w in words) * 2 < args.description_bytes:
+            words.append(rng.choice(WORDS))
+        yield {
+            "id": number,
+            "title": f"{rng.choice(WORDS).capitalize()} #{number}",
+            "date": start + timedelta(minutes=rng.randrange(90 * 24 * 60)),
+            "price": round(rng.uniform(500, 10000), 2),
+            "description": " ".join(words),
+            "poster": os.urandom(args.poster_bytes) if args.poster_bytes else b"",
+        }
+
+
+def timed(func, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return summarize(latencies)
+
+
+class PostgresBench:
+    def __init__(self, args):
+        import psycopg2
+        self.conn = psycopg2.connect(args.pg_dsn)
+        self.conn.autocommit = True
+        self.cur = self.conn.cursor()
+
+    def load(self, args):
+        cur = self.cur
+        cur.execute(f"""
+            DROP TABLE IF EXISTS {PREFIX}inline, {PREFIX}refs, {PREFIX}payloads;
+            CREATE TABLE {PREFIX}inline (
+                event_id INTEGER PRIMARY KEY, title VARCHAR(255), event_date TIMESTAMP,
+                base_price DECIMAL(10,2), description TEXT, poster BYTEA);
+            CREATE TABLE {PREFIX}payloads (
+                media_id SERIAL PRIMARY KEY, event_id INTEGER, kind VARCHAR(20), data BYTEA);
+            CREATE TABLE {PREFIX}refs (
+                event_id INTEGER PRIMARY KEY, title VARCHAR(255), event_date TIMESTAMP,
+                base_price DECIMAL(10,2), description TEXT, description_media_id INTEGER,
+                poster_media_id INTEGER);
+        """)
+        # Хранение как в lab2/08_event_media.sql: содержимое без сжатия, inline-поля - lz4,
+        # там, где сервер его поддерживает
+        cur.execute(f"""
+            ALTER TABLE {PREFIX}payloads ALTER COLUMN data SET STORAGE EXTERNAL;
+            DO $$ BEGIN
+                ALTER TABLE {PREFIX}inline ALTER COLUMN description SET COMPRESSION lz4;
+                ALTER TABLE {PREFIX}inline ALTER COLUMN poster SET COMPRESSION lz4;
+            EXCEPTION WHEN feature_not_supported THEN NULL;
+            END $$;
+        """)
+        for row in make_rows(args):
+            cur.execute(f"INSERT INTO {PREFIX}inline VALUES (%s, %s, %s, %s, %s, %s)",
+                        (row["id"], row["title"], row["date"], row["price"], row["description"], row["poster"]))
+            cur.execute(f"INSERT INTO {PREFIX}payloads (event_id, kind, data) "
+                        f"VALUES (%s, 'description', convert_to(%s, 'UTF8')) RETURNING media_id",
+                        (row["id"], row["description"]))
+            description_id = cur.fetchone()[0]
+            poster_id = None
+            if row["poster"]:
+                cur.execute(f"INSERT INTO {PREFIX}payloads (event_id, kind, data) "
+                            f"VALUES (%s, 'poster', %s) RETURNING media_id", (row["id"], row["poster"]))
+                poster_id = cur.fetchone()[0]
+            cur.execute(f"INSERT INTO {PREFIX}refs VALUES (%s, %s, %s, %s, %s, %s, %s)",
+                        (row["id"], row["title"], row["date"], row["price"],
+                         row["description"][:PREVIEW_CHARS], description_id, poster_id))
+        cur.execute(f"VACUUM ANALYZE {PREFIX}inline, {PREFIX}refs, {PREFIX}payloads")
+
+    def storage(self, table):
+        self.cur.execute("""
+            SELECT pg_relation_size(c.oid), COALESCE(pg_relation_size(c.reltoastrelid), 0),
+                   pg_total_relation_size(c.oid)
+            FROM pg_class c WHERE c.relname = %s
+        """, (table,))
+        heap, toast, total = self.cur.fetchone()
+        return {"heap_bytes": heap, "toast_bytes": toast, "total_bytes": total}
+
+    def buffers(self, sql):
+        """Блоки, которые запрос берет из shared buffers или читает в них"""
+        self.cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql)
+        plan = self.cur.fetchone()[0][0]["Plan"]
+        blocks = plan.get("Shared Hit Blocks", 0) + plan.get("Shared Read Blocks", 0)
+        return {"blocks": blocks, "bytes": blocks * BLOCK_SIZE}
+
+    def run(self, layout, args):
+        table = PREFIX + layout
+        scan = f"SELECT event_id, title, event_date, base_price FROM {table}"
+        page = f"SELECT event_id, title, event_date, base_price, description FROM {table} ORDER BY event_date LIMIT 100"
+
+        def execute(sql):
+            self.cur.execute(sql)
+            self.cur.fetchall()
+
+        return {
+            "storage": self.storage(table),
+            "catalog_scan": timed(lambda: execute(scan), args.iterations),
+            "catalog_page": timed(lambda: execute(page), args.iterations),
+            "cache_footprint": {"catalog_scan": self.buffers(scan), "catalog_page": self.buffers(page)},
+        }
+
+    def cleanup(self):
+        self.cur.execute(f"DROP TABLE IF EXISTS {PREFIX}inline, {PREFIX}refs, {PREFIX}payloads")
+        self.conn.close()
+
+
+class MongoBench:
+    def __init__(self, args):
+        from pymongo import MongoClient
+        self.db = MongoClient(args.mongo_uri)[DB_NAME]
+
+    def load(self, args):
+        from bson import Binary
+        for name in ("inline", "refs", "payloads"):
+            self.db.drop_collection(PREFIX + name)
+        inline, refs, payloads = [], [], []
+        for row in make_rows(args):
+            inline.append({"_id": row["id"], "title": row["title"], "date": row["date"], "price": row["price"],
+                           "description": row["description"], "poster": Binary(row["poster"])})
+            description_id, poster_id = row["id"] * 2, row["id"] * 2 + 1
+            payloads.append({"_id": description_id, "event_id": row["id"], "kind": "description",
+                             "data": row["description"]})
+            payloads.append({"_id": poster_id, "event_id": row["id"], "kind": "poster",
+                             "data": Binary(row["poster"])})
+            refs.append({"_id": row["id"], "title": row["title"], "date": row["date"], "price": row["price"],
+                         "description": row["description"][:PREVIEW_CHARS],
+                         "description_file_id": description_id, "media": [{"file_id": poster_id, "kind": "poster"}]})
+            if len(inline) >= 1000:
+                self._flush(inline, refs, payloads)
+        self._flush(inline, refs, payloads)
+
+    def _flush(self, inline, refs, payloads):
+        for name, docs in (("inline", inline), ("refs", refs), ("payloads", payloads)):
+            if docs:
+                self.db[PREFIX + name].insert_many(docs, ordered=False)
+            docs.clear()
+
+    def storage(self, name):
+        stats = self.db.command("collStats", name)
+        return {"size_bytes": stats["size"], "storage_bytes": stats["storageSize"],
+                "index_bytes": stats["totalIndexSize"]}
+
+    def cache_bytes(self, name):
+        stats = self.db.command("collStats", name)
+        return stats.get("wiredTiger", {}).get("cache", {}).get("bytes currently in the cache", 0)
+
+    def run(self, layout, args):
+        collection = self.db[PREFIX + layout]
+        scan_fields = {"title": 1, "date": 1, "price": 1}
+        page_fields = dict(scan_fields, description=1)
+        result = {
+            "storage": self.storage(collection.name),
+            "catalog_scan": timed(lambda: list(collection.find({}, scan_fields)), args.iterations),
+            "catalog_page": timed(lambda: list(collection.find({}, page_fields).sort("date", 1).limit(100)),
+                                  args.iterations),
+        }
+        # Проекция не спасает: WiredTiger читает в кэш документ целиком
+        result["cache_footprint"] = {"collection_bytes_in_cache": self.cache_bytes(collection.name)}
+        return result
+
+    def cleanup(self):
+        for name in ("inline", "refs", "payloads"):
+            self.db.drop_collection(PREFIX + name)
+        self.db.client.close()
+
+
+ENGINES = {"postgres": PostgresBench, "mongo": MongoBench}
+
+
+def print_results(engine, results):
+    print(f"\n=== {engine} ===")
+    for layout, result in results.items():
+        scan, page = result["catalog_scan"], result["catalog_page"]
+        print(f"  {layout:<7} скан каталога p50 {scan['p50_ms']} мс, p95 {scan['p95_ms']} мс; "
+              f"страница p50 {page['p50_ms']} мс")
+        print(f"          хранение {result['storage']}")
+        print(f"          кэш {result['cache_footprint']}")
+    inline, refs = results["inline"]["catalog_scan"], results["refs"]["catalog_scan"]
+    if refs["p50_ms"]:
+        print(f"  Скан каталога: inline / refs = {inline['p50_ms'] / refs['p50_ms']:.2f} (p50)")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк каталога: большие поля внутри и снаружи")
+    parser.add_argument("--engines", default="mongo,postgres")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--description-bytes", type=int, default=1800,
+                        help="размер описания; ~2 КБ - меньше порога TOAST, остается в строке")
+    parser.add_argument("--poster-bytes", type=int, default=65536)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--keep", action="store_true", help="не удалять таблицы/коллекции после прогона")
+    parser.add_argument("--output", default="media_benchmark.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    report = {"meta": {"rows": args.rows, "description_bytes": args.description_bytes,
+                       "poster_bytes": args.poster_bytes,
+                       "started_at": datetime.now().isoformat(timespec="seconds")}}
+    for engine in args.engines.split(","):
+        bench = ENGINES[engine](args)
+        print(f"{engine}: загрузка {args.rows} мероприятий...")
+        bench.load(args)
+        results = {layout: bench.run(layout, args) for layout in ("inline", "refs")}
+        results["payload_storage"] = bench.storage(PREFIX + "payloads")
+        if not args.keep:
+            bench.cleanup()
+        print_results(engine, {k: v for k, v in results.items() if k in ("inline", "refs")})
+        report[engine] = results
+    save_report(args.output, report)
+    print(f"\nОтчет: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
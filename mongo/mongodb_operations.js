@@ -309,7 +309,8 @@ function step2_updateSetInc() {
             quantity: 2,
             total_amount: 3000,
             status: "pending",
-            created_at: new Date()
+            created_at: new Date(),
+            written_at: new Date()
         },
         {
             user_id: testData.userId,
@@ -318,7 +319,8 @@ function step2_updateSetInc() {
             quantity: 1,
             total_amount: 5000,
             status: "pending",
-            created_at: new Date()
+            created_at: new Date(),
+            written_at: new Date()
         }
     ];
     
@@ -331,7 +333,7 @@ function step2_updateSetInc() {
         { status: "pending" },
         {
             $inc: { total_amount: 500 },
-            $set: { updated_at: new Date() }
+            $set: { updated_at: new Date(), written_at: new Date() }
         }
     );
     
@@ -361,14 +363,26 @@ function step3_updatePushAddToSet() {
         {
             $push: {
                 favorites: testData.eventIds[0],
+                // В документе только последние 10 просмотров, полный лог - user_activity_logs
                 "view_history": {
-                    event_id: testData.eventIds[0],
-                    viewed_at: new Date(),
-                    duration_seconds: 120
+                    $each: [{
+                        event_id: testData.eventIds[0],
+                        viewed_at: new Date(),
+                        duration_seconds: 120
+                    }],
+                    $sort: { viewed_at: 1 },
+                    $slice: -10
                 }
             }
         }
     );
+    db.user_activity_logs.insertOne({
+        timestamp: new Date(),
+        meta: { user_id: testData.userId, event_id: testData.eventIds[0] },
+        action: "view",
+        details: { duration_seconds: 120 },
+        written_at: new Date()
+    });
     
     print(`Добавлено мероприятие в избранное пользователя`);
     
@@ -0,0 +1,654 @@
+#!/usr/bin/env python3
+# pg_cdc.py - CDC: изменения Bookings, Transactions и Events из PostgreSQL в документы MongoDB
+#
+# PostgreSQL остается единственным местом записи, MongoDB отдает быстрые
+# чтения, двойной записи из приложения нет. Изменения читаются из слота
+# логической репликации (встроенный плагин pgoutput, публикация mongo_cdc)
+# и применяются к документам:
+#   - bookings                 - копия бронирования;
+#   - users.booking_history    - последние BOOKING_HISTORY_LIMIT бронирований,
+#                                статус бронирования и оплаты;
+#   - users.stats              - total_bookings, total_spent, last_booking_date;
+#   - events.ticket_types.sold - билеты подтвержденных бронирований
+#                                (available_seats меняется на ту же величину);
+#   - events                   - название, описание, дата, площадка, организатор;
+#                                новое название попадает и в booking_history.
+# Строки из сгенерированного набора (id не больше размера из --scale) находятся
+# по детерминированным ObjectId из datagen.DataSpec - с теми же --seed/--scale/
+# --anchor, с которыми данные загружались generate_data.py и lab2/load_data.py;
+# при запуске это проверяется по первым и последним документам. Строкам,
+# созданным в PostgreSQL после загрузки, выдаются новые ObjectId (время в них -
+# время обработки), соответствие хранится в коллекции pg_cdc_ids.
+#
+# Изменения применяются упорядоченными bulk_write микропакетами из целых
+# транзакций. Повтор пакета после сбоя ничего не портит: $set/$pull по
+# ключу идемпотентны, а счетчики ($inc) защищены позицией изменения (LSN
+# коммита + номер операции в транзакции) - документ хранит cdc_pos последней
+# примененной операции, и повтор не проходит фильтр. Для $inc нужны старые
+# значения строк, поэтому --setup включает REPLICA IDENTITY FULL на таблицах и
+# их секциях (новые секции получают его в create_month_partition из
+# lab2/09_partitioning.sql).
+# После пакета LSN конца последней транзакции записывается в dashboard_state
+# (_id 'pg_cdc') и подтверждается слоту (send_feedback): PostgreSQL может
+# удалить прочитанный WAL, а после перезапуска чтение продолжится с чекпоинта.
+# Перенос строк из DEFAULT-секции в новую (lab2/partition_maintenance.py) помечен
+# сообщением partition_move и пропускается - бронирования не меняются.
+# После convert_to_partitioned нужен повторный --setup: таблицы новые.
+# Метрики для Prometheus (/metrics, порт 9219): отставание в секундах и
+# байтах WAL, примененные изменения, пакеты.
+#
+# Требования: wal_level = logical, PostgreSQL 14+, право REPLICATION.
+# Начальное состояние MongoDB - те же сгенерированные данные; слот создается
+# (--setup) до начала записей в PostgreSQL.
+#
+# Примеры:
+#   python3 pg_cdc.py --pg-dsn "dbname=event_booking" --setup
+#   python3 pg_cdc.py --pg-dsn "dbname=event_booking" --listen 0.0.0.0:9219
+#   python3 pg_cdc.py --pg-dsn "dbname=event_booking" --drop
+#   python3 -m doctest pg_cdc.py     # граница повтора транзакций
+import argparse
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import psycopg2
+from bson import ObjectId
+from psycopg2.extras import LogicalReplicationConnection
+from pymongo import DeleteOne, MongoClient, ReturnDocument, UpdateMany, UpdateOne
+
+from booking_history import history_push
+from datagen import BOOKING_STATUS_IDS, PAYMENT_METHOD_IDS, TICKET_TYPE_IDS, add_spec_arguments, spec_from_args
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lab5'))
+from promtext import render  # noqa: E402
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+SLOT = 'mongo_cdc'
+PUBLICATION = 'mongo_cdc'
+STATE = 'dashboard_state'
+STATE_ID = 'pg_cdc'
+# (таблица, id строки) -> ObjectId для строк вне сгенерированного набора
+ID_MAP = 'pg_cdc_ids'
+TABLES = ('bookings', 'transactions', 'events')
+# Кэши ChangeMapper (ObjectId и названия мероприятий) сбрасываются при этом размере
+CACHE_SIZE = 100000
+MOVE_PREFIX = 'partition_move'
+
+# Билеты считаются проданными только у подтвержденных бронирований (как в reservations.py)
+SOLD_STATUSES = {"confirmed"}
+STATUS_NAMES = {v: k for k, v in BOOKING_STATUS_IDS.items()}
+TICKET_TYPES = {v: k for k, v in TICKET_TYPE_IDS.items()}
+PAYMENT_METHODS = {v: k for k, v in PAYMENT_METHOD_IDS.items()}
+
+PG_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+
+# ---------- pgoutput ----------
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 1
+
+    def unpack(self, fmt):
+        value = struct.unpack_from(fmt, self.data, self.pos)[0]
+        self.pos += struct.calcsize(fmt)
+        return value
+
+    def char(self):
+        self.pos += 1
+        return chr(self.data[self.pos - 1])
+
+    def string(self):
+        end = self.data.index(b"\0", self.pos)
+        value = self.data[self.pos:end].decode()
+        self.pos = end + 1
+        return value
+
+    def tuple(self, columns):
+        """TupleData: значения в текстовом виде; неизмененные TOAST-значения ('u') пропускаются"""
+        row = {}
+        for column in columns[:self.unpack(">h")]:
+            kind = self.char()
+            if kind == "n":
+                row[column] = None
+            elif kind == "t":
+                length = self.unpack(">i")
+                row[column] = self.data[self.pos:self.pos + length].decode()
+                self.pos += length
+        return row
+
+
+def decode(payload, relations):
+    """Сообщение pgoutput (протокол 1) -> (тип, поля); описания таблиц копятся в relations"""
+    r = Reader(payload)
+    kind = chr(payload[0])
+    if kind == "B":
+        final_lsn = r.unpack(">Q")
+        return kind, {"final_lsn": final_lsn, "commit_time": PG_EPOCH + timedelta(microseconds=r.unpack(">q"))}
+    if kind == "C":
+        r.unpack(">b")
+        return kind, {"commit_lsn": r.unpack(">Q"), "end_lsn": r.unpack(">Q")}
+    if kind == "R":
+        relid = r.unpack(">I")
+        r.string()
+        name = r.string()
+        r.unpack(">b")
+        columns = []
+        for _ in range(r.unpack(">h")):
+            r.unpack(">b")
+            columns.append(r.string())
+            r.unpack(">I")
+            r.unpack(">i")
+        relations[relid] = (name, columns)
+        return kind, {"table": name}
+    if kind in "IUD":
+        name, columns = relations[r.unpack(">I")]
+        old = new = None
+        marker = r.char()
+        if marker in "KO":
+            old = r.tuple(columns)
+            if kind == "U":
+                marker = r.char()
+        if marker == "N":
+            new = r.tuple(columns)
+            if old:
+                # С REPLICA IDENTITY FULL пропущенные TOAST-значения есть в старой строке
+                new = dict(old, **new)
+        return kind, {"table": name, "old": old, "new": new}
+    if kind == "M":
+        r.unpack(">b")
+        r.unpack(">Q")
+        return kind, {"prefix": r.string()}
+    return kind, {}
+
+
+def replayed(final_lsn, checkpoint):
+    """Транзакция уже применена: чекпоинт - end_lsn последнего примененного
+    коммита, а коммит следующей транзакции может начинаться ровно на нем.
+
+    >>> begin = struct.pack(">cQqI", b"B", 0x16B3748, 0, 731)
+    >>> replayed(decode(begin, {})[1]["final_lsn"], checkpoint=0x16B3748)
+    False
+    >>> replayed(0x16B3747, checkpoint=0x16B3748)
+    True
+    """
+    return final_lsn < checkpoint
+
+
+def lsn_text(lsn):
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+
+def parse_time(value):
+    return datetime.fromisoformat(value) if value else None
+
+
+# ---------- изменения -> операции MongoDB ----------
+
+def booking_view(row):
+    if row is None:
+        return None
+    return {
+        "id": int(row["booking_id"]),
+        "user_id": int(row["user_id"]) if row["user_id"] else None,
+        "event_id": int(row["event_id"]) if row["event_id"] else None,
+        "ticket_type": TICKET_TYPES.get(int(row["ticket_type_id"])) if row["ticket_type_id"] else None,
+        "status": STATUS_NAMES.get(int(row["status_id"])) if row["status_id"] else None,
+        "date": parse_time(row["booking_date"]),
+        "quantity": int(row["quantity"] or 1),
+        "amount": float(row["total_amount"] or 0),
+    }
+
+
+class ChangeMapper:
+    """Строит операции MongoDB для изменений одной транзакции"""
+
+    def __init__(self, spec, id_map, events):
+        self.spec = spec
+        self.id_map = id_map
+        self.events = events
+        self.ids = {}
+        self.titles = {}
+
+    def oid(self, kind, number):
+        if number <= self.spec.sizes[kind]:
+            return self.spec.object_id(kind, number)
+        # Строка создана после загрузки: ObjectId выдается один раз и запоминается,
+        # повтор транзакции после сбоя получает тот же _id
+        key = f"{kind}:{number}"
+        if key not in self.ids:
+            if len(self.ids) >= CACHE_SIZE:
+                self.ids.clear()
+            self.ids[key] = self.id_map.find_one_and_update(
+                {"_id": key}, {"$setOnInsert": {"oid": ObjectId(), "created_at": datetime.now()}},
+                upsert=True, return_document=ReturnDocument.AFTER)["oid"]
+        return self.ids[key]
+
+    def title(self, event_id):
+        """Название мероприятия для booking_history - из events, с кэшем"""
+        if event_id not in self.titles:
+            if len(self.titles) >= CACHE_SIZE:
+                self.titles.clear()
+            event = self.events.find_one({"_id": self.oid("events", event_id)}, {"title": 1})
+            self.titles[event_id] = event.get("title") if event else None
+        return self.titles[event_id]
+
+    def start(self, final_lsn, commit_time):
+        self.final_lsn = final_lsn
+        self.commit_time = commit_time.replace(tzinfo=None)
+        self.seq = 0
+
+    def guarded(self, query, update):
+        """Счетчики: операция проходит, только если документ еще не видел эту позицию"""
+        self.seq += 1
+        position = f"{self.final_lsn:016X}:{self.seq:08X}"
+        update.setdefault("$set", {})["cdc_pos"] = position
+        return dict(query, cdc_pos={"$not": {"$gte": position}}), update
+
+    def changes(self, table, old, new):
+        """[(коллекция, операция)] для одного изменения строки"""
+        if table == "bookings":
+            return self.booking(booking_view(old), booking_view(new))
+        if table == "transactions":
+            return self.transaction(old, new)
+        if table == "events":
+            return self.event(old, new)
+        return []
+
+    def booking(self, old, new):
+        ops = []
+        booking_id = self.oid("bookings", (new or old)["id"])
+        if new and new["user_id"] and new["event_id"]:
+            ops.append(("bookings", UpdateOne({"_id": booking_id}, {"$set": {
+                "user_id": self.oid("users", new["user_id"]),
+                "event_id": self.oid("events", new["event_id"]),
+                "ticket_type": new["ticket_type"],
+                "quantity": new["quantity"],
+                "total_amount": new["amount"],
+                "status": new["status"],
+                "created_at": new["date"],
+                "updated_at": self.commit_time,
+                "written_at": datetime.now(),
+            }}, upsert=True)))
+        elif old and not new:
+            ops.append(("bookings", DeleteOne({"_id": booking_id})))
+
+        # Пользователь: бронирование ушло от old.user_id и/или пришло к new.user_id
+        same_user = old and new and old["user_id"] == new["user_id"]
+        if same_user and new["user_id"]:
+            user_id = self.oid("users", new["user_id"])
+            query, update = self.guarded({"_id": user_id}, {
+                "$inc": {"stats.total_spent": new["amount"] - old["amount"]},
+                "$max": {"stats.last_booking_date": new["date"]},
+            })
+            ops.append(("users", UpdateOne(query, update)))
+            # Записи может уже не быть в истории (вытеснена $slice) - счетчики от этого не зависят
+            ops.append(("users", UpdateOne({"_id": user_id, "booking_history.booking_id": booking_id}, {"$set": {
+                "booking_history.$.status": new["status"], "booking_history.$.amount": new["amount"]}})))
+        else:
+            if old and old["user_id"]:
+                query, update = self.guarded({"_id": self.oid("users", old["user_id"])}, {
+                    "$inc": {"stats.total_bookings": -1, "stats.total_spent": -old["amount"]},
+                    "$pull": {"booking_history": {"booking_id": booking_id}},
+                })
+                ops.append(("users", UpdateOne(query, update)))
+            if new and new["user_id"]:
+                entry = {
+                    "booking_id": booking_id,
+                    "event_id": self.oid("events", new["event_id"]) if new["event_id"] else None,
+                    "event_title": self.title(new["event_id"]) if new["event_id"] else None,
+                    "date": new["date"],
+                    "status": new["status"],
+                    "amount": new["amount"],
+                }
+                query, update = self.guarded({"_id": self.oid("users", new["user_id"])}, {
+                    "$inc": {"stats.total_bookings": 1, "stats.total_spent": new["amount"]},
+                    "$max": {"stats.last_booking_date": new["date"]},
+                    "$push": {"booking_history": history_push([entry])},
+                })
+                ops.append(("users", UpdateOne(query, update)))
+
+        # Проданные билеты по (мероприятие, тип билета)
+        sold = {}
+        for view, sign in ((old, -1), (new, 1)):
+            if view and view["event_id"] and view["ticket_type"] and view["status"] in SOLD_STATUSES:
+                key = (view["event_id"], view["ticket_type"])
+                sold[key] = sold.get(key, 0) + sign * view["quantity"]
+        for (event_id, ticket_type), delta in sold.items():
+            if delta:
+                query, update = self.guarded(
+                    {"_id": self.oid("events", event_id), "ticket_types.type": ticket_type},
+                    {"$inc": {"ticket_types.$.sold": delta, "available_seats": -delta}})
+                ops.append(("events", UpdateOne(query, update)))
+        return ops
+
+    def transaction(self, old, new):
+        row = new or old
+        if not row["booking_id"]:
+            return []
+        booking_id = self.oid("bookings", int(row["booking_id"]))
+        if new is None:
+            return [("bookings", UpdateOne({"_id": booking_id}, {"$unset": {"payment_status": "",
+                                                                              "payment_method": ""}})),
+                    ("users", UpdateOne({"booking_history.booking_id": booking_id},
+                                        {"$unset": {"booking_history.$.payment_status": ""}}))]
+        method = PAYMENT_METHODS.get(int(new["method_id"])) if new["method_id"] else None
+        return [
+            ("bookings", UpdateOne({"_id": booking_id}, {"$set": {
+                "transaction_id": f"TXN{int(new['transaction_id']):09d}",
+                "payment_method": method,
+                "payment_status": new["status"],
+            }})),
+            ("users", UpdateOne({"booking_history.booking_id": booking_id},
+                                {"$set": {"booking_history.$.payment_status": new["status"]}})),
+        ]
+
+    def event(self, old, new):
+        event_id = int((new or old)["event_id"])
+        oid = self.oid("events", event_id)
+        if new is None:
+            self.titles.pop(event_id, None)
+            return [("events", DeleteOne({"_id": oid}))]
+        # Документ обновится только при записи пакета, а бронирования той же
+        # транзакции должны получить новое название уже сейчас
+        self.titles[event_id] = new["title"]
+        fields = {
+            "title": new["title"],
+            "date": parse_time(new["event_date"]),
+            "updated_at": self.commit_time,
+        }
+        if new["description"] is not None:
+            fields["description"] = new["description"]
+        if new["venue_id"]:
+            fields["venue_id"] = self.oid("venues", int(new["venue_id"]))
+        if new["organizer_id"]:
+            fields["organizer_id"] = self.oid("organizers", int(new["organizer_id"]))
+        # У мероприятия из PostgreSQL нет категорий, типов билетов и статуса:
+        # новое мероприятие появляется черновиком, остальное заполняет каталог
+        ops = [("events", UpdateOne({"_id": oid}, {
+            "$set": fields,
+            "$setOnInsert": {"status": "draft", "categories": [], "tags": [], "ticket_types": [],
+                             "created_at": parse_time(new["created_at"]) or self.commit_time},
+        }, upsert=True))]
+        if old and old["title"] != new["title"]:
+            ops.append(("users", UpdateMany({"booking_history.event_id": oid},
+                                            {"$set": {"booking_history.$[h].event_title": new["title"]}},
+                                            array_filters=[{"h.event_id": oid}])))
+        return ops
+
+
+# ---------- PostgreSQL ----------
+
+def setup(dsn):
+    """Публикация и REPLICA IDENTITY FULL на таблицах и всех их секциях"""
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SHOW wal_level")
+        if cur.fetchone()[0] != "logical":
+            raise SystemExit("нужен wal_level = logical (postgresql.conf, перезапуск сервера)")
+        for table in TABLES:
+            cur.execute("""
+                SELECT c.oid::regclass::text FROM pg_class c
+                WHERE (c.oid = %s::regclass OR c.oid IN (SELECT relid FROM pg_partition_tree(%s::regclass)))
+                  AND c.relreplident <> 'f'
+            """, (table, table))
+            for (relation,) in cur.fetchall():
+                cur.execute(f"ALTER TABLE {relation} REPLICA IDENTITY FULL")
+                print(f"  {relation}: REPLICA IDENTITY FULL")
+        cur.execute("SELECT 1 FROM pg_publication WHERE pubname = %s", (PUBLICATION,))
+        if cur.fetchone():
+            # convert_to_partitioned заменяет таблицы - публикация должна указывать на новые
+            cur.execute(f"ALTER PUBLICATION {PUBLICATION} SET TABLE {', '.join(TABLES)}")
+        else:
+            # Изменения секций публикуются от имени родительской таблицы
+            cur.execute(f"CREATE PUBLICATION {PUBLICATION} FOR TABLE {', '.join(TABLES)} "
+                        "WITH (publish_via_partition_root = true)")
+            print(f"  публикация {PUBLICATION} создана")
+    conn.close()
+
+
+def ensure_slot(dsn):
+    """Создает слот при необходимости; возвращает подтвержденный LSN слота"""
+    conn = psycopg2.connect(dsn)
+    with conn, conn.cursor() as cur:
+        cur.execute("SELECT confirmed_flush_lsn FROM pg_replication_slots WHERE slot_name = %s", (SLOT,))
+        row = cur.fetchone()
+        if not row:
+            cur.execute("SELECT lsn FROM pg_create_logical_replication_slot(%s, 'pgoutput')", (SLOT,))
+            row = cur.fetchone()
+            print(f"  слот {SLOT} создан с {row[0]}")
+    conn.close()
+    high, low = row[0].split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+def check_spec(db, spec):
+    """Сгенерированные документы должны иметь те _id, которые дает spec"""
+    for kind in ("users", "events", "bookings"):
+        numbers = (1, spec.sizes[kind])
+        if not db[kind].find_one({"_id": {"$in": [spec.object_id(kind, n) for n in numbers]}}, {"_id": 1}):
+            raise SystemExit(f"в {kind} нет документов #{numbers[0]} и #{numbers[1]} с ожидаемыми _id: "
+                             f"данные MongoDB загружены с другими --seed/--scale/--anchor "
+                             f"(сейчас --anchor {spec.anchor:%Y-%m-%d}; нужна дата, "
+                             f"напечатанная generate_data.py)")
+
+
+def drop(dsn, db):
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("SELECT pg_drop_replication_slot(slot_name) FROM pg_replication_slots WHERE slot_name = %s",
+                    (SLOT,))
+        cur.execute(f"DROP PUBLICATION IF EXISTS {PUBLICATION}")
+    conn.close()
+    db[STATE].delete_one({"_id": STATE_ID})
+    print(f"Слот и публикация {SLOT} удалены, чекпоинт сброшен")
+
+
+# ---------- применение ----------
+
+class Applier:
+    def __init__(self, args):
+        self.db = MongoClient(args.uri)[DB_NAME]
+        self.spec = spec_from_args(args)
+        self.mapper = ChangeMapper(self.spec, self.db[ID_MAP], self.db.events)
+        self.args = args
+        self.lock = threading.Lock()
+        self.applied = {table: 0 for table in TABLES}
+        self.skipped = 0
+        self.batches = 0
+        self.lag_seconds = 0.0
+        self.lag_bytes = 0
+        self.up = 0
+        state = self.db[STATE].find_one({"_id": STATE_ID}) or {}
+        self.checkpoint = state.get("lsn", 0)
+
+    def ensure_indexes(self):
+        # Поиск записи истории по бронированию и по мероприятию
+        self.db.users.create_index("booking_history.booking_id")
+        self.db.users.create_index("booking_history.event_id")
+
+    def flush(self, batch):
+        """Пакет: [(end_lsn, commit_time, [(коллекция, операция)], {таблица: изменений})]"""
+        if not batch:
+            return
+        ops = [op for _, _, txn_ops, _ in batch for op in txn_ops]
+        # Порядок важен только внутри документа, а документ всегда в одной коллекции
+        for collection in ("bookings", "users", "events"):
+            requests = [request for name, request in ops if name == collection]
+            if requests:
+                self.db[collection].bulk_write(requests, ordered=True)
+        end_lsn, commit_time = batch[-1][0], batch[-1][1]
+        self.db[STATE].update_one({"_id": STATE_ID}, {"$set": {
+            "lsn": end_lsn, "lsn_text": lsn_text(end_lsn), "commit_time": commit_time.replace(tzinfo=None),
+            "updated_at": datetime.now(),
+        }}, upsert=True)
+        with self.lock:
+            self.checkpoint = end_lsn
+            self.batches += 1
+            for _, _, _, counts in batch:
+                for table, count in counts.items():
+                    self.applied[table] += count
+            self.lag_seconds = max(0.0, (datetime.now(timezone.utc) - commit_time).total_seconds())
+        batch.clear()
+
+    def run(self):
+        conn = psycopg2.connect(self.args.pg_dsn, connection_factory=LogicalReplicationConnection)
+        cur = conn.cursor()
+        cur.start_replication(slot_name=SLOT, decode=False, start_lsn=self.checkpoint, options={
+            "proto_version": "1", "publication_names": PUBLICATION, "messages": "true"})
+        print(f"Репликация из слота {SLOT} с {lsn_text(self.checkpoint)}")
+        self.up = 1
+        relations, batch, txn = {}, [], None
+        changes, started = 0, time.monotonic()
+        try:
+            while True:
+                msg = cur.read_message()
+                if msg is None:
+                    if batch and time.monotonic() - started >= self.args.batch_ms / 1000:
+                        self.commit(cur, batch)
+                        changes = 0
+                    if not batch and txn is None:
+                        # Все отправленное сервером применено: отставания нет, а слот
+                        # может не держать WAL, записанный без наших таблиц
+                        self.caught_up(cur)
+                    select.select([cur], [], [], self.args.batch_ms / 1000)
+                    continue
+                kind, fields = decode(msg.payload, relations)
+                if kind == "B":
+                    txn = {"ops": [], "counts": {}, "replay": replayed(fields["final_lsn"], self.checkpoint),
+                           "move": False, "commit_time": fields["commit_time"]}
+                    self.mapper.start(fields["final_lsn"], fields["commit_time"])
+                elif kind == "M" and fields["prefix"] == MOVE_PREFIX and txn:
+                    txn["move"] = True
+                elif kind in "IUD" and txn and not txn["replay"]:
+                    txn["ops"] += self.mapper.changes(fields["table"], fields["old"], fields["new"])
+                    txn["counts"][fields["table"]] = txn["counts"].get(fields["table"], 0) + 1
+                elif kind == "C" and txn:
+                    if txn["replay"] or txn["move"]:
+                        with self.lock:
+                            self.skipped += 1
+                    if not txn["replay"]:
+                        if not batch:
+                            started = time.monotonic()
+                        # Перенос секций только сдвигает чекпоинт
+                        ops = [] if txn["move"] else txn["ops"]
+                        counts = {} if txn["move"] else txn["counts"]
+                        batch.append((fields["end_lsn"], txn["commit_time"], ops, counts))
+                        changes += len(ops)
+                    txn = None
+                    if changes >= self.args.batch_size:
+                        self.commit(cur, batch)
+                        changes = 0
+                elif kind == "T":
+                    print("  TRUNCATE в PostgreSQL не переносится: пересоберите данные MongoDB")
+        finally:
+            self.up = 0
+            conn.close()
+
+    def commit(self, cur, batch):
+        """Пакет в MongoDB, затем подтверждение слоту: WAL до чекпоинта больше не нужен"""
+        self.flush(batch)
+        cur.send_feedback(flush_lsn=self.checkpoint)
+        with self.lock:
+            self.lag_bytes = max(0, cur.wal_end - self.checkpoint)
+
+    def caught_up(self, cur):
+        if cur.wal_end > self.checkpoint:
+            cur.send_feedback(flush_lsn=cur.wal_end)
+        with self.lock:
+            self.lag_bytes = 0
+            self.lag_seconds = 0.0
+
+    def samples(self):
+        with self.lock:
+            samples = [("pg_cdc_applied_changes_total", "counter", "Row changes applied to MongoDB",
+                        {"table": table}, count) for table, count in self.applied.items()]
+            samples += [
+                ("pg_cdc_skipped_transactions_total", "counter", "Transactions skipped (replayed or partition moves)",
+                 {}, self.skipped),
+                ("pg_cdc_batches_total", "counter", "bulk_write micro-batches", {}, self.batches),
+                ("pg_cdc_lag_seconds", "gauge", "Age of the last applied commit, 0 when caught up", {},
+                 round(self.lag_seconds, 3)),
+                ("pg_cdc_lag_bytes", "gauge", "WAL bytes received from the server but not yet applied", {},
+                 self.lag_bytes),
+                ("pg_cdc_checkpoint_lsn", "gauge", "Last checkpointed LSN", {}, self.checkpoint),
+                ("pg_cdc_up", "gauge", "Whether the replication stream is open", {}, self.up),
+            ]
+        return samples
+
+
+def make_handler(applier):
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render(applier.samples()).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="CDC из PostgreSQL (Bookings, Transactions, Events) в MongoDB")
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--setup", action="store_true", help="публикация, REPLICA IDENTITY FULL и слот")
+    parser.add_argument("--drop", action="store_true", help="удалить слот, публикацию и чекпоинт")
+    parser.add_argument("--batch-size", type=int, default=1000, help="операций в микропакете")
+    parser.add_argument("--batch-ms", type=int, default=200, help="максимальное ожидание пакета, мс")
+    parser.add_argument("--listen", help="host:port для /metrics, например 0.0.0.0:9219")
+    add_spec_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    applier = Applier(args)
+    if args.drop:
+        drop(args.pg_dsn, applier.db)
+        return
+    if args.setup:
+        setup(args.pg_dsn)
+        ensure_slot(args.pg_dsn)
+        applier.ensure_indexes()
+        return
+    check_spec(applier.db, applier.spec)
+    # Без чекпоинта (первый запуск) слот сам начнет с подтвержденной позиции
+    applier.checkpoint = applier.checkpoint or ensure_slot(args.pg_dsn)
+    if args.listen:
+        host, port = args.listen.rsplit(":", 1)
+        server = ThreadingHTTPServer((host, int(port)), make_handler(applier))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Метрики: http://{args.listen}/metrics")
+    # Разрыв соединения не теряет данных: продолжаем с чекпоинта
+    while True:
+        try:
+            applier.run()
+        except psycopg2.OperationalError as e:
+            print(f"  соединение потеряно: {e}".rstrip())
+            time.sleep(5)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        pass
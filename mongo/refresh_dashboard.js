@@ -0,0 +1,194 @@
+// refresh_dashboard.js - Инкрементальное обновление витрины user_behavior_dashboard
+//
+// Витрина - обычная коллекция, которая дополняется через $merge по _id
+// пользователя. Каждый запуск обрабатывает только записи, записанные после
+// сохраненной отметки (high-water mark) в dashboard_state. Окно считается по
+// written_at - времени записи, которое ставят все писатели (generate_data.py,
+// seed_data.py, reservations.py, pg_cdc.py, user_activity.activity_doc), а не
+// по _id или времени события: детерминированные ObjectId и перенесенные задним
+// числом просмотры несут старое время и иначе были бы пропущены.
+//   - bookings - для пользователей, чьи бронирования записаны в окне (новые,
+//     смена статуса, отмена), счетчики пересчитываются по всем их бронированиям;
+//     удаленное бронирование пользователя не отмечает - нужна полная перестройка;
+//   - user_activity_logs - записи окна складываются с накопленными
+//     (пользователь - meta.user_id); при полной перестройке записи старше
+//     TTL уже удалены, вся история по дням - в user_activity_daily;
+//   - users - новые пользователи по _id и профили тех, кого затронули дельты.
+// Поэтому стоимость обновления пропорциональна новой активности, а не всей истории.
+// Записи моложе SETTLE_SECONDS откладываются до следующего запуска, чтобы не
+// пропустить параллельные записи с чуть меньшим written_at: писатели ставят его
+// до записи, поэтому окно больше самой долгой записи одной пачки (генераторы
+// пишут пачками по 1000 через user_activity.insert_stamped).
+//
+// Запуск:               mongosh --quiet refresh_dashboard.js
+// Полная перестройка:   mongosh --quiet --eval "var FULL_REFRESH = true" refresh_dashboard.js
+db = db.getSiblingDB('event_booking_system');
+
+const DASHBOARD = "user_behavior_dashboard";
+const STATE = "dashboard_state";
+const SETTLE_SECONDS = 60;
+const BATCH_SIZE = 10000;
+// Отмененные и возвращенные бронирования не входят в total_bookings/total_spent
+const INACTIVE_STATUSES = ["cancelled", "refunded"];
+// Отметки считаются по written_at; состояние старого формата (по _id) перестраивается
+const WATERMARK = "written_at";
+
+function objectIdFromTime(date) {
+    const seconds = Math.floor(date.getTime() / 1000);
+    return ObjectId(seconds.toString(16).padStart(8, "0") + "0000000000000000");
+}
+
+const fullRefresh = typeof FULL_REFRESH !== "undefined" && FULL_REFRESH;
+const started = new Date();
+
+// Раньше витрина была view поверх users; view нельзя дополнять через $merge
+const info = db.getCollectionInfos({ name: DASHBOARD })[0];
+const saved = db[STATE].findOne({ _id: DASHBOARD });
+if (fullRefresh || (info && info.type === "view") || (saved && saved.watermark !== WATERMARK)) {
+    db[DASHBOARD].drop();
+    db[STATE].deleteOne({ _id: DASHBOARD });
+}
+
+const state = db[STATE].findOne({ _id: DASHBOARD });
+const upperTime = new Date(started.getTime() - SETTLE_SECONDS * 1000);
+const upperId = objectIdFromTime(upperTime);
+// Первый запуск берет все записи, в том числе без written_at
+const written = state
+    ? { written_at: { $gte: state.written_after, $lt: upperTime } }
+    : { $or: [{ written_at: { $lt: upperTime } }, { written_at: { $exists: false } }] };
+const usersAfter = state ? state.users_after : objectIdFromTime(new Date(0));
+
+console.log(`=== ОБНОВЛЕНИЕ ВИТРИНЫ ${DASHBOARD} ===`);
+console.log(`Окно записей: ${state ? "с " + state.written_after.toISOString() : "все"} ` +
+            `до ${upperTime.toISOString()}`);
+
+db[DASHBOARD].createIndex({ "total_spent": -1 });
+db[DASHBOARD].createIndex({ "last_activity_date": -1 });
+db[DASHBOARD].createIndex({ "preferred_categories": 1 });
+// По refreshed_at выбираются пользователи, затронутые текущим запуском
+db[DASHBOARD].createIndex({ "refreshed_at": 1 });
+db.bookings.createIndex({ "written_at": 1 });
+
+// 1. Бронирования: пользователи, чьи бронирования записаны в окне, пересчитываются
+// целиком - так отражаются и смена статуса, и отмена
+const isActive = { $not: [{ $in: ["$status", INACTIVE_STATUSES] }] };
+const recountBookings = match => db.bookings.aggregate([
+    { $match: match },
+    {
+        $group: {
+            _id: "$user_id",
+            total_bookings: { $sum: { $cond: [isActive, 1, 0] } },
+            total_spent: { $sum: { $cond: [isActive, "$total_amount", 0] } },
+            cancelled_bookings: { $sum: { $cond: [isActive, 0, 1] } },
+            last_booking_date: { $max: "$created_at" }
+        }
+    },
+    { $set: { refreshed_at: started } },
+    { $merge: { into: DASHBOARD, on: "_id", whenMatched: "merge", whenNotMatched: "insert" } }
+]);
+
+let changedBookings = 0;
+if (!state) {
+    changedBookings = db.bookings.estimatedDocumentCount();
+    recountBookings({});
+} else {
+    let users = [];
+    db.bookings.aggregate([
+        { $match: written },
+        { $group: { _id: "$user_id", changed: { $sum: 1 } } }
+    ]).forEach(doc => {
+        changedBookings += doc.changed;
+        users.push(doc._id);
+        if (users.length >= BATCH_SIZE) {
+            recountBookings({ user_id: { $in: users } });
+            users = [];
+        }
+    });
+    if (users.length > 0) {
+        recountBookings({ user_id: { $in: users } });
+    }
+}
+
+// 2. Дельта по логам активности: каждая запись попадает ровно в одно окно
+db.user_activity_logs.aggregate([
+    { $match: written },
+    {
+        $group: {
+            _id: "$meta.user_id",
+            activity_count: { $sum: 1 },
+            last_activity_date: { $max: "$timestamp" },
+            activity_types: { $addToSet: "$action" }
+        }
+    },
+    { $set: { refreshed_at: started } },
+    {
+        $merge: {
+            into: DASHBOARD,
+            on: "_id",
+            whenMatched: [
+                {
+                    $set: {
+                        activity_count: { $add: [{ $ifNull: ["$activity_count", 0] }, "$$new.activity_count"] },
+                        last_activity_date: { $max: ["$last_activity_date", "$$new.last_activity_date"] },
+                        activity_types: { $setUnion: [{ $ifNull: ["$activity_types", []] }, "$$new.activity_types"] },
+                        refreshed_at: "$$new.refreshed_at"
+                    }
+                }
+            ],
+            whenNotMatched: "insert"
+        }
+    }
+]);
+
+// 3. Профили: новые пользователи и пользователи, затронутые дельтами
+const profileStage = {
+    $project: {
+        name: 1,
+        email: 1,
+        created_at: 1,
+        favorites_count: { $size: { $ifNull: ["$favorites", []] } },
+        // Последние просмотры из документа; все просмотры - activity_count
+        view_history_count: { $size: { $ifNull: ["$view_history", []] } },
+        preferred_categories: "$preferences.categories"
+    }
+};
+const mergeProfiles = { $merge: { into: DASHBOARD, on: "_id", whenMatched: "merge", whenNotMatched: "insert" } };
+
+db.users.aggregate([
+    { $match: { _id: { $gte: usersAfter, $lt: upperId } } },
+    profileStage,
+    mergeProfiles
+]);
+
+let touched = 0;
+let batch = [];
+const flushProfiles = () => {
+    db.users.aggregate([{ $match: { _id: { $in: batch } } }, profileStage, mergeProfiles]);
+    touched += batch.length;
+    batch = [];
+};
+db[DASHBOARD].find({ refreshed_at: started }, { _id: 1 }).forEach(doc => {
+    batch.push(doc._id);
+    if (batch.length >= BATCH_SIZE) {
+        flushProfiles();
+    }
+});
+if (batch.length > 0) {
+    flushProfiles();
+}
+
+db[STATE].replaceOne(
+    { _id: DASHBOARD },
+    {
+        _id: DASHBOARD,
+        watermark: WATERMARK,
+        written_after: upperTime,
+        users_after: upperId,
+        refreshed_at: started
+    },
+    { upsert: true }
+);
+
+console.log(`Записанных бронирований: ${changedBookings}, обновлено пользователей: ${touched}`);
+console.log(`Записей в витрине: ${db[DASHBOARD].estimatedDocumentCount()}`);
+console.log(`Готово за ${(new Date() - started) / 1000} с`);
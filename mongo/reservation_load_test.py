@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+# reservation_load_test.py - Нагрузочный тест резервирования мест на одном "горячем" мероприятии
+#
+# Сотни покупателей (потоков) одновременно удерживают места, часть
+# удержаний подтверждает, часть отменяет - пока не распроданы места, которые
+# покупатели запрашивают (в MongoDB - тип билета Standard), или не вышло время. В конце проверяется, что продано не больше, чем есть,
+# и что число проданных мест совпадает с числом подтверждений.
+#
+# Примеры:
+#   python3 reservation_load_test.py --engine postgres --pg-dsn "dbname=event_booking" \
+#       --event-id 1 --buyers 200 --connections 40 --reset
+#   python3 reservation_load_test.py --engine mongo --buyers 300 --reset
+import argparse
+import random
+import sys
+import threading
+import time
+from datetime import datetime
+
+from benchstats import save_report, summarize
+from reservations import MONGO_URI, MongoReservations, PgReservations
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {"hold": [], "confirm": [], "cancel": []}
+        self.counts = {"held": 0, "rejected": 0, "confirmed": 0, "expired": 0, "cancelled": 0,
+                       "seats_confirmed": 0}
+
+    def add(self, operation, latency_ms, **counts):
+        with self.lock:
+            self.latencies[operation].append(latency_ms)
+            for name, value in counts.items():
+                self.counts[name] += value
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def buyer(service, event_id, stats, stop, args, number):
+    rng = random.Random(number)
+    misses = 0
+    while not stop.is_set():
+        quantity = rng.randint(1, args.max_quantity)
+        hold, latency = timed(service.hold, event_id, args.user_ids[number % len(args.user_ids)], quantity)
+        if hold is None:
+            stats.add("hold", latency, rejected=1)
+            misses += 1
+            # Несколько промахов подряд: проверяем, остались ли места запрашиваемого типа
+            if misses >= 3:
+                if service.remaining(event_id) == 0:
+                    stop.set()
+                misses = 0
+            # Свободных нет, но удержания еще могут вернуться в продажу - не крутимся вхолостую
+            time.sleep(rng.uniform(0, 10) / 1000)
+            continue
+        misses = 0
+        stats.add("hold", latency, held=1)
+
+        if args.think_ms:
+            time.sleep(rng.uniform(0, args.think_ms) / 1000)
+        if rng.random() < args.cancel_rate:
+            _, latency = timed(service.cancel, hold)
+            stats.add("cancel", latency, cancelled=1)
+            continue
+        booking_id, latency = timed(service.confirm, hold)
+        if booking_id is None:
+            stats.add("confirm", latency, expired=1)
+        else:
+            stats.add("confirm", latency, confirmed=1, seats_confirmed=hold["quantity"])
+
+
+def run(service, event_id, args):
+    capacity = service.open_sales(event_id, reset=args.reset)
+    before = service.inventory(event_id)
+    print(f"Мероприятие {event_id}: в продаже {before['available']} мест (инвентарь {capacity})")
+
+    stats = Stats()
+    stop = threading.Event()
+    threads = [threading.Thread(target=buyer, args=(service, event_id, stats, stop, args, number))
+               for number in range(args.buyers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    stop.wait(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    after = service.inventory(event_id)
+    sold = after["booked"] - before["booked"]
+    oversold = sold > before["available"]
+    mismatch = sold != stats.counts["seats_confirmed"]
+    return {
+        "meta": {
+            "engine": args.engine,
+            "event_id": str(event_id),
+            "buyers": args.buyers,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+            "elapsed_s": round(elapsed, 2),
+        },
+        "counts": stats.counts,
+        "throughput": {
+            "holds_per_sec": round(stats.counts["held"] / elapsed, 1),
+            "confirmations_per_sec": round(stats.counts["confirmed"] / elapsed, 1),
+            "attempts_per_sec": round(len(stats.latencies["hold"]) / elapsed, 1),
+        },
+        "latency": {name: summarize(values) for name, values in stats.latencies.items()},
+        "inventory": {"before": before, "after": after},
+        "checks": {"sold": sold, "oversold": oversold, "confirm_mismatch": mismatch},
+    }
+
+
+def print_report(report):
+    counts, throughput = report["counts"], report["throughput"]
+    print(f"\nЗа {report['meta']['elapsed_s']} с: удержаний {counts['held']}, отказов {counts['rejected']}, "
+          f"подтверждений {counts['confirmed']}, отмен {counts['cancelled']}, истекло {counts['expired']}")
+    print(f"Удержаний/с: {throughput['holds_per_sec']}, подтверждений/с: {throughput['confirmations_per_sec']}, "
+          f"попыток/с: {throughput['attempts_per_sec']}")
+    for name, latency in report["latency"].items():
+        if latency["count"]:
+            print(f"  {name:<8} p50 {latency['p50_ms']} мс, p95 {latency['p95_ms']} мс, p99 {latency['p99_ms']} мс")
+    checks = report["checks"]
+    print(f"Продано мест: {checks['sold']}, остаток: {report['inventory']['after']}")
+    print("✗ ПЕРЕПРОДАЖА" if checks["oversold"] else "✓ Перепродажи нет")
+    if checks["confirm_mismatch"]:
+        print("✗ Число проданных мест не совпадает с подтверждениями")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест резервирования мест")
+    parser.add_argument("--engine", choices=["mongo", "postgres"], default="mongo")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--event-id", help="мероприятие (по умолчанию первое)")
+    parser.add_argument("--buyers", type=int, default=200, help="одновременных покупателей")
+    parser.add_argument("--connections", type=int, default=40, help="соединений с PostgreSQL")
+    parser.add_argument("--duration", type=float, default=30, help="максимум секунд")
+    parser.add_argument("--max-quantity", type=int, default=2, help="мест в одном удержании")
+    parser.add_argument("--cancel-rate", type=float, default=0.1)
+    parser.add_argument("--think-ms", type=float, default=0, help="пауза между удержанием и оплатой")
+    parser.add_argument("--hold-ttl", type=int, default=300)
+    parser.add_argument("--reset", action="store_true", help="вернуть в продажу все места мероприятия")
+    parser.add_argument("--output", default="reservation_load_test.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.engine == "postgres":
+        service = PgReservations(args.pg_dsn, args.connections, args.hold_ttl)
+        service.ensure_schema()
+        with service.cursor() as cur:
+            cur.execute("SELECT user_id FROM Users ORDER BY user_id LIMIT 1000")
+            args.user_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT MIN(event_id) FROM Events")
+            event_id = int(args.event_id) if args.event_id else cur.fetchone()[0]
+    else:
+        from bson import ObjectId
+        service = MongoReservations(args.mongo_uri, args.hold_ttl, max_pool_size=args.buyers)
+        args.user_ids = [user["_id"] for user in service.db.users.find({}, {"_id": 1}).limit(1000)]
+        event_id = ObjectId(args.event_id) if args.event_id else service.db.events.find_one()["_id"]
+
+    report = run(service, event_id, args)
+    service.close()
+    print_report(report)
+    save_report(args.output, report)
+    print(f"Отчет: {args.output}")
+    if report["checks"]["oversold"] or report["checks"]["confirm_mismatch"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
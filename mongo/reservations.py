@@ -0,0 +1,335 @@
+# reservations.py - Резервирование мест с удержанием по TTL для PostgreSQL и MongoDB
+#
+# Покупка идет в два шага: hold() удерживает места на HOLD_TTL_SECONDS,
+# confirm() превращает удержание в бронирование, cancel() отпускает места.
+# Продать больше, чем есть, нельзя ни при какой конкуренции:
+#   - PostgreSQL (схема lab2 + 07_seat_reservations.sql): свободные места
+#     выбираются SELECT ... FOR UPDATE SKIP LOCKED, так что покупатели не ждут
+#     друг друга на одних и тех же строках; подтверждение - условный UPDATE
+#     по hold_id и сроку удержания;
+#   - MongoDB: счетчики и активные удержания живут в документе мероприятия,
+#     каждое действие - один условный find_one_and_update с проверкой остатка,
+#     то есть атомарная операция над одним документом. Истекшие удержания
+#     нельзя подтвердить, а места по ним возвращает release_expired(),
+#     который нужно вызывать периодически. Подтверждение затрагивает два
+#     документа и идет в три шага без транзакции: удержание помечается
+#     confirming (его больше нельзя отменить или вернуть в продажу),
+#     вставляется бронирование с _id = hold_id, и только потом удержание
+#     снимается и места считаются проданными. После сбоя между шагами
+#     release_expired() доводит помеченное удержание до продажи, поэтому
+#     проданных мест без бронирования не бывает.
+# Нагрузочный тест: reservation_load_test.py
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+HOLD_TTL_SECONDS = 300
+CONFIRMED_STATUS_ID = 2
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'lab2',
+                           '07_seat_reservations.sql')
+
+PG_HOLD_SQL = """
+    WITH picked AS (
+        SELECT event_id, seat_id
+        FROM EventSeats
+        WHERE event_id = %(event_id)s
+          AND (status = 'available' OR (status = 'held' AND held_until < now()))
+        ORDER BY seat_id
+        LIMIT %(quantity)s
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE EventSeats s
+    SET status = 'held', hold_id = %(hold_id)s, user_id = %(user_id)s,
+        held_until = now() + make_interval(secs => %(ttl)s)
+    FROM picked
+    WHERE s.event_id = picked.event_id AND s.seat_id = picked.seat_id
+    RETURNING s.seat_id, s.held_until
+"""
+
+
+class PgReservations:
+    """Резервирование мест в PostgreSQL; соединения берутся из пула"""
+
+    def __init__(self, dsn, connections=20, hold_ttl=HOLD_TTL_SECONDS):
+        from psycopg2.pool import ThreadedConnectionPool
+        self.pool = ThreadedConnectionPool(1, connections, dsn)
+        # Пул не ждет свободного соединения, а падает, поэтому вход ограничен семафором
+        self.slots = threading.BoundedSemaphore(connections)
+        self.hold_ttl = hold_ttl
+
+    @contextmanager
+    def cursor(self):
+        with self.slots:
+            conn = self.pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self.pool.putconn(conn)
+
+    def ensure_schema(self):
+        with open(SCHEMA_FILE, encoding="utf-8") as f, self.cursor() as cur:
+            cur.execute(f.read())
+
+    def open_sales(self, event_id, reset=False):
+        """Инвентарь мест мероприятия; reset возвращает в продажу все места"""
+        with self.cursor() as cur:
+            if reset:
+                cur.execute("DELETE FROM EventSeats WHERE event_id = %s", (event_id,))
+            cur.execute("SELECT open_event_sales(%s)", (event_id,))
+            return cur.fetchone()[0]
+
+    def hold(self, event_id, user_id, quantity=1):
+        """Удержать quantity мест целиком или ничего; None, если мест не нашлось"""
+        hold_id = str(uuid.uuid4())
+        with self.cursor() as cur:
+            cur.execute(PG_HOLD_SQL, {"event_id": event_id, "user_id": user_id, "quantity": quantity,
+                                      "hold_id": hold_id, "ttl": self.hold_ttl})
+            rows = cur.fetchall()
+            if len(rows) < quantity:
+                cur.connection.rollback()
+                return None
+        return {"hold_id": hold_id, "event_id": event_id, "user_id": user_id, "quantity": quantity,
+                "seats": [seat_id for seat_id, _ in rows], "expires_at": rows[0][1]}
+
+    def confirm(self, hold, ticket_type_id=1):
+        """Оформить бронирование по удержанию; None, если удержание истекло или отменено"""
+        with self.cursor() as cur:
+            cur.execute("""
+                UPDATE EventSeats SET status = 'booked'
+                WHERE hold_id = %s AND status = 'held' AND held_until >= now()
+                RETURNING seat_id
+            """, (hold["hold_id"],))
+            seats = [row[0] for row in cur.fetchall()]
+            if len(seats) < len(hold["seats"]):
+                cur.connection.rollback()
+                return None
+            cur.execute("""
+                INSERT INTO Bookings (user_id, event_id, seat_id, ticket_type_id, status_id,
+                                      quantity, total_amount)
+                SELECT %(user_id)s, e.event_id, %(seat_id)s, t.ticket_type_id, %(status_id)s,
+                       %(quantity)s, e.base_price * t.multiplier * %(quantity)s
+                FROM Events e, TicketTypes t
+                WHERE e.event_id = %(event_id)s AND t.ticket_type_id = %(ticket_type_id)s
+                RETURNING booking_id
+            """, {"user_id": hold["user_id"], "event_id": hold["event_id"], "seat_id": min(seats),
+                  "status_id": CONFIRMED_STATUS_ID, "quantity": len(seats),
+                  "ticket_type_id": ticket_type_id})
+            booking_id = cur.fetchone()[0]
+            cur.execute("UPDATE EventSeats SET booking_id = %s, held_until = NULL WHERE hold_id = %s",
+                        (booking_id, hold["hold_id"]))
+        return booking_id
+
+    def cancel(self, hold):
+        with self.cursor() as cur:
+            cur.execute("""
+                UPDATE EventSeats
+                SET status = 'available', hold_id = NULL, user_id = NULL, held_until = NULL
+                WHERE hold_id = %s AND status = 'held'
+            """, (hold["hold_id"],))
+            return cur.rowcount
+
+    def release_expired(self):
+        with self.cursor() as cur:
+            cur.execute("SELECT release_expired_holds()")
+            return cur.fetchone()[0]
+
+    def inventory(self, event_id):
+        """{"available": ..., "held": ..., "booked": ...}; истекшие удержания считаются свободными"""
+        with self.cursor() as cur:
+            cur.execute("""
+                SELECT CASE WHEN status = 'held' AND held_until < now() THEN 'available' ELSE status END,
+                       COUNT(*)
+                FROM EventSeats WHERE event_id = %s GROUP BY 1
+            """, (event_id,))
+            counts = dict.fromkeys(("available", "held", "booked"), 0)
+            counts.update(dict(cur.fetchall()))
+            return counts
+
+    def remaining(self, event_id):
+        """Места, которые hold() еще может получить: свободные и удержанные (места без типа билета)"""
+        inventory = self.inventory(event_id)
+        return inventory["available"] + inventory["held"]
+
+    def close(self):
+        self.pool.closeall()
+
+
+def remaining_guard(index, quantity):
+    """$expr: в типе билета index осталось не меньше quantity мест (sold + held + quantity <= quantity типа)"""
+    return {
+        "$let": {
+            "vars": {"t": {"$arrayElemAt": ["$ticket_types", index]}},
+            "in": {"$lte": [
+                {"$add": ["$$t.sold", {"$ifNull": ["$$t.held", 0]}, quantity]},
+                "$$t.quantity"
+            ]}
+        }
+    }
+
+
+class MongoReservations:
+    """Резервирование мест в MongoDB: атомарные условные обновления документа мероприятия"""
+
+    def __init__(self, uri=MONGO_URI, hold_ttl=HOLD_TTL_SECONDS, max_pool_size=100):
+        from pymongo import MongoClient
+        self.db = MongoClient(uri, maxPoolSize=max_pool_size)[DB_NAME]
+        self.hold_ttl = hold_ttl
+        # Порядок типов билетов в мероприятии не меняется, индексы кэшируются
+        self.type_index = {}
+
+    def open_sales(self, event_id, reset=False):
+        if reset:
+            event = self.db.events.find_one({"_id": event_id}, {"capacity": 1, "ticket_types": 1})
+            updates = {"available_seats": event["capacity"], "holds": []}
+            for index in range(len(event["ticket_types"])):
+                updates[f"ticket_types.{index}.sold"] = 0
+                updates[f"ticket_types.{index}.held"] = 0
+            self.db.events.update_one({"_id": event_id}, {"$set": updates})
+        return self.db.events.find_one({"_id": event_id}, {"available_seats": 1})["available_seats"]
+
+    def _index(self, event_id, ticket_type):
+        key = (event_id, ticket_type)
+        if key not in self.type_index:
+            event = self.db.events.find_one({"_id": event_id}, {"ticket_types.type": 1})
+            types = [t["type"] for t in event["ticket_types"]]
+            self.type_index[key] = types.index(ticket_type)
+        return self.type_index[key]
+
+    def hold(self, event_id, user_id, quantity=1, ticket_type="Standard"):
+        from bson import ObjectId
+
+        index = self._index(event_id, ticket_type)
+        hold = {
+            "_id": ObjectId(),
+            "user_id": user_id,
+            "ticket_index": index,
+            "quantity": quantity,
+            "expires_at": datetime.now() + timedelta(seconds=self.hold_ttl),
+        }
+        # Проверка остатка и списание в одной операции над документом
+        event = self.db.events.find_one_and_update(
+            {
+                "_id": event_id,
+                "available_seats": {"$gte": quantity},
+                "$expr": remaining_guard(index, quantity),
+            },
+            {
+                "$inc": {"available_seats": -quantity, f"ticket_types.{index}.held": quantity},
+                "$push": {"holds": hold},
+            },
+            projection={"_id": 1},
+        )
+        if event is None:
+            return None
+        return dict(hold, hold_id=hold["_id"], event_id=event_id)
+
+    def confirm(self, hold):
+        # Повтор после сбоя находит уже помеченное удержание и доводит его до конца
+        marked = self.db.events.update_one(
+            {
+                "_id": hold["event_id"],
+                "holds": {"$elemMatch": {"_id": hold["hold_id"], "$or": [
+                    {"expires_at": {"$gte": datetime.now()}}, {"confirming": True}]}},
+            },
+            {"$set": {"holds.$.confirming": True}},
+        )
+        if marked.matched_count == 0:
+            # Удержания нет: либо оно уже подтверждено, либо истекло или отменено
+            booking = self.db.bookings.find_one({"_id": hold["hold_id"]}, {"_id": 1})
+            return booking["_id"] if booking else None
+        return self._complete(hold["event_id"], hold)
+
+    def _complete(self, event_id, hold):
+        """Бронирование по помеченному удержанию, затем продажа мест; каждый шаг можно повторить"""
+        from pymongo.errors import DuplicateKeyError
+
+        index, quantity = hold["ticket_index"], hold["quantity"]
+        event = self.db.events.find_one({"_id": event_id}, {"ticket_types": {"$slice": [index, 1]}})
+        ticket = event["ticket_types"][0]
+        now = datetime.now()
+        try:
+            self.db.bookings.insert_one({
+                "_id": hold["_id"],
+                "user_id": hold["user_id"],
+                "event_id": event_id,
+                "ticket_type": ticket["type"],
+                "quantity": quantity,
+                "total_amount": ticket["price"] * quantity,
+                "status": "confirmed",
+                "hold_id": hold["_id"],
+                "created_at": now,
+                "updated_at": now,
+                "written_at": now,
+            })
+        except DuplicateKeyError:
+            pass
+        self.db.events.update_one(
+            {"_id": event_id, "holds": {"$elemMatch": {"_id": hold["_id"], "confirming": True}}},
+            {
+                "$pull": {"holds": {"_id": hold["_id"]}},
+                "$inc": {f"ticket_types.{index}.held": -quantity, f"ticket_types.{index}.sold": quantity},
+            },
+        )
+        return hold["_id"]
+
+    def _release(self, event_id, hold, extra_filter=None):
+        index, quantity = hold["ticket_index"], hold["quantity"]
+        # Помеченное к подтверждению удержание в продажу уже не возвращается
+        match = {"_id": hold["_id"], "confirming": {"$ne": True}}
+        match.update(extra_filter or {})
+        result = self.db.events.update_one(
+            {"_id": event_id, "holds": {"$elemMatch": match}},
+            {
+                "$pull": {"holds": {"_id": hold["_id"]}},
+                "$inc": {"available_seats": quantity, f"ticket_types.{index}.held": -quantity},
+            },
+        )
+        return result.modified_count
+
+    def cancel(self, hold):
+        return self._release(hold["event_id"], hold)
+
+    def release_expired(self):
+        """Возврат в продажу истекших удержаний; каждое снимается отдельной условной операцией.
+        Удержания, подтверждение которых прервалось, доводятся до продажи."""
+        now = datetime.now()
+        released = 0
+        for event in self.db.events.find({"holds.expires_at": {"$lt": now}}, {"holds": 1}):
+            for hold in event["holds"]:
+                if hold["expires_at"] >= now:
+                    continue
+                if hold.get("confirming"):
+                    self._complete(event["_id"], hold)
+                else:
+                    released += self._release(event["_id"], hold, {"expires_at": {"$lt": now}})
+        return released
+
+    def inventory(self, event_id):
+        event = self.db.events.find_one({"_id": event_id}, {"available_seats": 1, "ticket_types": 1})
+        return {
+            "available": event["available_seats"],
+            "held": sum(t.get("held", 0) for t in event["ticket_types"]),
+            "booked": sum(t.get("sold", 0) for t in event["ticket_types"]),
+        }
+
+    def remaining(self, event_id, ticket_type="Standard"):
+        """Места типа ticket_type, которые hold() еще может получить: свободные и удержанные"""
+        index = self._index(event_id, ticket_type)
+        event = self.db.events.find_one({"_id": event_id}, {"available_seats": 1, "ticket_types": 1})
+        held = sum(t.get("held", 0) for t in event["ticket_types"])
+        ticket = event["ticket_types"][index]
+        return min(ticket["quantity"] - ticket.get("sold", 0), event["available_seats"] + held)
+
+    def close(self):
+        self.db.client.close()
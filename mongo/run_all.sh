@@ -64,7 +64,11 @@ try {
     db.createCollection("reviews");
     db.createCollection("venues");
     db.createCollection("organizers");
-    db.createCollection("user_activity_logs");
+    // Лог активности - time-series с TTL (см. user_activity.py)
+    db.createCollection("user_activity_logs", {
+        timeseries: { timeField: "timestamp", metaField: "meta", granularity: "hours" },
+        expireAfterSeconds: 90 * 24 * 3600
+    });
     
     print("Коллекции созданы успешно!");
 } catch (e) {
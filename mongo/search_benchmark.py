@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# search_benchmark.py - Поиск мероприятий: event_search.py против regex и $or сканов
+#
+# Для каждого сценария одна и та же выборка запросов выполняется двумя способами:
+#   current - как в mongodb_operations.js (step7/step8): $regex по title и
+#             description, $or/$in по категориям, сортировка по дате, skip для страниц;
+#   search  - event_search.search() по event_cards: $text, $geoNear, индексные
+#             фильтры и keyset-курсор.
+# Сценарии: text (слово из названия), filters (категории + цена + даты),
+# near (мероприятия в радиусе от точки), page5 (пятая страница текстового поиска).
+# Поисковые слова берутся из названий случайных мероприятий ($sample).
+# Наборы результатов не совпадают один в один: $text ищет по основам слов
+# и сортирует по релевантности, regex - по подстроке и по дате.
+#
+# Данные на 1M мероприятий:
+#   python3 generate_data.py --scale events=1000000 --workers 8
+#
+# Пример:
+#   python3 search_benchmark.py --queries 30 --iterations 3 --output search.json
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient
+
+from benchstats import save_report, summarize
+from datagen import EVENT_CATEGORIES
+from event_cards import CARDS, ensure_indexes
+from event_search import EARTH_RADIUS_KM, PAGE_SIZE, search
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+TARGET_EVENTS = 1000000
+
+
+def current_text(db, term, page=0):
+    regex = {"$regex": re.escape(term), "$options": "i"}
+    return list(db.events.find({
+        "status": "published",
+        "date": {"$gte": datetime.now()},
+        "$or": [{"title": regex}, {"description": regex}, {"categories": term.lower()}, {"tags": term.lower()}],
+    }).sort([("date", 1), ("_id", 1)]).skip(page * PAGE_SIZE).limit(PAGE_SIZE))
+
+
+def current_filters(db, categories, price_max, days):
+    now = datetime.now()
+    return list(db.events.find({
+        "status": {"$in": ["published"]},
+        "date": {"$gt": now, "$lt": now + timedelta(days=days)},
+        "$or": [{"categories": category} for category in categories],
+        "ticket_types.price": {"$lte": price_max},
+    }).sort([("date", 1), ("_id", 1)]).limit(PAGE_SIZE))
+
+
+def current_near(db, point, radius_km):
+    venue_ids = db.venues.distinct("_id", {"location": {"$geoWithin": {
+        "$centerSphere": [list(point), radius_km / EARTH_RADIUS_KM]}}})
+    return list(db.events.find({
+        "status": "published", "date": {"$gte": datetime.now()}, "venue_id": {"$in": venue_ids},
+    }).sort([("date", 1), ("_id", 1)]).limit(PAGE_SIZE))
+
+
+def search_page(db, term, page):
+    cursor = None
+    for _ in range(page + 1):
+        results, cursor = search(db, text=term, after=cursor)
+        if cursor is None:
+            break
+    return results
+
+
+def make_queries(db, args):
+    rng = random.Random(args.seed)
+    titles = [doc["title"] for doc in db[CARDS].aggregate([
+        {"$match": {"status": "published"}}, {"$sample": {"size": args.queries}}, {"$project": {"title": 1}}])]
+    terms = [title.split()[-1] for title in titles] or ["концерт"]
+    points = [doc["venue"]["location"]["coordinates"] for doc in db[CARDS].aggregate([
+        {"$match": {"venue.location": {"$exists": True}}}, {"$sample": {"size": args.queries}},
+        {"$project": {"venue.location": 1}}])]
+    filters = [(rng.sample(EVENT_CATEGORIES, 2), rng.choice([2000, 5000, 10000]), rng.choice([7, 30, 90]))
+               for _ in range(args.queries)]
+    return terms, points, filters
+
+
+def scenarios(db, args):
+    terms, points, filters = make_queries(db, args)
+    radius = args.radius_km
+    return {
+        "text": (
+            [lambda t=t: current_text(db, t) for t in terms],
+            [lambda t=t: search(db, text=t)[0] for t in terms],
+        ),
+        "filters": (
+            [lambda f=f: current_filters(db, *f) for f in filters],
+            [lambda f=f: search(db, categories=f[0], price_max=f[1],
+                                date_to=datetime.now() + timedelta(days=f[2]))[0] for f in filters],
+        ),
+        "near": (
+            [lambda p=p: current_near(db, p, radius) for p in points],
+            [lambda p=p: search(db, near=p, radius_km=radius)[0] for p in points],
+        ),
+        "page5": (
+            [lambda t=t: current_text(db, t, page=4) for t in terms],
+            [lambda t=t: search_page(db, t, 4) for t in terms],
+        ),
+    }
+
+
+def measure(queries, iterations):
+    for query in queries:
+        query()
+    latencies, results = [], 0
+    for _ in range(iterations):
+        for query in queries:
+            started = time.perf_counter()
+            results += len(query())
+            latencies.append((time.perf_counter() - started) * 1000)
+    stats = summarize(latencies)
+    stats["avg_results"] = round(results / max(len(latencies), 1), 1)
+    return stats
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Бенчмарк поиска мероприятий")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--queries", type=int, default=30, help="запросов в каждом сценарии")
+    parser.add_argument("--iterations", type=int, default=3)
+    parser.add_argument("--radius-km", type=float, default=5)
+    parser.add_argument("--scenarios", default="text,filters,near,page5")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="search_benchmark.json")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = MongoClient(args.uri)[DB_NAME]
+    events = db.events.estimated_document_count()
+    cards = db[CARDS].estimated_document_count()
+    print(f"=== БЕНЧМАРК ПОИСКА: мероприятий {events}, карточек {cards} ===")
+    if events < TARGET_EVENTS:
+        print(f"  (для {TARGET_EVENTS} мероприятий: python3 generate_data.py --scale events={TARGET_EVENTS})")
+    if cards < events:
+        print("  карточек меньше, чем мероприятий: запустите python3 event_cards.py --rebuild")
+    elif db[CARDS].find_one({"search_text": {"$exists": False}}, {"_id": 1}):
+        print("  карточки без search_text (старый формат): запустите python3 event_cards.py --rebuild")
+    started = time.perf_counter()
+    ensure_indexes(db[CARDS])
+    print(f"Индексы event_cards готовы ({time.perf_counter() - started:.1f} с)")
+
+    wanted = args.scenarios.split(",")
+    results = {}
+    for name, (current, indexed) in scenarios(db, args).items():
+        if name not in wanted:
+            continue
+        results[name] = {"current": measure(current, args.iterations), "search": measure(indexed, args.iterations)}
+
+    print(f"\n{'scenario':<10} {'method':<8} {'p50 ms':>9} {'p95 ms':>9} {'results':>8}")
+    for name, by_method in results.items():
+        for method, stats in by_method.items():
+            print(f"{name:<10} {method:<8} {stats.get('p50_ms', '-'):>9} {stats.get('p95_ms', '-'):>9} "
+                  f"{stats['avg_results']:>8}")
+        current, indexed = by_method["current"].get("p50_ms"), by_method["search"].get("p50_ms")
+        if current and indexed:
+            print(f"{'':<10} ускорение p50: {current / indexed:.1f}x")
+
+    save_report(args.output, {
+        "meta": {"events": events, "cards": cards, "queries": args.queries, "iterations": args.iterations,
+                 "radius_km": args.radius_km, "started_at": datetime.now().isoformat(timespec="seconds")},
+        "scenarios": results,
+    })
+    print(f"\nОтчет: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,49 @@
-from pymongo import MongoClient
+from pymongo import MongoClient, UpdateOne
 from datetime import datetime, timedelta
+import argparse
 import random
 from faker import Faker
 
+from booking_history import history_push
+from datagen import ZipfSampler, parse_scale
+from event_cards import rebuild as rebuild_event_cards
+from user_activity import ACTIVITY, activity_doc, insert_stamped, recent_views, refresh_rollups, reset_collections
+
 fake = Faker('ru_RU')
 client = MongoClient('mongodb://localhost:27017/')
 db = client.event_booking_system
 
+# Размер пачки операций для bulk_write
+BULK_BATCH_SIZE = 1000
+
+# Объем данных при --scale 1
+SEED_SIZES = {
+    "organizers": 3,
+    "venues": 3,
+    "users": 30,
+    "events": 20,
+    "bookings": 80,
+    "reviews": 40,
+}
+
+def skewed_picker(ids, skew):
+    """Выбор из ids по Zipf: чем раньше идентификатор в списке, тем чаще он выпадает"""
+    ids = list(ids)
+    sampler = ZipfSampler(len(ids), skew)
+    return lambda: ids[sampler.sample(random)]
+
+def apply_updates(collection, operations):
+    """Применение операций пачками по BULK_BATCH_SIZE"""
+    for start in range(0, len(operations), BULK_BATCH_SIZE):
+        collection.bulk_write(operations[start:start + BULK_BATCH_SIZE], ordered=False)
+
 def clear_all_data():
     """Очистка всех данных"""
-    collections = ['events', 'users', 'bookings', 'reviews', 'venues', 'organizers', 'user_activity_logs']
+    collections = ['events', 'users', 'bookings', 'reviews', 'venues', 'organizers']
     for collection in collections:
         db[collection].delete_many({})
+    # Лог активности - time-series коллекция, она и свертки пересоздаются
+    reset_collections(db)
     print("Все данные очищены")
 
 def create_organizers(count=5):
@@ -149,34 +181,49 @@ def create_events(count=30, organizer_ids=None, venue_ids=None):
     print(f"Создано {len(result.inserted_ids)} мероприятий")
     return result.inserted_ids
 
-def create_bookings(count=100, user_ids=None, event_ids=None):
+def create_bookings(count=100, user_ids=None, event_ids=None, user_skew=0.8, event_skew=1.1):
     """Создание бронирований"""
     if not user_ids:
-        user_ids = [user['_id'] for user in db.users.find()]
+        user_ids = [user['_id'] for user in db.users.find({}, {"_id": 1})]
     if not event_ids:
-        event_ids = [event['_id'] for event in db.events.find({"status": "published"})]
-    
+        event_ids = [event['_id'] for event in db.events.find({"status": "published"}, {"_id": 1})]
+
+    # Мероприятия читаются один раз; остаток билетов ведется в памяти
+    events = {
+        event['_id']: event
+        for event in db.events.find(
+            {"_id": {"$in": list(event_ids)}},
+            {"title": 1, "ticket_types": 1, "available_seats": 1}
+        )
+    }
+    event_ids = [event_id for event_id in event_ids if event_id in events]
+    if not event_ids:
+        print("Не удалось создать бронирования")
+        return []
+
+    pick_user = skewed_picker(user_ids, user_skew)
+    pick_event = skewed_picker(event_ids, event_skew)
     bookings = []
-    
+
     for i in range(count):
-        user_id = random.choice(user_ids)
-        event_id = random.choice(event_ids)
-        event = db.events.find_one({"_id": event_id})
-        
-        if not event or event['available_seats'] <= 0:
+        user_id = pick_user()
+        event_id = pick_event()
+        event = events[event_id]
+
+        if event['available_seats'] <= 0:
             continue
-            
+
         ticket_type = random.choice(event['ticket_types'])
         quantity = random.randint(1, 2)
-        
+
         if ticket_type['quantity'] - ticket_type['sold'] < quantity:
             continue
-        
+
         booking_date = fake.date_time_between(
-            start_date='-30d', 
+            start_date='-30d',
             end_date='now'
         )
-        
+
         booking = {
             "user_id": user_id,
             "event_id": event_id,
@@ -186,73 +233,98 @@ def create_bookings(count=100, user_ids=None, event_ids=None):
             "status": random.choice(["confirmed", "confirmed", "cancelled"]),
             "payment_method": random.choice(["cash", "card", "online"]),
             "transaction_id": f"TXN{random.randint(100000, 999999)}",
-            "seats": [f"{row}{num}" for row, num in 
+            "seats": [f"{row}{num}" for row, num in
                      zip(random.sample(['A', 'B', 'C'], k=quantity),
                          random.sample(range(1, 20), k=quantity))],
             "created_at": booking_date,
             "updated_at": booking_date
         }
-        
+
         bookings.append(booking)
 
-        db.events.update_one(
-            {"_id": event_id, "ticket_types.type": ticket_type['type']},
+        ticket_type['sold'] += quantity
+        event['available_seats'] -= quantity
+
+    if not bookings:
+        print("Не удалось создать бронирования")
+        return []
+
+    # written_at ставится пачкам непосредственно перед записью
+    print(f"Создано {insert_stamped(db.bookings, bookings)} бронирований")
+
+    # insert_many проставляет _id в исходные документы, поэтому статистика
+    # собирается по списку в памяти без повторного чтения коллекции
+    apply_updates(db.events, event_ticket_updates(bookings, events))
+    apply_updates(db.users, user_stats_updates(bookings, events))
+
+    return [booking["_id"] for booking in bookings]
+
+def event_ticket_updates(bookings, events):
+    """Суммарные изменения sold и available_seats: одна операция на мероприятие"""
+    deltas = {}
+    for booking in bookings:
+        event = events[booking['event_id']]
+        index = next(i for i, t in enumerate(event['ticket_types'])
+                     if t['type'] == booking['ticket_type'])
+        inc = deltas.setdefault(booking['event_id'], {"available_seats": 0})
+        inc[f"ticket_types.{index}.sold"] = inc.get(f"ticket_types.{index}.sold", 0) + booking['quantity']
+        inc["available_seats"] -= booking['quantity']
+
+    return [UpdateOne({"_id": event_id}, {"$inc": inc}) for event_id, inc in deltas.items()]
+
+def user_stats_updates(bookings, events):
+    """Статистика и история бронирований: одна операция на пользователя"""
+    stats = {}
+    for booking in bookings:
+        entry = stats.setdefault(booking['user_id'], {
+            "count": 0, "spent": 0, "last": booking['created_at'], "history": []
+        })
+        entry["count"] += 1
+        entry["spent"] += booking['total_amount']
+        entry["last"] = max(entry["last"], booking['created_at'])
+        entry["history"].append({
+            "booking_id": booking['_id'],
+            "event_id": booking['event_id'],
+            "event_title": events[booking['event_id']]['title'],
+            "date": booking['created_at'],
+            "status": booking['status'],
+            "amount": booking['total_amount']
+        })
+
+    return [
+        UpdateOne(
+            {"_id": user_id},
             {
                 "$inc": {
-                    "ticket_types.$.sold": quantity,
-                    "available_seats": -quantity
+                    "stats.total_bookings": entry["count"],
+                    "stats.total_spent": entry["spent"]
+                },
+                "$max": {
+                    "stats.last_booking_date": entry["last"]
+                },
+                "$push": {
+                    "booking_history": history_push(entry["history"])
                 }
             }
         )
-    
-    if bookings:
-        result = db.bookings.insert_many(bookings)
-        print(f"Создано {len(result.inserted_ids)} бронирований")
-
-        for booking in db.bookings.find():
-            event = db.events.find_one({"_id": booking['event_id']})
-            if event:
-                db.users.update_one(
-                    {"_id": booking['user_id']},
-                    {
-                        "$inc": {
-                            "stats.total_bookings": 1,
-                            "stats.total_spent": booking['total_amount']
-                        },
-                        "$set": {
-                            "stats.last_booking_date": booking['created_at']
-                        },
-                        "$push": {
-                            "booking_history": {
-                                "booking_id": booking['_id'],
-                                "event_id": booking['event_id'],
-                                "event_title": event['title'],
-                                "date": booking['created_at'],
-                                "status": booking['status'],
-                                "amount": booking['total_amount']
-                            }
-                        }
-                    }
-                )
-        
-        return result.inserted_ids
-    else:
-        print("Не удалось создать бронирования")
-        return []
+        for user_id, entry in stats.items()
+    ]
 
-def create_reviews(count=50, user_ids=None, event_ids=None):
+def create_reviews(count=50, user_ids=None, event_ids=None, user_skew=0.8, event_skew=1.1):
     """Создание отзывов"""
     if not user_ids:
         user_ids = [user['_id'] for user in db.users.find()]
     if not event_ids:
         event_ids = [event['_id'] for event in db.events.find()]
     
+    pick_user = skewed_picker(user_ids, user_skew)
+    pick_event = skewed_picker(event_ids, event_skew)
     reviews = []
     
     for i in range(count):
         review = {
-            "event_id": random.choice(event_ids),
-            "user_id": random.choice(user_ids),
+            "event_id": pick_event(),
+            "user_id": pick_user(),
             "rating": random.randint(1, 5),
             "comment": fake.text(max_nb_chars=100),
             "created_at": fake.date_time_between(start_date='-60d', end_date='now'),
@@ -266,48 +338,75 @@ def create_reviews(count=50, user_ids=None, event_ids=None):
     return result.inserted_ids
 
 def create_view_history():
-    """Создание истории просмотров"""
-    users = list(db.users.find())
-    events = list(db.events.find({"status": "published"}))
-    
-    for user in users:
-        viewed_events = random.sample(events, k=random.randint(1, 10))
+    """Создание истории просмотров: лог активности и последние просмотры в документе"""
+    user_ids = [user['_id'] for user in db.users.find({}, {"_id": 1})]
+    event_ids = [event['_id'] for event in db.events.find({"status": "published"}, {"_id": 1})]
+
+    operations = []
+    logs = []
+    for user_id in user_ids:
+        viewed_events = random.sample(event_ids, k=min(len(event_ids), random.randint(1, 10)))
         view_history = []
-        
-        for event in viewed_events:
+
+        for event_id in viewed_events:
             view_history.append({
-                "event_id": event['_id'],
+                "event_id": event_id,
                 "viewed_at": fake.date_time_between(start_date='-30d', end_date='now')
             })
+        logs.extend(activity_doc(user_id, view["event_id"], view["viewed_at"]) for view in view_history)
 
-        favorite_events = random.sample(viewed_events, k=random.randint(0, 3))
-        favorites = [event['_id'] for event in favorite_events]
-        
-        db.users.update_one(
-            {"_id": user['_id']},
+        favorites = random.sample(viewed_events, k=min(len(viewed_events), random.randint(0, 3)))
+
+        operations.append(UpdateOne(
+            {"_id": user_id},
             {
                 "$set": {
-                    "view_history": view_history,
+                    "view_history": recent_views(view_history),
                     "favorites": favorites
                 }
             }
-        )
-    
-    print(f"Создана история просмотров для {len(users)} пользователей")
+        ))
+
+    if logs:
+        insert_stamped(db[ACTIVITY], logs)
+    apply_updates(db.users, operations)
+    refresh_rollups(db, full=True)
+    print(f"Создана история просмотров для {len(user_ids)} пользователей ({len(logs)} записей в {ACTIVITY})")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Заполнение MongoDB тестовыми данными")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="зерно random и Faker для воспроизводимого набора")
+    parser.add_argument("--scale", default="1",
+                        help="множитель объема: '10' или 'users=5,bookings=20'")
+    parser.add_argument("--event-skew", type=float, default=1.1,
+                        help="показатель Zipf для популярности мероприятий (0 - равномерно)")
+    parser.add_argument("--user-skew", type=float, default=0.8,
+                        help="показатель Zipf для активности пользователей (0 - равномерно)")
+    return parser.parse_args()
 
 def main():
     """Основная функция"""
+    args = parse_args()
+    sizes = parse_scale(args.scale, SEED_SIZES)
+    if args.seed is not None:
+        random.seed(args.seed)
+        fake.seed_instance(args.seed)
+
     print("=== Начало генерации тестовых данных ===")
     
     clear_all_data()
 
-    organizer_ids = create_organizers(3)
-    venue_ids = create_venues(3)
-    user_ids = create_users(30)
-    event_ids = create_events(20, organizer_ids, venue_ids)
-    booking_ids = create_bookings(80, user_ids, event_ids)
-    review_ids = create_reviews(40, user_ids, event_ids)
+    organizer_ids = create_organizers(sizes["organizers"])
+    venue_ids = create_venues(sizes["venues"])
+    user_ids = create_users(sizes["users"])
+    event_ids = create_events(sizes["events"], organizer_ids, venue_ids)
+    booking_ids = create_bookings(sizes["bookings"], user_ids, event_ids,
+                                  args.user_skew, args.event_skew)
+    review_ids = create_reviews(sizes["reviews"], user_ids, event_ids,
+                                args.user_skew, args.event_skew)
     create_view_history()
+    rebuild_event_cards(db)
     
     print("\n=== Сводка ===")
     print(f"Организаторы: {db.organizers.count_documents({})}")
@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+# user_activity.py - Активность пользователей: time-series коллекция, TTL и свертки
+#
+# Просмотры мероприятий больше не копятся в документе пользователя:
+#   - user_activity_logs - time-series коллекция (timeField timestamp,
+#     metaField meta = {user_id, event_id}); сырые записи удаляются через
+#     ACTIVITY_TTL_DAYS дней (expireAfterSeconds);
+#   - users.view_history - только последние VIEW_HISTORY_LIMIT просмотров
+#     для карточки пользователя ($push с $sort/$slice, как booking_history);
+#   - user_activity_hourly - свертка по (мероприятие, действие, час):
+#     count и множество пользователей; хранится HOURLY_TTL_DAYS дней;
+#   - user_activity_daily - свертка по (пользователь, день): count, views,
+#     действия и время последней активности; хранится без срока.
+# Свертки пересчитываются инкрементально: каждый запуск берет только записи,
+# сделанные после отметки в dashboard_state (по written_at - времени записи, как
+# refresh_dashboard.js), и складывает их с накопленными через $merge; часы и дни
+# по-прежнему считаются по timestamp, поэтому просмотры задним числом (--migrate,
+# record_view с прошлой датой) попадают в свои корзины без --full.
+# Лог старой схемы (обычная коллекция или time-series с metaField user_id)
+# --ensure переносит в новую: записи копируются в user_activity_logs_migration,
+# коллекция пересоздается и заполняется из копии. Во время переноса в лог
+# никто не должен писать.
+# Пайплайны aggregations.js читают свертки, а не сырые события.
+#
+# Примеры:
+#   python3 user_activity.py --ensure
+#   python3 user_activity.py --migrate --rollup
+#   python3 user_activity.py --rollup --full
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from pymongo import MongoClient, UpdateOne
+
+MONGO_URI = 'mongodb://localhost:27017/'
+DB_NAME = 'event_booking_system'
+
+ACTIVITY = 'user_activity_logs'
+HOURLY = 'user_activity_hourly'
+# Копия лога на время переноса из старой схемы
+ACTIVITY_STAGING = 'user_activity_logs_migration'
+DAILY = 'user_activity_daily'
+STATE = 'dashboard_state'
+STATE_ID = 'user_activity_rollups'
+
+# Сколько последних просмотров хранится внутри документа пользователя
+VIEW_HISTORY_LIMIT = 10
+ACTIVITY_TTL_DAYS = 90
+HOURLY_TTL_DAYS = 365
+# Записи моложе SETTLE_SECONDS ждут следующего запуска (как в refresh_dashboard.js).
+# written_at ставится до записи, поэтому окно должно быть больше самой долгой
+# записи одной пачки (insert_stamped)
+SETTLE_SECONDS = 60
+BATCH_SIZE = 1000
+
+
+def views_push(entries, limit=VIEW_HISTORY_LIMIT):
+    """$push для view_history: добавить просмотры и оставить последние limit"""
+    return {"$each": entries, "$sort": {"viewed_at": 1}, "$slice": -limit}
+
+
+def recent_views(views, limit=VIEW_HISTORY_LIMIT):
+    """Последние limit просмотров в порядке времени - то же, что оставит views_push"""
+    return sorted(views, key=lambda view: view["viewed_at"])[-limit:]
+
+
+def activity_doc(user_id, event_id, timestamp, action="view", details=None):
+    # written_at - время записи в лог: по нему refresh_dashboard.js видит и просмотры задним числом
+    doc = {"timestamp": timestamp, "meta": {"user_id": user_id, "event_id": event_id}, "action": action,
+           "written_at": datetime.now()}
+    if details:
+        doc["details"] = details
+    return doc
+
+
+def insert_stamped(collection, docs, batch_size=BATCH_SIZE):
+    """insert_many пачками: written_at ставится каждой пачке непосредственно перед записью"""
+    docs = iter(docs)
+    inserted = 0
+    while True:
+        batch = [doc for _, doc in zip(range(batch_size), docs)]
+        if not batch:
+            return inserted
+        written_at = datetime.now()
+        # Документы меняются на месте, как и _id от insert_many
+        for doc in batch:
+            doc["written_at"] = written_at
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+
+
+def activity_options(db):
+    """Параметры коллекции лога (None, если ее нет)"""
+    for info in db.list_collections(filter={"name": ACTIVITY}):
+        return info.get("options", {})
+    return None
+
+
+def create_activity(db, ttl_days):
+    db.create_collection(
+        ACTIVITY,
+        timeseries={"timeField": "timestamp", "metaField": "meta", "granularity": "hours"},
+        expireAfterSeconds=ttl_days * 86400,
+    )
+
+
+def reshape_pipeline(cutoff):
+    """Записи старой схемы (user_id и entity_type/entity_id в корне) -> meta = {user_id, event_id}"""
+    event_id = {"$cond": [{"$eq": ["$entity_type", "event"]}, "$entity_id", "$$REMOVE"]}
+    return [
+        # timeField обязателен; записи старше TTL все равно были бы удалены
+        {"$match": {"timestamp": {"$type": "date", "$gte": cutoff}}},
+        {"$set": {"meta": {
+            "user_id": {"$ifNull": ["$meta.user_id", "$user_id"]},
+            "event_id": {"$ifNull": ["$meta.event_id", {"$ifNull": ["$event_id", event_id]}]},
+        }}},
+        {"$unset": ["user_id", "event_id"]},
+        {"$out": ACTIVITY_STAGING},
+    ]
+
+
+def copy_staged_activity(db):
+    staged, batch = 0, []
+    for doc in db[ACTIVITY_STAGING].find():
+        batch.append(doc)
+        if len(batch) >= BATCH_SIZE:
+            db[ACTIVITY].insert_many(batch, ordered=False)
+            staged += len(batch)
+            batch = []
+    if batch:
+        db[ACTIVITY].insert_many(batch, ordered=False)
+        staged += len(batch)
+    db.drop_collection(ACTIVITY_STAGING)
+    return staged
+
+
+def ensure_collections(db, ttl_days=ACTIVITY_TTL_DAYS):
+    """Time-series коллекция активности и индексы сверток; повторный вызов ничего не меняет.
+
+    Возвращает число записей, перенесенных из старой схемы лога.
+    """
+    options = activity_options(db)
+    if options is not None and options.get("timeseries", {}).get("metaField") != "meta":
+        # renameCollection для time-series не поддерживается: сначала копия в обычную
+        # коллекцию, потом старая удаляется; исходные записи не трогаются до конца $out
+        db[ACTIVITY].aggregate(reshape_pipeline(datetime.now() - timedelta(days=ttl_days)))
+        db.drop_collection(ACTIVITY)
+        options = None
+    migrated = 0
+    if ACTIVITY_STAGING in db.list_collection_names():
+        # Копия есть - перенос не закончен (в том числе прерванный прошлый запуск):
+        # коллекция заполняется из нее заново
+        db.drop_collection(ACTIVITY)
+        create_activity(db, ttl_days)
+        migrated = copy_staged_activity(db)
+    elif options is None:
+        create_activity(db, ttl_days)
+    else:
+        # Срок хранения меняется без пересоздания коллекции
+        db.command("collMod", ACTIVITY, expireAfterSeconds=ttl_days * 86400)
+    db[ACTIVITY].create_index([("meta.user_id", 1), ("timestamp", -1)])
+    db[ACTIVITY].create_index([("meta.event_id", 1), ("timestamp", -1)])
+    db[ACTIVITY].create_index("written_at")
+
+    db[HOURLY].create_index([("event_id", 1), ("hour", -1)])
+    db[HOURLY].create_index("hour", expireAfterSeconds=HOURLY_TTL_DAYS * 86400)
+    db[DAILY].create_index([("user_id", 1), ("day", -1)])
+    return migrated
+
+
+def reset_collections(db, ttl_days=ACTIVITY_TTL_DAYS):
+    """Удаление активности и сверток; у time-series коллекции delete_many ограничен, поэтому drop"""
+    for name in (ACTIVITY, ACTIVITY_STAGING, HOURLY, DAILY):
+        db.drop_collection(name)
+    db[STATE].delete_one({"_id": STATE_ID})
+    ensure_collections(db, ttl_days)
+
+
+def record_view(db, user_id, event_id, viewed_at=None):
+    """Просмотр мероприятия: запись в лог и в короткую историю пользователя"""
+    viewed_at = viewed_at or datetime.now()
+    db[ACTIVITY].insert_one(activity_doc(user_id, event_id, viewed_at))
+    db.users.update_one(
+        {"_id": user_id},
+        {"$push": {"view_history": views_push([{"event_id": event_id, "viewed_at": viewed_at}])}}
+    )
+
+
+def migrate_view_history(db, limit=VIEW_HISTORY_LIMIT):
+    """Перенос накопленных view_history в лог активности с обрезкой до limit записей.
+
+    Перенесенные пользователи помечаются activity_migrated, повторный запуск их пропускает.
+    """
+    cutoff = datetime.now() - timedelta(days=ACTIVITY_TTL_DAYS)
+    logs, updates, migrated = [], [], 0
+    query = {"view_history.0": {"$exists": True}, "activity_migrated": {"$exists": False}}
+    for user in db.users.find(query, {"view_history": 1}):
+        # Записи старше TTL все равно были бы удалены
+        logs.extend(activity_doc(user["_id"], view["event_id"], view["viewed_at"])
+                    for view in user["view_history"] if view.get("viewed_at") and view["viewed_at"] >= cutoff)
+        updates.append(UpdateOne({"_id": user["_id"]}, {
+            "$push": {"view_history": views_push([], limit)},
+            "$set": {"activity_migrated": True},
+        }))
+        if len(updates) >= BATCH_SIZE:
+            migrated += flush_migration(db, logs, updates)
+    return migrated + flush_migration(db, logs, updates)
+
+
+def flush_migration(db, logs, updates):
+    # Сначала лог, потом обрезка: при сбое между ними просмотры не теряются
+    if logs:
+        insert_stamped(db[ACTIVITY], logs)
+    if updates:
+        db.users.bulk_write(updates, ordered=False)
+    count = len(updates)
+    logs.clear()
+    updates.clear()
+    return count
+
+
+def written(after, upper):
+    """Записи, сделанные в окне [after, upper); after=None - все, включая записи без written_at"""
+    if after is None:
+        return {"$or": [{"written_at": {"$lt": upper}}, {"written_at": {"$exists": False}}]}
+    return {"written_at": {"$gte": after, "$lt": upper}}
+
+
+def hourly_pipeline(after, upper):
+    return [
+        {"$match": written(after, upper)},
+        {"$group": {
+            "_id": {
+                "event_id": "$meta.event_id",
+                "action": "$action",
+                "hour": {"$dateTrunc": {"date": "$timestamp", "unit": "hour"}},
+            },
+            "count": {"$sum": 1},
+            "users": {"$addToSet": "$meta.user_id"},
+        }},
+        {"$set": {"event_id": "$_id.event_id", "action": "$_id.action", "hour": "$_id.hour"}},
+        {"$merge": {
+            "into": HOURLY,
+            "on": "_id",
+            "whenMatched": [{"$set": {
+                "count": {"$add": ["$count", "$$new.count"]},
+                "users": {"$setUnion": ["$users", "$$new.users"]},
+            }}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+def daily_pipeline(after, upper):
+    return [
+        {"$match": written(after, upper)},
+        {"$group": {
+            "_id": {
+                "user_id": "$meta.user_id",
+                "day": {"$dateTrunc": {"date": "$timestamp", "unit": "day"}},
+            },
+            "count": {"$sum": 1},
+            "views": {"$sum": {"$cond": [{"$eq": ["$action", "view"]}, 1, 0]}},
+            "actions": {"$addToSet": "$action"},
+            "last_at": {"$max": "$timestamp"},
+        }},
+        {"$set": {"user_id": "$_id.user_id", "day": "$_id.day"}},
+        {"$merge": {
+            "into": DAILY,
+            "on": "_id",
+            "whenMatched": [{"$set": {
+                "count": {"$add": ["$count", "$$new.count"]},
+                "views": {"$add": ["$views", "$$new.views"]},
+                "actions": {"$setUnion": ["$actions", "$$new.actions"]},
+                "last_at": {"$max": ["$last_at", "$$new.last_at"]},
+            }}],
+            "whenNotMatched": "insert",
+        }},
+    ]
+
+
+def refresh_rollups(db, full=False):
+    """Досчитать свертки по записям после отметки; full - перестроить с нуля"""
+    state = None if full else db[STATE].find_one({"_id": STATE_ID})
+    # Отметка старого формата стояла на timestamp - свертки перестраиваются
+    if state and state.get("watermark") != "written_at":
+        state = None
+    if state is None:
+        db.drop_collection(HOURLY)
+        db.drop_collection(DAILY)
+        ensure_collections(db)
+    after = state["activity_after"] if state else None
+    upper = datetime.now() - timedelta(seconds=SETTLE_SECONDS)
+
+    db[ACTIVITY].aggregate(hourly_pipeline(after, upper), allowDiskUse=True)
+    db[ACTIVITY].aggregate(daily_pipeline(after, upper), allowDiskUse=True)
+    db[STATE].replace_one(
+        {"_id": STATE_ID},
+        {"_id": STATE_ID, "watermark": "written_at", "activity_after": upper, "refreshed_at": datetime.now()},
+        upsert=True,
+    )
+    return after, upper
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Активность пользователей: time-series лог и свертки")
+    parser.add_argument("--uri", default=MONGO_URI)
+    parser.add_argument("--ensure", action="store_true", help="создать коллекции и индексы")
+    parser.add_argument("--ttl-days", type=int, default=ACTIVITY_TTL_DAYS, help="срок хранения сырых записей")
+    parser.add_argument("--migrate", action="store_true",
+                        help=f"перенести view_history в лог и обрезать до {VIEW_HISTORY_LIMIT} записей")
+    parser.add_argument("--rollup", action="store_true", help="обновить почасовые и дневные свертки")
+    parser.add_argument("--full", action="store_true", help="перестроить свертки с нуля")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    db = MongoClient(args.uri)[DB_NAME]
+    if args.ensure or args.migrate:
+        migrated = ensure_collections(db, args.ttl_days)
+        if migrated:
+            print(f"✓ {ACTIVITY}: {migrated} записей перенесено из старой схемы")
+        print(f"✓ {ACTIVITY}: time-series, TTL {args.ttl_days} дней")
+    if args.migrate:
+        print(f"✓ Перенесена история просмотров {migrate_view_history(db)} пользователей")
+    if args.rollup:
+        started = time.perf_counter()
+        after, upper = refresh_rollups(db, args.full)
+        since = f"{after:%Y-%m-%d %H:%M}" if after else "с начала"
+        print(f"✓ Свертки обновлены: {since} .. {upper:%Y-%m-%d %H:%M} "
+              f"({time.perf_counter() - started:.1f} с)")
+        print(f"  {HOURLY}: {db[HOURLY].estimated_document_count()}, "
+              f"{DAILY}: {db[DAILY].estimated_document_count()}")
+
+
+if __name__ == "__main__":
+    main()
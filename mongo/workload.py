@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# workload.py - Генератор нагрузки "открытого цикла" по сценариям бронирования
+#
+# Замена lab5/add.sh: вместо десятков фоновых psql по синтетическим таблицам
+# N процессов-воркеров с пулами соединений проигрывают смесь операций
+# пользователей (просмотр афиши, карточка мероприятия, удержание мест,
+# оплата, отмена, отзыв) на схеме lab2 или коллекциях MongoDB.
+#
+# Нагрузка открытая: запросы приходят пуассоновским потоком с заданной
+# интенсивностью независимо от того, успевает ли база. Задержка считается от
+# запланированного момента прихода запроса, поэтому очередь перед
+# перегруженной базой попадает в перцентили, а не прячется. Для каждой
+# ступени --rates печатается достигнутая пропускная способность и
+# гистограммы задержек по операциям; ступень, на которой база перестает
+# успевать (выполнено меньше 95% пришедших запросов, запросы отбрасываются
+# или p99 выше --slo-ms), - точка насыщения.
+#
+# Удержание, оплата и отмена идут через reservations.py, поэтому перед
+# запуском для PostgreSQL нужна lab2/07_seat_reservations.sql (применяется
+# автоматически).
+#
+# Примеры:
+#   python3 workload.py --engine postgres --pg-dsn "dbname=event_booking" \
+#       --rates 100,200,400,800 --duration 30 --workers 4
+#   python3 workload.py --engine mongo --rates 500 --mix "browse_events=60,view_event=30,reserve=10"
+import argparse
+import multiprocessing
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from benchstats import Histogram, save_report
+from datagen import ZipfSampler
+from reservations import MONGO_URI, MongoReservations, PgReservations
+
+OPERATIONS = ["browse_events", "view_event", "reserve", "pay", "cancel", "review"]
+DEFAULT_MIX = "browse_events=40,view_event=30,reserve=12,pay=9,cancel=3,review=6"
+PAGE_SIZE = 20
+BROWSE_PAGES = 5
+RELEASE_INTERVAL = 5
+COMMENTS = ["Отлично!", "Понравилось", "Нормально", "Могло быть лучше", "Звук подвел"]
+
+
+class PgWorkload:
+    """Операции на схеме lab2; пул соединений и места - из PgReservations"""
+
+    def __init__(self, args, connections):
+        self.reservations = PgReservations(args.pg_dsn, connections, args.hold_ttl)
+
+    def setup(self, args):
+        self.reservations.ensure_schema()
+        with self.reservations.cursor() as cur:
+            cur.execute("SELECT event_id FROM Events ORDER BY event_id LIMIT %s", (args.events,))
+            event_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT user_id FROM Users ORDER BY user_id LIMIT %s", (args.users,))
+            user_ids = [row[0] for row in cur.fetchall()]
+        for event_id in event_ids:
+            self.reservations.open_sales(event_id, reset=args.reset)
+        return event_ids, user_ids
+
+    def browse_events(self, rng, event_id, user_id):
+        with self.reservations.cursor() as cur:
+            cur.execute("""
+                SELECT e.event_id, e.title, e.event_date, e.base_price, v.name, v.city
+                FROM Events e
+                JOIN Venues v ON v.venue_id = e.venue_id
+                WHERE e.event_date >= CURRENT_TIMESTAMP
+                ORDER BY e.event_date
+                LIMIT %s OFFSET %s
+            """, (PAGE_SIZE, rng.randrange(BROWSE_PAGES) * PAGE_SIZE))
+            return cur.fetchall()
+
+    def view_event(self, rng, event_id, user_id):
+        with self.reservations.cursor() as cur:
+            cur.execute("""
+                SELECT e.title, e.description, e.event_date, e.base_price,
+                       v.name, v.address, o.name,
+                       (SELECT AVG(rating) FROM Reviews r WHERE r.event_id = e.event_id),
+                       (SELECT COUNT(*) FROM EventSeats s
+                        WHERE s.event_id = e.event_id AND s.status = 'available')
+                FROM Events e
+                JOIN Venues v ON v.venue_id = e.venue_id
+                JOIN Organizers o ON o.organizer_id = e.organizer_id
+                WHERE e.event_id = %s
+            """, (event_id,))
+            return cur.fetchone()
+
+    def review(self, rng, event_id, user_id):
+        with self.reservations.cursor() as cur:
+            cur.execute("INSERT INTO Reviews (event_id, user_id, rating, comment) VALUES (%s, %s, %s, %s)",
+                        (event_id, user_id, rng.randint(1, 5), rng.choice(COMMENTS)))
+
+    def close(self):
+        self.reservations.close()
+
+
+class MongoWorkload:
+    """Те же операции на коллекциях event_booking_system"""
+
+    def __init__(self, args, connections):
+        self.reservations = MongoReservations(args.mongo_uri, args.hold_ttl, max_pool_size=connections)
+        self.db = self.reservations.db
+
+    def setup(self, args):
+        event_ids = [e["_id"] for e in self.db.events.find({}, {"_id": 1}).sort("_id", 1).limit(args.events)]
+        user_ids = [u["_id"] for u in self.db.users.find({}, {"_id": 1}).sort("_id", 1).limit(args.users)]
+        for event_id in event_ids:
+            self.reservations.open_sales(event_id, reset=args.reset)
+        return event_ids, user_ids
+
+    def browse_events(self, rng, event_id, user_id):
+        return list(self.db.events.find(
+            {"date": {"$gte": datetime.now()}},
+            {"title": 1, "date": 1, "categories": 1, "ticket_types.price": 1, "available_seats": 1}
+        ).sort("date", 1).skip(rng.randrange(BROWSE_PAGES) * PAGE_SIZE).limit(PAGE_SIZE))
+
+    def view_event(self, rng, event_id, user_id):
+        event = self.db.events.find_one({"_id": event_id}, {"holds": 0})
+        venue = self.db.venues.find_one({"_id": event["venue_id"]}, {"name": 1, "address": 1})
+        reviews = list(self.db.reviews.find({"event_id": event_id}).sort("created_at", -1).limit(5))
+        return event, venue, reviews
+
+    def review(self, rng, event_id, user_id):
+        self.db.reviews.insert_one({
+            "event_id": event_id,
+            "user_id": user_id,
+            "rating": rng.randint(1, 5),
+            "comment": rng.choice(COMMENTS),
+            "created_at": datetime.now(),
+            "helpful_count": 0,
+        })
+
+    def close(self):
+        self.reservations.close()
+
+
+ENGINES = {"postgres": PgWorkload, "mongo": MongoWorkload}
+
+
+class Session:
+    """Состояние воркера: пул соединений, незавершенные удержания, счетчики и гистограммы"""
+
+    def __init__(self, backend, event_ids, user_ids, args):
+        self.backend = backend
+        self.reservations = backend.reservations
+        self.event_ids = event_ids
+        self.user_ids = user_ids
+        self.events = ZipfSampler(len(event_ids), args.event_skew)
+        self.users = ZipfSampler(len(user_ids), args.user_skew)
+        self.holds = deque()
+        self.lock = threading.Lock()
+        self.latency = {op: Histogram() for op in OPERATIONS}
+        self.service = {op: Histogram() for op in OPERATIONS}
+        self.counts = {op: {"ok": 0, "rejected": 0, "skipped": 0, "errors": 0} for op in OPERATIONS}
+        self.dropped = 0
+        self.in_flight = 0
+
+    def reserve(self, rng, event_id, user_id):
+        hold = self.reservations.hold(event_id, user_id, rng.randint(1, 2))
+        if hold is not None:
+            self.holds.append(hold)
+        return hold
+
+    def pay(self, rng, event_id, user_id):
+        """Оплата самого старого удержания; если удержаний нет - покупка целиком"""
+        try:
+            hold = self.holds.popleft()
+        except IndexError:
+            hold = self.reservations.hold(event_id, user_id, rng.randint(1, 2))
+            if hold is None:
+                return None
+        return self.reservations.confirm(hold)
+
+    def cancel(self, rng, event_id, user_id):
+        try:
+            hold = self.holds.pop()
+        except IndexError:
+            return "skipped"
+        return self.reservations.cancel(hold) or None
+
+    def execute(self, op, rng, scheduled):
+        started = time.perf_counter()
+        event_id = self.event_ids[self.events.sample(rng)]
+        user_id = self.user_ids[self.users.sample(rng)]
+        handler = getattr(self, op, None) or getattr(self.backend, op)
+        try:
+            result = handler(rng, event_id, user_id)
+            outcome = "skipped" if result == "skipped" else (
+                "rejected" if result is None and op in ("reserve", "pay", "cancel") else "ok")
+        except Exception as e:
+            outcome = "errors"
+            if self.counts[op]["errors"] == 0:
+                print(f"Ошибка {op}: {e}")
+        finished = time.perf_counter()
+        with self.lock:
+            self.in_flight -= 1
+            self.counts[op][outcome] += 1
+            if outcome != "skipped":
+                self.latency[op].add((finished - scheduled) * 1000)
+                self.service[op].add((finished - started) * 1000)
+
+
+def worker(number, args, rate, event_ids, user_ids, start_at, results):
+    """Процесс-воркер: свой пул соединений и свой пуассоновский поток запросов"""
+    backend = ENGINES[args.engine](args, args.connections)
+    session = Session(backend, event_ids, user_ids, args)
+    rng = random.Random(args.seed * 1000 + number)
+    ops, weights = zip(*args.mix.items())
+    executor = ThreadPoolExecutor(max_workers=args.connections)
+
+    # Все процессы стартуют одновременно
+    time.sleep(max(0, start_at - time.time()))
+    started = time.perf_counter()
+    deadline = started + args.duration
+    next_arrival = started
+    next_release = started + RELEASE_INTERVAL
+    arrivals = 0
+    while True:
+        next_arrival += rng.expovariate(rate)
+        if next_arrival >= deadline:
+            break
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        arrivals += 1
+        op = rng.choices(ops, weights)[0]
+        with session.lock:
+            if session.in_flight >= args.max_in_flight:
+                session.dropped += 1
+                continue
+            session.in_flight += 1
+        executor.submit(session.execute, op, random.Random(rng.random()), next_arrival)
+        if number == 0 and next_arrival >= next_release:
+            executor.submit(session.reservations.release_expired)
+            next_release += RELEASE_INTERVAL
+    executor.shutdown(wait=True)
+    elapsed = time.perf_counter() - started
+
+    # Незавершенные удержания возвращаем в продажу
+    for hold in session.holds:
+        try:
+            session.reservations.cancel(hold)
+        except Exception:
+            pass
+    backend.close()
+    results.put({
+        "arrivals": arrivals,
+        "dropped": session.dropped,
+        "elapsed": elapsed,
+        "counts": session.counts,
+        "latency": session.latency,
+        "service": session.service,
+    })
+
+
+def run_step(args, rate, event_ids, user_ids):
+    results = multiprocessing.Queue()
+    start_at = time.time() + 1
+    processes = [
+        multiprocessing.Process(target=worker, args=(number, args, rate / args.workers, event_ids, user_ids,
+                                                     start_at, results))
+        for number in range(args.workers)
+    ]
+    for process in processes:
+        process.start()
+    parts = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+
+    latency = {op: Histogram() for op in OPERATIONS}
+    service = {op: Histogram() for op in OPERATIONS}
+    counts = {op: {"ok": 0, "rejected": 0, "skipped": 0, "errors": 0} for op in OPERATIONS}
+    for part in parts:
+        for op in OPERATIONS:
+            latency[op].merge(part["latency"][op])
+            service[op].merge(part["service"][op])
+            for outcome, value in part["counts"][op].items():
+                counts[op][outcome] += value
+    elapsed = max(part["elapsed"] for part in parts)
+    completed = sum(h.count for h in latency.values())
+    total = Histogram()
+    for histogram in latency.values():
+        total.merge(histogram)
+
+    step = {
+        "target_rate": rate,
+        "offered_rate": round(sum(part["arrivals"] for part in parts) / args.duration, 1),
+        "achieved_rate": round(completed / elapsed, 1),
+        "dropped": sum(part["dropped"] for part in parts),
+        "errors": sum(c["errors"] for c in counts.values()),
+        "elapsed_s": round(elapsed, 2),
+        "latency": total.summary(),
+        "operations": {
+            op: {
+                "counts": counts[op],
+                "rate": round(latency[op].count / elapsed, 1),
+                "latency": latency[op].summary(),
+                "service": service[op].summary(),
+                "histogram": latency[op].buckets(),
+            }
+            for op in OPERATIONS if latency[op].count or any(counts[op].values())
+        },
+    }
+    p99 = step["latency"].get("p99_ms")
+    step["saturated"] = bool(
+        step["achieved_rate"] < 0.95 * step["offered_rate"] or step["dropped"]
+        or (args.slo_ms and p99 is not None and p99 > args.slo_ms)
+    )
+    return step
+
+
+def print_step(step):
+    print(f"\nЦель {step['target_rate']}/с: достигнуто {step['achieved_rate']}/с "
+          f"(пришло {step['offered_rate']}/с, отброшено {step['dropped']}, ошибок {step['errors']})"
+          + ("  НАСЫЩЕНИЕ" if step["saturated"] else ""))
+    print(f"  {'операция':<14} {'в сек':>8} {'p50 мс':>9} {'p95 мс':>9} {'p99 мс':>9} {'макс мс':>9} "
+          f"{'отказов':>8} {'ошибок':>7}")
+    for op, stats in step["operations"].items():
+        lat = stats["latency"]
+        if not lat["count"]:
+            continue
+        print(f"  {op:<14} {stats['rate']:>8} {lat['p50_ms']:>9} {lat['p95_ms']:>9} {lat['p99_ms']:>9} "
+              f"{lat['max_ms']:>9} {stats['counts']['rejected']:>8} {stats['counts']['errors']:>7}")
+
+
+def parse_mix(text):
+    mix = {}
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        name, weight = part.split("=", 1)
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"неизвестная операция: {name} (есть {', '.join(OPERATIONS)})")
+        mix[name] = float(weight)
+    return mix
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки открытого цикла для PostgreSQL и MongoDB")
+    parser.add_argument("--engine", choices=sorted(ENGINES), default="mongo")
+    parser.add_argument("--mongo-uri", default=MONGO_URI)
+    parser.add_argument("--pg-dsn", default="dbname=event_booking")
+    parser.add_argument("--rates", default="100,200,400", help="ступени интенсивности, запросов/с")
+    parser.add_argument("--duration", type=float, default=30, help="длительность ступени, с")
+    parser.add_argument("--workers", type=int, default=max(1, multiprocessing.cpu_count() // 2),
+                        help="процессов-воркеров")
+    parser.add_argument("--connections", type=int, default=16, help="соединений (потоков) на воркер")
+    parser.add_argument("--max-in-flight", type=int, default=1000,
+                        help="запросов в очереди воркера, сверх которых новые отбрасываются")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX), help="веса операций")
+    parser.add_argument("--events", type=int, default=200, help="мероприятий в продаже")
+    parser.add_argument("--users", type=int, default=10000, help="пользователей")
+    parser.add_argument("--event-skew", type=float, default=1.1, help="Zipf популярности мероприятий")
+    parser.add_argument("--user-skew", type=float, default=0.8)
+    parser.add_argument("--hold-ttl", type=int, default=300)
+    parser.add_argument("--reset", action="store_true", help="вернуть в продажу все места мероприятий")
+    parser.add_argument("--slo-ms", type=float, help="порог p99; выше - ступень считается насыщенной")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default="workload_report.json")
+    args = parser.parse_args()
+    args.rates = [float(r) for r in args.rates.split(",")]
+    return args
+
+
+def main():
+    args = parse_args()
+    backend = ENGINES[args.engine](args, 1)
+    event_ids, user_ids = backend.setup(args)
+    backend.close()
+    print(f"{args.engine}: {len(event_ids)} мероприятий, {len(user_ids)} пользователей, "
+          f"{args.workers} воркеров x {args.connections} соединений")
+    print("Смесь: " + ", ".join(f"{op}={weight:g}" for op, weight in args.mix.items()))
+
+    steps = []
+    for rate in args.rates:
+        step = run_step(args, rate, event_ids, user_ids)
+        print_step(step)
+        steps.append(step)
+
+    saturated = next((s["target_rate"] for s in steps if s["saturated"]), None)
+    best = max(steps, key=lambda s: s["achieved_rate"])
+    print(f"\nМаксимум достигнутой пропускной способности: {best['achieved_rate']}/с")
+    print(f"Насыщение: с {saturated}/с" if saturated else "Насыщение не достигнуто - увеличьте --rates")
+    save_report(args.output, {
+        "meta": {
+            "engine": args.engine,
+            "workers": args.workers,
+            "connections": args.connections,
+            "mix": args.mix,
+            "started_at": datetime.now().isoformat(timespec="seconds"),
+        },
+        "steps": steps,
+        "max_achieved_rate": best["achieved_rate"],
+        "saturation_rate": saturated,
+    })
+    print(f"Отчет: {args.output}")
+
+
+if __name__ == "__main__":
+    main()